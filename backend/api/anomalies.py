@@ -0,0 +1,191 @@
+"""Vectorized anomaly detection over equipment readings.
+
+Four detectors run over the ``(n, 3)`` matrix of flowrate, pressure and
+temperature:
+
+* robust z-score: ``0.6745 * (x - median) / MAD`` per parameter
+* IQR fences: outside ``[Q1 - k*IQR, Q3 + k*IQR]`` per parameter
+* per-type baseline: robust z-score against the row's own equipment type
+* Mahalanobis distance of the full reading vector from the dataset mean
+
+Everything is NumPy array arithmetic; the only Python loop is over the
+handful of distinct equipment types. ``summary_fences`` and
+``count_mahalanobis_outliers`` give the IQR and Mahalanobis results from
+stored summaries instead, for callers that must not load every row.
+"""
+from functools import partial
+
+import numpy as np
+from django.db.models import ExpressionWrapper, F, FloatField
+
+from .cache import cached
+from .sketches import quantiles
+from .summaries import PAIR_INDICES, PARAMETERS, factorize
+
+ROBUST_Z_THRESHOLD = 3.5
+IQR_MULTIPLIER = 1.5
+# sqrt of the 0.999 quantile of chi-squared with 3 degrees of freedom
+MAHALANOBIS_THRESHOLD = 4.03
+THRESHOLDS = {
+    'robust_z': ROBUST_Z_THRESHOLD,
+    'iqr_multiplier': IQR_MULTIPLIER,
+    'mahalanobis': MAHALANOBIS_THRESHOLD,
+}
+
+
+def robust_z_scores(values, median=None):
+    """Column-wise robust z-scores using the median absolute deviation"""
+    if median is None:
+        median = np.median(values, axis=0)
+    diff = values - median
+    abs_diff = np.abs(diff)
+    scale = np.median(abs_diff, axis=0) / 0.6745
+    if not scale.all():
+        # Fall back to the mean absolute deviation when over half the values are equal
+        scale = np.where(scale > 0, scale, abs_diff.mean(axis=0) * 1.2533)
+    # Constant columns get an infinite scale, i.e. a z-score of 0
+    return diff / np.where(scale > 0, scale, np.inf)
+
+
+def iqr_fences(values, k=IQR_MULTIPLIER, quartiles=None):
+    """Return ``(lower, upper)`` fence arrays, one entry per column"""
+    q1, q3 = quartiles if quartiles is not None else np.percentile(values, [25, 75], axis=0)
+    iqr = q3 - q1
+    return q1 - k * iqr, q3 + k * iqr
+
+
+def per_type_robust_z(values, type_codes):
+    """Robust z-scores computed against each row's own type baseline"""
+    order = np.argsort(type_codes, kind='stable')
+    sorted_values = values[order]
+    boundaries = np.flatnonzero(np.diff(type_codes[order])) + 1
+    # Groups are contiguous slices of the sorted copy, so no per-type gather
+    sorted_z = np.concatenate([robust_z_scores(group) for group in np.split(sorted_values, boundaries)])
+    z = np.empty_like(values)
+    z[order] = sorted_z
+    return z
+
+
+def mahalanobis_distances(values):
+    """Distance of each row from the column means under the sample covariance"""
+    if len(values) < 2:
+        return np.zeros(len(values))
+    diff = values - values.mean(axis=0)
+    inv_cov = np.linalg.pinv(np.cov(values, rowvar=False))
+    d2 = ((diff @ inv_cov) * diff).sum(axis=1)
+    return np.sqrt(np.maximum(d2, 0.0))
+
+
+def summary_fences(stats, k=IQR_MULTIPLIER):
+    """``iqr_fences`` from the quartiles of merged summary stats' sketches"""
+    quartiles = np.array([quantiles(stats['sketches'][param], [0.25, 0.75], stats['min'][j], stats['max'][j])
+                          for j, param in enumerate(PARAMETERS)]).T
+    return iqr_fences(None, k, quartiles=quartiles)
+
+
+def count_mahalanobis_outliers(equipment, stats):
+    """Rows of the ``equipment`` queryset flagged by ``mahalanobis_distances``, counted by the database.
+
+    The mean and covariance come from the merged summary ``stats`` of the
+    same rows.
+    """
+    count = stats['count']
+    if count < 2:
+        return 0
+    covariance = np.diag(stats['m2'])
+    for (i, j), c2 in zip(PAIR_INDICES, stats['c2']):
+        covariance[i, j] = covariance[j, i] = c2
+    inv_cov = np.linalg.pinv(covariance / (count - 1))
+    diff = [F(param) - float(stats['mean'][j]) for j, param in enumerate(PARAMETERS)]
+    d2 = sum(float(inv_cov[i, j]) * diff[i] * diff[j]
+             for i in range(len(PARAMETERS)) for j in range(len(PARAMETERS)))
+    return (equipment.alias(d2=ExpressionWrapper(d2, output_field=FloatField()))
+            .filter(d2__gt=MAHALANOBIS_THRESHOLD ** 2).count())
+
+
+def detect_anomalies(types, values):
+    """Run all detectors and return per-row flags and scores.
+
+    ``types`` is a sequence of type labels and ``values`` an ``(n, 3)`` array.
+    Returns a dict of arrays: boolean ``robust_z``, ``iqr`` and
+    ``type_baseline`` masks of shape ``(n, 3)``, a boolean ``mahalanobis``
+    mask, the underlying scores and the IQR fences.
+    """
+    values = np.asarray(values, dtype=float).reshape(-1, len(PARAMETERS))
+    type_labels, type_codes = factorize(types)
+    
+    q1, median, q3 = np.percentile(values, [25, 50, 75], axis=0)
+    z = robust_z_scores(values, median)
+    lower, upper = iqr_fences(values, quartiles=(q1, q3))
+    type_z = per_type_robust_z(values, type_codes)
+    distance = mahalanobis_distances(values)
+    
+    return {
+        'robust_z_score': z,
+        'type_z_score': type_z,
+        'mahalanobis_distance': distance,
+        'robust_z': np.abs(z) > ROBUST_Z_THRESHOLD,
+        'iqr': (values < lower) | (values > upper),
+        'type_baseline': np.abs(type_z) > ROBUST_Z_THRESHOLD,
+        'mahalanobis': distance > MAHALANOBIS_THRESHOLD,
+        'iqr_fences': (lower, upper),
+    }
+
+
+def dataset_anomalies(dataset):
+    """Anomaly report for a dataset, cached until the dataset changes.
+
+    Flagged rows are sorted by severity (largest absolute z-score or
+    Mahalanobis distance first).
+    """
+    return cached('anomalies', dataset.id, (dataset.version,), partial(_dataset_anomalies, dataset))
+
+
+def _dataset_anomalies(dataset):
+    rows = list(dataset.equipment.order_by('id').values_list('id', 'name', 'type', *PARAMETERS))
+    if not rows:
+        return {'total_count': 0, 'total_flagged': 0, 'thresholds': THRESHOLDS,
+                'counts': {}, 'iqr_fences': {}, 'anomalies': []}
+    
+    ids, names, types, *columns = zip(*rows)
+    values = np.column_stack([np.asarray(col, dtype=float) for col in columns])
+    result = detect_anomalies(types, values)
+    
+    flagged = (result['robust_z'].any(axis=1) | result['iqr'].any(axis=1)
+               | result['type_baseline'].any(axis=1) | result['mahalanobis'])
+    severity = np.maximum(np.abs(result['robust_z_score']).max(axis=1), result['mahalanobis_distance'])
+    indices = np.flatnonzero(flagged)
+    indices = indices[np.argsort(-severity[indices], kind='stable')]
+    
+    anomalies = []
+    for i in indices.tolist():
+        reasons = [f'{method}:{param}'
+                   for method in ('robust_z', 'iqr', 'type_baseline')
+                   for j, param in enumerate(PARAMETERS) if result[method][i, j]]
+        if result['mahalanobis'][i]:
+            reasons.append('mahalanobis')
+        anomalies.append({
+            'id': ids[i],
+            'name': names[i],
+            'type': types[i],
+            'values': values[i].tolist(),
+            'robust_z_score': np.round(result['robust_z_score'][i], 3).tolist(),
+            'type_z_score': np.round(result['type_z_score'][i], 3).tolist(),
+            'mahalanobis_distance': round(float(result['mahalanobis_distance'][i]), 3),
+            'reasons': reasons,
+        })
+    
+    lower, upper = result['iqr_fences']
+    return {
+        'total_count': len(rows),
+        'total_flagged': len(anomalies),
+        'thresholds': THRESHOLDS,
+        'counts': {
+            'robust_z': dict(zip(PARAMETERS, result['robust_z'].sum(axis=0).tolist())),
+            'iqr': dict(zip(PARAMETERS, result['iqr'].sum(axis=0).tolist())),
+            'type_baseline': dict(zip(PARAMETERS, result['type_baseline'].sum(axis=0).tolist())),
+            'mahalanobis': int(result['mahalanobis'].sum()),
+        },
+        'iqr_fences': {param: [float(lower[j]), float(upper[j])] for j, param in enumerate(PARAMETERS)},
+        'anomalies': anomalies,
+    }
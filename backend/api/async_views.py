@@ -0,0 +1,107 @@
+"""Async variants of the read-only endpoints for ASGI servers.
+
+DRF's ``@api_view`` functions are synchronous, so under ASGI each request
+holds a worker thread for its whole duration. These plain Django async
+views use the async ORM instead and return the same JSON as their
+``/api/...`` counterparts. They are mounted under ``/api/async/``; run the
+project with ``uvicorn equipment_api.asgi:application`` to use them.
+"""
+import base64
+import binascii
+import functools
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import authenticate
+from django.db.models import Count
+from django.http import JsonResponse
+from rest_framework.fields import DateTimeField
+
+from .models import Dataset, Equipment
+from .summaries import dataset_summary, get_type_summaries, summaries_complete
+
+EQUIPMENT_FIELDS = ('id', 'name', 'type', 'flowrate', 'pressure', 'temperature', 'dataset')
+
+
+def _error(status_code, detail):
+    response = JsonResponse({'detail': detail}, status=status_code)
+    if status_code == 401:
+        response['WWW-Authenticate'] = 'Basic realm="api"'
+    return response
+
+
+async def basic_auth_user(request):
+    """Resolve HTTP Basic credentials like DRF's BasicAuthentication; returns ``(user, error)``"""
+    auth = request.headers.get('Authorization', '').split()
+    if len(auth) != 2 or auth[0].lower() != 'basic':
+        return None, 'Authentication credentials were not provided.'
+    try:
+        username, _, password = base64.b64decode(auth[1]).decode('utf-8').partition(':')
+    except (binascii.Error, UnicodeDecodeError):
+        return None, 'Invalid basic header. Credentials not correctly base64 encoded.'
+    # Password hashing is CPU-bound; keep it off the event loop and off the
+    # shared thread that serves the synchronous views
+    user = await sync_to_async(authenticate, thread_sensitive=False)(username=username, password=password)
+    if user is None:
+        return None, 'Invalid username/password.'
+    return user, None
+
+
+def async_api_view(view=None, *, authenticated=True):
+    """GET-only async view, authenticated like ``@permission_classes([IsAuthenticated])``"""
+    if view is None:
+        return functools.partial(async_api_view, authenticated=authenticated)
+    
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return _error(405, f'Method "{request.method}" not allowed.')
+        if authenticated:
+            user, error = await basic_auth_user(request)
+            if error:
+                return _error(401, error)
+            request.user = user
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+@async_api_view(authenticated=False)
+async def health_check(request):
+    return JsonResponse({'status': 'ok', 'message': 'Chemora Backend API is running'})
+
+
+@async_api_view
+async def get_datasets(request):
+    datasets = (Dataset.objects.filter(uploaded_by=request.user)
+                .annotate(equipment_count=Count('equipment'))
+                .values('id', 'name', 'uploaded_at', 'equipment_count', 'fingerprint')
+                .order_by('-uploaded_at'))
+    timestamp = DateTimeField()
+    data = []
+    async for row in datasets:
+        row['uploaded_at'] = timestamp.to_representation(row['uploaded_at'])
+        data.append(row)
+    return JsonResponse(data, safe=False)
+
+
+@async_api_view
+async def get_equipment_data(request, dataset_id):
+    if not await Dataset.objects.filter(id=dataset_id, uploaded_by=request.user).aexists():
+        return JsonResponse({'error': 'Dataset not found'}, status=404)
+    rows = [row async for row in Equipment.objects.filter(dataset_id=dataset_id).values(*EQUIPMENT_FIELDS)]
+    return JsonResponse(rows, safe=False)
+
+
+@async_api_view
+async def get_summary(request, dataset_id):
+    try:
+        dataset = await Dataset.objects.aget(id=dataset_id, uploaded_by=request.user)
+    except Dataset.DoesNotExist:
+        return JsonResponse({'error': 'Dataset not found'}, status=404)
+    
+    summaries = [s async for s in dataset.type_summaries.all()]
+    if not summaries_complete(summaries):
+        # Older datasets build their summaries on first read
+        summaries = await sync_to_async(get_type_summaries)(dataset)
+    if not summaries:
+        return JsonResponse({'error': 'No equipment data found'})
+    return JsonResponse(dataset_summary(summaries))
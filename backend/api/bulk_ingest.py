@@ -0,0 +1,394 @@
+"""Bulk loading of CSV directories into one dataset (``manage.py bulk_ingest``).
+
+Plain CSV files are cut into byte ranges of about ``split_bytes``. Each
+range holds the lines that start inside it, so ranges split on line
+boundaries without coordinating. Gzipped files cannot be seeked into and
+are parsed whole. Ranges are parsed in a process pool by the same code
+as uploads, validation included. Quoted fields holding newlines would be
+cut apart, so files that have them need ``split_bytes=0``.
+
+The calling process is the only writer. It takes parsed ranges in file
+order and commits them in transactions of at least ``batch_rows`` rows.
+Each transaction also updates the search index, the stored summaries,
+the fingerprint and the version. A range is committed whole or not at all.
+Equipment trends (api/trends.py) are refreshed once per run that wrote
+rows, after its last range.
+
+While a run owns the dataset, its ``bulk_lock`` holds the run's token.
+Appends (``upsert_rows``) are refused and the dataset is never purged.
+The lock is cleared when the last range is in, or by ``release()``.
+
+Progress is kept in a JSON checkpoint file:
+* Before each transaction it records the batch as pending, with the
+  dataset's highest row id.
+* After the commit it moves the batch to the done ranges.
+
+A run that finds a pending batch cannot tell whether that batch was
+committed. The lock means no other writer added rows in between, so it
+deletes the rows above the recorded id, restores the fingerprint and
+parses those ranges again. Ranges already done are skipped.
+"""
+import glob
+import io
+import json
+import os
+import time
+import uuid
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import chain, islice
+
+import django
+import numpy as np
+from django.db import connections, transaction
+from django.db.models import F
+
+from .cache import invalidate_dataset
+from .export import remove_exports
+from .ingest import (BULK_BATCH_SIZE, compute_fingerprint, format_fingerprint, purge_oldest_dataset,
+                     read_csv_columns, read_csv_file, upload_format)
+from .models import Dataset, Equipment
+from .search import index_equipment
+from .summaries import apply_summary_delta, build_type_summaries, summarize_by_type
+from .trends import dataset_changed
+from .validation import MAX_REPORTED_ROWS
+
+BULK_FORMATS = ('.csv', '.csv.gz')
+DEFAULT_SPLIT_BYTES = 32 * 1024 * 1024
+DEFAULT_BATCH_ROWS = 100000
+
+# ``end`` is None for a whole file; ``header`` is the file's first line
+Part = namedtuple('Part', ['path', 'start', 'end', 'header'])
+# ``lines`` counts the source lines the part covered, so the writer can
+# turn line numbers within a part into line numbers within its file
+ParsedPart = namedtuple('ParsedPart', ['part', 'names', 'types', 'values', 'fingerprint', 'errors', 'lines'])
+
+
+def part_key(part):
+    return f'{part.path}@{part.start}'
+
+
+def find_files(inputs):
+    """CSV and gzipped CSV files named by ``inputs``: files, directories (not recursed) or glob patterns"""
+    files = []
+    for entry in inputs:
+        if os.path.isdir(entry):
+            matches = [os.path.join(entry, name) for name in sorted(os.listdir(entry))]
+            matches = [path for path in matches if os.path.isfile(path) and upload_format(path) in BULK_FORMATS]
+        elif os.path.isfile(entry):
+            if upload_format(entry) not in BULK_FORMATS:
+                raise ValueError(f'{entry} is not a .csv or .csv.gz file')
+            matches = [entry]
+        else:
+            matches = sorted(path for path in glob.glob(entry, recursive=True)
+                             if os.path.isfile(path) and upload_format(path) in BULK_FORMATS)
+            if not matches:
+                raise ValueError(f'{entry} matches no .csv or .csv.gz files')
+        files.extend(os.path.abspath(path) for path in matches)
+    return list(dict.fromkeys(files))
+
+
+def split_file(path, split_bytes):
+    """The Parts of one file"""
+    if upload_format(path) == '.csv.gz' or not split_bytes:
+        return [Part(path, 0, None, None)]
+    with open(path, 'rb') as f:
+        header = f.readline()
+    size = os.path.getsize(path)
+    return [Part(path, start, min(start + split_bytes, size), header)
+            for start in range(0, max(size, 1), split_bytes)]
+
+
+def _read_part_lines(part):
+    """The header plus the lines starting in ``[start, end)``, and how many of those lines there are"""
+    with open(part.path, 'rb') as f:
+        if part.start:
+            # Finish the line running into the range; it belongs to the range before
+            f.seek(part.start - 1)
+            f.readline()
+        else:
+            f.readline()
+        data = f.read(max(0, part.end - f.tell()))
+        if data and not data.endswith(b'\n'):
+            data += f.readline()
+    text = data.decode('utf-8')
+    lines = text.count('\n') + (not text.endswith('\n') and bool(text))
+    return chain([part.header.decode('utf-8')], io.StringIO(text, newline='')), lines
+
+
+def parse_part(part):
+    """Parse a Part into a ParsedPart; runs in the worker processes"""
+    if part.end is None:
+        with open(part.path, 'rb') as f:
+            parsed = read_csv_file(part.path, f, gzipped=upload_format(part.path) == '.csv.gz')
+        return ParsedPart(part, *parsed[1:], lines=None)
+    lines, count = _read_part_lines(part)
+    return ParsedPart(part, *read_csv_columns(lines), lines=count + (part.start == 0))
+
+
+class Checkpoint:
+    """Progress of one bulk ingest, kept in a JSON file replaced atomically"""
+
+    def __init__(self, path, state):
+        self.path = path
+        self.state = state
+
+    @classmethod
+    def load(cls, path):
+        """The checkpoint at ``path``, or None if there is none"""
+        try:
+            with open(path) as f:
+                return cls(path, json.load(f))
+        except FileNotFoundError:
+            return None
+
+    @property
+    def done(self):
+        return set(self.state['done'])
+
+    def save(self):
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(self.state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+
+    def begin(self, keys, last_id, fingerprint):
+        self.state['pending'] = {'keys': keys, 'last_id': last_id, 'fingerprint': fingerprint}
+        self.save()
+
+    def commit(self, rows, skipped, lines):
+        self.state['done'].extend(self.state['pending']['keys'])
+        self.state['lines'].update(lines)
+        self.state['pending'] = None
+        self.state['rows'] += rows
+        self.state['skipped'] += skipped
+        self.save()
+
+    def finish(self):
+        self.state['finished'] = True
+        self.save()
+
+
+def file_stamps(files):
+    return {path: [os.path.getsize(path), os.stat(path).st_mtime_ns] for path in files}
+
+
+def _last_id(dataset):
+    return dataset.equipment.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def recover(dataset, checkpoint):
+    """Undo the pending batch of an interrupted run, whether or not it was committed"""
+    pending = checkpoint.state['pending']
+    if pending is None:
+        return
+    with transaction.atomic():
+        Equipment.objects.filter(dataset=dataset, id__gt=pending['last_id']).delete()
+        Dataset.objects.filter(id=dataset.id).update(fingerprint=pending['fingerprint'], version=F('version') + 1)
+        build_type_summaries(dataset)
+        transaction.on_commit(partial(invalidate_dataset, dataset.id))
+    checkpoint.state['pending'] = None
+    checkpoint.save()
+
+
+def start(user, files, checkpoint_path, name=None, dataset_id=None, split_bytes=DEFAULT_SPLIT_BYTES):
+    """The dataset and Checkpoint of a new or resumed run.
+
+    A run resumes when ``checkpoint_path`` exists. It must name the same
+    files and split, and files with parts already written must not have
+    changed; the others may have been fixed in between. Otherwise the rows go into a new dataset called
+    ``name``, or are added to the user's dataset ``dataset_id``, which
+    the run then locks. Raises ValueError when the run cannot start.
+    """
+    checkpoint = Checkpoint.load(checkpoint_path)
+    if checkpoint is not None:
+        state = checkpoint.state
+        if state.get('finished'):
+            raise ValueError(f"{checkpoint_path} is of a finished run into dataset {state['dataset_id']}")
+        if state['split_bytes'] != split_bytes:
+            raise ValueError(f"{checkpoint_path} was written with split_bytes={state['split_bytes']}")
+        stamps = file_stamps(files)
+        if set(state['files']) != set(stamps):
+            raise ValueError(f'{checkpoint_path} was written for other files')
+        started = {key.rpartition('@')[0] for key in state['done'] + (state['pending'] or {}).get('keys', [])}
+        changed = sorted(path for path in started if state['files'][path] != stamps[path])
+        if changed:
+            raise ValueError(f"{', '.join(changed)} changed since {checkpoint_path} was written")
+        state['files'] = stamps
+        dataset = Dataset.objects.filter(id=state['dataset_id'], uploaded_by=user).first()
+        if dataset is None:
+            raise ValueError(f"Dataset {state['dataset_id']} of {checkpoint_path} no longer exists")
+        if dataset.bulk_lock != state['lock']:
+            raise ValueError(f'Dataset {dataset.id} was released from {checkpoint_path}; start a new run')
+        recover(dataset, checkpoint)
+        return dataset, checkpoint
+
+    lock = uuid.uuid4().hex
+    if dataset_id is not None:
+        dataset = Dataset.objects.filter(id=dataset_id, uploaded_by=user).first()
+        if dataset is None:
+            raise ValueError(f'Dataset {dataset_id} not found')
+        with transaction.atomic():
+            if not Dataset.objects.filter(id=dataset.id, bulk_lock='').update(bulk_lock=lock):
+                raise ValueError(f'Dataset {dataset_id} is being loaded by another bulk ingest run')
+            if not dataset.fingerprint:
+                Dataset.objects.filter(id=dataset.id).update(fingerprint=compute_fingerprint(dataset))
+    else:
+        with transaction.atomic():
+            purge_oldest_dataset(user)
+            dataset = Dataset.objects.create(name=name, uploaded_by=user, file_path=name,
+                                             fingerprint=format_fingerprint(0), bulk_lock=lock)
+    checkpoint = Checkpoint(checkpoint_path, {
+        'dataset_id': dataset.id, 'lock': lock, 'split_bytes': split_bytes, 'files': file_stamps(files),
+        'done': [], 'pending': None, 'lines': {}, 'rows': 0, 'skipped': 0,
+    })
+    checkpoint.save()
+    return dataset, checkpoint
+
+
+def write_batch(dataset, checkpoint, parsed, lines):
+    """Commit parsed parts in one transaction, recorded in the checkpoint around it.
+
+    ``lines`` maps files to the line their last part in ``parsed`` ends on.
+    """
+    names = [name for p in parsed for name in p.names]
+    types = [eq_type for p in parsed for eq_type in p.types]
+    values = np.concatenate([p.values for p in parsed])
+    fingerprint = Dataset.objects.values_list('fingerprint', flat=True).get(id=dataset.id)
+    total = int(fingerprint, 16) + sum(int(p.fingerprint, 16) for p in parsed)
+
+    last_id = _last_id(dataset)
+    checkpoint.begin([part_key(p.part) for p in parsed], last_id, fingerprint)
+    with transaction.atomic():
+        Equipment.objects.bulk_create(
+            (Equipment(dataset=dataset, name=name, type=eq_type, flowrate=f, pressure=p, temperature=t)
+             for name, eq_type, (f, p, t) in zip(names, types, values.tolist())),
+            batch_size=BULK_BATCH_SIZE,
+        )
+        index_equipment(dataset.id, names, types, after_id=last_id)
+        apply_summary_delta(dataset, summarize_by_type(types, values), {})
+        Dataset.objects.filter(id=dataset.id).update(fingerprint=format_fingerprint(total), version=F('version') + 1)
+        transaction.on_commit(partial(invalidate_dataset, dataset.id))
+    checkpoint.commit(len(names), sum(p.errors['invalid_rows'] for p in parsed if p.errors), lines)
+
+
+def run(dataset, checkpoint, files, workers=None, batch_rows=DEFAULT_BATCH_ROWS, on_error='reject',
+        progress=None):
+    """Parse the files' remaining parts in a process pool and write them.
+
+    ``progress(rows, seconds, parts_done, parts_total)`` is called after each
+    commit, with the rows written by this run. Invalid rows are skipped
+    with ``on_error='skip'``. With ``'reject'``, the run stops before
+    writing the first part that holds any. Returns ``(rows, skipped,
+    reports)``, where reports maps each file with invalid rows to its
+    validation report. Line numbers count from the top of the file.
+    """
+    parts = [part for path in files for part in split_file(path, checkpoint.state['split_bytes'])]
+    done = checkpoint.done
+    remaining = [part for part in parts if part_key(part) not in done]
+    # Lines of each file up to its last part parsed, header included
+    line_ends = dict(checkpoint.state['lines'])
+    reports = {}
+    rows = skipped = 0
+    started = time.monotonic()
+    batch, batch_size = [], 0
+
+    def flush():
+        nonlocal rows, batch, batch_size
+        lines = {parsed.part.path: line_ends[parsed.part.path] for parsed in batch if parsed.lines is not None}
+        write_batch(dataset, checkpoint, batch, lines)
+        rows += batch_size
+        batch, batch_size = [], 0
+        if progress:
+            progress(rows, time.monotonic() - started, len(checkpoint.state['done']), len(parts))
+
+    # Forked workers must not share the writer's database connections
+    connections.close_all()
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        # Parsed parts wait in memory for the writer; this bounds how many
+        pending = iter(remaining)
+        in_flight = deque(pool.submit(parse_part, part) for part in islice(pending, 2 * workers))
+        while in_flight:
+            parsed = in_flight.popleft().result()
+            in_flight.extend(pool.submit(parse_part, part) for part in islice(pending, 1))
+            part = parsed.part
+            first_line = line_ends.get(part.path, 0) if part.start else 0
+            if parsed.errors:
+                # Line numbers within a part count its header as line 1
+                shift = max(first_line - 1, 0)
+                report = dict(parsed.errors, rows=[dict(row, line=row['line'] + shift)
+                                                   for row in parsed.errors['rows']])
+                reports[part.path] = merge_reports(reports.get(part.path), report)
+                if on_error == 'reject':
+                    for future in in_flight:
+                        future.cancel()
+                    break
+                skipped += parsed.errors['invalid_rows']
+            # Only accepted parts advance the lines a resumed run counts from
+            if parsed.lines is not None:
+                line_ends[part.path] = first_line + parsed.lines
+            batch.append(parsed)
+            batch_size += len(parsed.names)
+            if batch_size >= batch_rows:
+                flush()
+        if batch:
+            flush()
+
+    if rows:
+        # Also after a stop at invalid rows: the parts before it are committed
+        remove_exports(dataset.id)
+        with transaction.atomic():
+            dataset_changed(dataset)
+    if len(checkpoint.state['done']) == len(parts):
+        unlock(dataset)
+        checkpoint.finish()
+    return rows, skipped, reports
+
+
+def unlock(dataset):
+    Dataset.objects.filter(id=dataset.id).update(bulk_lock='')
+
+
+def release(user, checkpoint_path):
+    """Give up the unfinished run of ``checkpoint_path``.
+
+    Its pending batch is undone and the dataset unlocked, keeping the parts
+    already written; the checkpoint file is removed. Returns the dataset,
+    or None if it no longer exists. Raises ValueError if there is no
+    unfinished run to release.
+    """
+    checkpoint = Checkpoint.load(checkpoint_path)
+    if checkpoint is None:
+        raise ValueError(f'{checkpoint_path} not found')
+    state = checkpoint.state
+    if state.get('finished'):
+        raise ValueError(f"{checkpoint_path} is of a finished run into dataset {state['dataset_id']}")
+    dataset = Dataset.objects.filter(id=state['dataset_id'], uploaded_by=user).first()
+    if dataset is not None and dataset.bulk_lock == state['lock']:
+        if state['pending'] is not None:
+            recover(dataset, checkpoint)
+            with transaction.atomic():
+                dataset_changed(dataset)
+        unlock(dataset)
+    os.remove(checkpoint_path)
+    return dataset
+
+
+def merge_reports(a, b):
+    """Combine the validation reports of two parts of a file"""
+    if a is None:
+        return b
+    reasons = dict(a['reasons'])
+    for reason, count in b['reasons'].items():
+        reasons[reason] = reasons.get(reason, 0) + count
+    return {
+        'invalid_rows': a['invalid_rows'] + b['invalid_rows'],
+        'total_rows': a['total_rows'] + b['total_rows'],
+        'reasons': reasons,
+        'rows': (a['rows'] + b['rows'])[:MAX_REPORTED_ROWS],
+        'truncated': a['invalid_rows'] + b['invalid_rows'] > MAX_REPORTED_ROWS,
+    }
@@ -0,0 +1,130 @@
+"""Dataset bundles: what a dataset view needs, in one response.
+
+``/api/bundle/<id>/`` returns any of these sections, picked with ``?include=``:
+
+* ``summary`` - the ``/api/summary/<id>/`` payload;
+* ``types`` - count, mean, min and max of every parameter per type;
+* ``equipment`` - one page of rows, as ``/api/equipment/<id>/?page=`` returns;
+* ``series`` - the parameters of all rows in id order, downsampled for charts;
+* ``correlation`` - correlation matrices and linear fits of the parameters,
+  as ``overall`` in ``/api/correlation/<id>/``.
+
+Each section reads what it needs from one ``DatasetBundle``, which loads
+the dataset's stored per-type summaries once for ``summary`` and
+``types``. ``series`` reads only the parameter columns. The page has its
+own ``LIMIT`` query: carrying names and types through the series scan
+made a 600k-row bundle about 60% slower. ``series`` is cached per
+dataset and size, so later views read rows for the page only.
+"""
+from functools import cached_property
+
+import numpy as np
+
+from .cache import cached
+from .correlation import describe_correlation
+from .serializers import EquipmentSerializer
+from .summaries import PARAMETERS, build_summary, from_model, get_type_summaries, merge_stats
+
+SECTIONS = ('summary', 'types', 'equipment', 'series', 'correlation')
+DEFAULT_SERIES_POINTS = 1000
+# One bucket keeps a minimum and a maximum row of every parameter
+MIN_SERIES_POINTS = 2 * len(PARAMETERS)
+MAX_SERIES_POINTS = 20000
+
+
+def parse_include(value):
+    """Sections named in a comma-separated ``include``; raises ValueError on unknown ones"""
+    if not value:
+        return list(SECTIONS)
+    include = [section.strip() for section in value.split(',') if section.strip()]
+    unknown = sorted(set(include) - set(SECTIONS))
+    if unknown or not include:
+        raise ValueError(f"include must be a comma-separated list of {', '.join(SECTIONS)}")
+    return list(dict.fromkeys(include))
+
+
+def equipment_page(equipment, page, page_size):
+    """One page of an equipment queryset in id order"""
+    offset = (page - 1) * page_size
+    rows = list(equipment.order_by('id')[offset:offset + page_size + 1])
+    return {'results': EquipmentSerializer(rows[:page_size], many=True).data,
+            'page': page, 'page_size': page_size, 'has_more': len(rows) > page_size}
+
+
+def downsample(values, points):
+    """Sorted row indices of ``values`` (an ``(n, k)`` array) to plot with at most ``points`` rows.
+
+    Rows are cut into equal buckets, and each bucket keeps the rows holding
+    its minimum and its maximum of every column. Spikes stay visible, and
+    the extremes of the downsampled series are the extremes of all rows.
+    A bucket can keep ``2 * k`` rows, so ``points`` must be at least that.
+    """
+    count, columns = values.shape
+    if count <= points:
+        return np.arange(count)
+    buckets = max(1, points // (2 * columns))
+    edges = np.linspace(0, count, buckets + 1).astype(np.intp)
+    keep = [start + np.concatenate([values[start:end].argmin(axis=0), values[start:end].argmax(axis=0)])
+            for start, end in zip(edges[:-1], edges[1:])]
+    return np.unique(np.concatenate(keep))
+
+
+def build_series(dataset, points):
+    values = np.array(list(dataset.equipment.order_by('id').values_list(*PARAMETERS)), dtype=float)
+    values = values.reshape(-1, len(PARAMETERS))
+    index = downsample(values, points)
+    # Columns stay float arrays, which MessagePack sends packed (see api/renderers.py)
+    return {
+        'count': len(values),
+        'index': index.tolist(),
+        **{param: np.ascontiguousarray(values[index, i]) for i, param in enumerate(PARAMETERS)},
+    }
+
+
+def type_stats(summary):
+    stats = from_model(summary)
+    return {
+        'type': summary.type,
+        'count': summary.count,
+        **{param: {stat: float(stats[stat][i]) for stat in ('mean', 'min', 'max')}
+           for i, param in enumerate(PARAMETERS)},
+    }
+
+
+class DatasetBundle:
+    """Builds the sections of one dataset's bundle from shared loads"""
+
+    def __init__(self, dataset, page=1, page_size=20, points=DEFAULT_SERIES_POINTS):
+        self.dataset = dataset
+        self.page = page
+        self.page_size = page_size
+        self.points = points
+
+    @cached_property
+    def type_summaries(self):
+        return get_type_summaries(self.dataset)
+
+    def summary(self):
+        # Shares its cache entry with /api/summary/<id>/
+        return cached('summary', self.dataset.id, (self.dataset.version,),
+                      lambda: build_summary(self.dataset, self.type_summaries))
+
+    def types(self):
+        return [type_stats(summary) for summary in self.type_summaries]
+
+    def equipment(self):
+        return equipment_page(self.dataset.equipment.all(), self.page, self.page_size)
+
+    def series(self):
+        return cached('bundle', self.dataset.id, ('series', self.dataset.version, self.points),
+                      lambda: build_series(self.dataset, self.points))
+
+    def correlation(self):
+        # Joint sketches are not part of type_summaries; they are loaded here only
+        stats = None
+        for summary in get_type_summaries(self.dataset, joint=True):
+            stats = merge_stats(stats, from_model(summary, joint=True))
+        return describe_correlation(stats) if stats else None
+
+    def build(self, include):
+        return {'dataset_id': self.dataset.id, **{section: getattr(self, section)() for section in include}}
@@ -0,0 +1,126 @@
+"""Dataset-tagged caching of derived results.
+
+Summaries, chart series, anomaly reports and rendered report bytes are
+cached in Django's default cache, which is locmem, file or Redis
+depending on ``CACHE_BACKEND``. Every key carries its dataset's current
+tag token. ``invalidate_dataset`` replaces the token, so all entries of
+the dataset become unreachable at once on any backend, and expire or get
+culled later. If a token is itself evicted, a new one is issued, which
+invalidates too, so a stale hit is never possible.
+"""
+import hashlib
+import threading
+import uuid
+from collections import defaultdict
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+MISSING = object()
+
+
+class CacheStats:
+    """Per-process hit/miss/store/invalidation counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.namespaces = defaultdict(lambda: {'hits': 0, 'misses': 0, 'sets': 0})
+            self.invalidations = 0
+
+    def count(self, namespace, counter):
+        with self._lock:
+            self.namespaces[namespace][counter] += 1
+
+    def invalidated(self):
+        with self._lock:
+            self.invalidations += 1
+
+
+stats = CacheStats()
+
+
+def _tag_key(dataset_id):
+    return f'tag:dataset:{dataset_id}'
+
+
+def _tag_token(dataset_id):
+    key = _tag_key(dataset_id)
+    token = cache.get(key)
+    if token is None:
+        token = uuid.uuid4().hex
+        if not cache.add(key, token, timeout=None):
+            token = cache.get(key, token)
+    return token
+
+
+def dataset_key(namespace, dataset_id, *parts):
+    """Cache key for ``parts`` of a dataset's ``namespace``, bound to its current tag"""
+    digest = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+    return f'{namespace}:{dataset_id}:{_tag_token(dataset_id)}:{digest}'
+
+
+def lookup(namespace, key):
+    """Cached value for ``key`` or MISSING; counts a hit or a miss"""
+    value = cache.get(key, MISSING)
+    stats.count(namespace, 'misses' if value is MISSING else 'hits')
+    return value
+
+
+def store(namespace, key, value, timeout=DEFAULT_TIMEOUT):
+    cache.set(key, value, timeout)
+    stats.count(namespace, 'sets')
+
+
+def cached(namespace, dataset_id, parts, compute, timeout=DEFAULT_TIMEOUT):
+    """Return the cached result of ``compute()`` for a dataset, computing it on a miss.
+
+    The key is taken before computing, so a result whose dataset was
+    invalidated meanwhile is stored under the old tag and never served.
+    """
+    key = dataset_key(namespace, dataset_id, *parts)
+    value = lookup(namespace, key)
+    if value is MISSING:
+        value = compute()
+        store(namespace, key, value, timeout)
+    return value
+
+
+def invalidate_dataset(dataset_id):
+    """Drop every cached entry of a dataset"""
+    cache.set(_tag_key(dataset_id), uuid.uuid4().hex, timeout=None)
+    stats.invalidated()
+
+
+def _backend_evictions():
+    counter = getattr(cache, 'evictions', None)
+    if counter is not None:
+        return counter.evictions
+    # Redis counts evictions server-wide
+    get_client = getattr(getattr(cache, '_cache', None), 'get_client', None)
+    if get_client is not None:
+        try:
+            return get_client().info('stats').get('evicted_keys')
+        except Exception:
+            return None
+    return None
+
+
+def cache_stats():
+    with stats._lock:
+        namespaces = {name: dict(counts) for name, counts in stats.namespaces.items()}
+        invalidations = stats.invalidations
+    hits = sum(counts['hits'] for counts in namespaces.values())
+    misses = sum(counts['misses'] for counts in namespaces.values())
+    return {
+        'backend': f"{type(caches['default']).__module__}.{type(caches['default']).__name__}",
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+        'invalidations': invalidations,
+        'evictions': _backend_evictions(),
+        'namespaces': namespaces,
+    }
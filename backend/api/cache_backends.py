@@ -0,0 +1,48 @@
+"""Django cache backends that count evictions.
+
+Thin subclasses of the built-in local-memory and file-based caches. Both
+cull entries when ``MAX_ENTRIES`` is reached, and the count of culled
+entries is exposed through ``/api/cache/stats/``.
+"""
+import random
+import threading
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+class EvictionCounter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def add(self, count):
+        if count > 0:
+            with self._lock:
+                self.evictions += count
+
+
+class CountingLocMemCache(LocMemCache):
+    evictions = EvictionCounter()
+
+    def _cull(self):
+        before = len(self._cache)
+        super()._cull()
+        self.evictions.add(before - len(self._cache))
+
+
+class CountingFileBasedCache(FileBasedCache):
+    evictions = EvictionCounter()
+
+    def _cull(self):
+        # FileBasedCache._cull, counting what it deletes (it runs on every set)
+        filelist = self._list_cache_files()
+        num_entries = len(filelist)
+        if num_entries < self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            self.clear()
+            self.evictions.add(num_entries)
+            return
+        culled = random.sample(filelist, int(num_entries / self._cull_frequency))
+        self.evictions.add(sum(1 for fname in culled if self._delete(fname)))
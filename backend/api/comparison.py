@@ -0,0 +1,69 @@
+"""Cross-dataset comparison of equipment readings.
+
+Per-type deltas come from the stored ``TypeSummary`` rows; per-equipment
+deltas join all selected datasets on equipment name in one vectorized pass
+over a single query (served by the ``(dataset, name)`` index).
+"""
+import numpy as np
+
+from .models import Equipment
+from .summaries import PARAMETERS, from_model, get_type_summaries
+
+
+def _nullable(array):
+    """Convert an ndarray to nested lists with NaN mapped to None"""
+    return np.where(np.isnan(array), None, np.round(array, 4)).tolist()
+
+
+def compare_by_type(datasets):
+    """Per-type counts, means and deltas against the first dataset"""
+    per_dataset = [{s.type: from_model(s) for s in get_type_summaries(dataset)} for dataset in datasets]
+    types = sorted(set().union(*per_dataset))
+    result = {}
+    for eq_type in types:
+        counts = [stats[eq_type]['count'] if eq_type in stats else 0 for stats in per_dataset]
+        means = np.array([stats[eq_type]['mean'] if eq_type in stats else [np.nan] * len(PARAMETERS)
+                          for stats in per_dataset])
+        result[eq_type] = {
+            'count': counts,
+            'mean': _nullable(means),
+            'delta': _nullable(means[1:] - means[0]),
+        }
+    return result
+
+
+def compare_by_equipment(datasets):
+    """Join readings on equipment name and compute deltas against the first dataset.
+
+    Duplicate names within a dataset are averaged. Only units present in the
+    baseline and at least one other dataset are returned.
+    """
+    dataset_ids = [dataset.id for dataset in datasets]
+    rows = list(Equipment.objects.filter(dataset_id__in=dataset_ids)
+                .order_by().values_list('dataset_id', 'name', *PARAMETERS))
+    if not rows:
+        return {'names': [], 'mean': [], 'delta': []}
+    
+    columns = list(zip(*rows))
+    position = {dataset_id: i for i, dataset_id in enumerate(dataset_ids)}
+    ds_codes = np.fromiter((position[d] for d in columns[0]), dtype=np.int64, count=len(rows))
+    names, name_codes = np.unique(np.asarray(columns[1], dtype=object), return_inverse=True)
+    values = np.column_stack([np.asarray(col, dtype=float) for col in columns[2:]])
+    
+    # Mean per (name, dataset) cell via a flat key and bincount
+    n_cells = len(names) * len(dataset_ids)
+    keys = name_codes * len(dataset_ids) + ds_codes
+    counts = np.bincount(keys, minlength=n_cells)
+    sums = np.stack([np.bincount(keys, weights=values[:, i], minlength=n_cells)
+                     for i in range(len(PARAMETERS))], axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = (sums / counts[:, None]).reshape(len(names), len(dataset_ids), len(PARAMETERS))
+    
+    present = counts.reshape(len(names), len(dataset_ids)) > 0
+    keep = present[:, 0] & present[:, 1:].any(axis=1)
+    means = means[keep]
+    return {
+        'names': names[keep].tolist(),
+        'mean': _nullable(means),
+        'delta': _nullable(means[:, 1:] - means[:, :1]),
+    }
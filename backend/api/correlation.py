@@ -0,0 +1,72 @@
+"""Correlations and linear fits between parameters from stored summaries.
+
+Pearson's r and least-squares fits only need the count, means, M2 and
+pair co-moments (C2) kept in every ``TypeSummary``. Spearman's rho is read
+from the per-pair joint sketches, so values within
+``JOINT_RELATIVE_ACCURACY`` of each other count as ties. Everything merges
+across types and datasets with ``merge_stats``, without reading rows.
+"""
+import math
+from itertools import permutations
+
+import numpy as np
+
+from .sketches import rank_correlation
+from .summaries import PAIR_INDICES, PAIRS, PARAMETERS
+
+
+def _comoment(stats, i, j):
+    if i == j:
+        return stats['m2'][i]
+    return stats['c2'][PAIR_INDICES.index((min(i, j), max(i, j)))]
+
+
+def pearson(stats, i, j):
+    """Pearson's r of parameters ``i`` and ``j``, or None if either is constant"""
+    denominator = math.sqrt(stats['m2'][i] * stats['m2'][j])
+    if stats['count'] < 2 or denominator <= 0:
+        return None
+    return float(np.clip(_comoment(stats, i, j) / denominator, -1.0, 1.0))
+
+
+def linear_fit(stats, x, y):
+    """Least-squares fit of parameter ``y`` on parameter ``x`` (names), or None if ``x`` is constant.
+
+    ``residual_std`` is the standard deviation of the residuals, with n - 2
+    degrees of freedom.
+    """
+    i, j = PARAMETERS.index(x), PARAMETERS.index(y)
+    count, m2x, m2y = stats['count'], stats['m2'][i], stats['m2'][j]
+    if count < 2 or m2x <= 0:
+        return None
+    c2 = _comoment(stats, i, j)
+    slope = c2 / m2x
+    r = pearson(stats, i, j)
+    residual = max(m2y - c2 * slope, 0.0)
+    return {
+        'x': x,
+        'y': y,
+        'slope': float(slope),
+        'intercept': float(stats['mean'][j] - slope * stats['mean'][i]),
+        'r_squared': None if r is None else r * r,
+        'residual_std': math.sqrt(residual / (count - 2)) if count > 2 else None,
+    }
+
+
+def describe_correlation(stats):
+    """Pearson and Spearman matrices over ``PARAMETERS`` and fits for every ordered pair.
+
+    ``stats`` must carry joint sketches (``from_model(summary, joint=True)``).
+    """
+    indices = range(len(PARAMETERS))
+    # The diagonals are 1, or None for a constant parameter
+    matrix = [[pearson(stats, i, j) for j in indices] for i in indices]
+    spearman = [[matrix[i][i] if i == j else None for j in indices] for i in indices]
+    for pair, (i, j) in zip(PAIRS, PAIR_INDICES):
+        spearman[i][j] = spearman[j][i] = rank_correlation(stats['joint'][pair])
+    return {
+        'count': stats['count'],
+        'pearson': matrix,
+        'spearman': spearman,
+        'fits': [linear_fit(stats, x, y) for x, y in permutations(PARAMETERS, 2)],
+    }
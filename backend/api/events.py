@@ -0,0 +1,176 @@
+"""In-process publish/subscribe for job progress events.
+
+Ingest (upload), purge and report jobs publish progress events to a
+per-user channel, and ``/api/events/`` streams that channel to clients as
+Server-Sent Events. The broker lives in the server process, so no Redis or
+other service is needed. The catch is that with several worker processes
+a stream only sees jobs handled by the process serving it.
+"""
+import asyncio
+import itertools
+import json
+import queue
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+
+from rest_framework.renderers import BaseRenderer
+
+# Events kept per channel so a reconnecting client can catch up (Last-Event-ID)
+BACKLOG_SIZE = 256
+SUBSCRIBER_QUEUE_SIZE = 1000
+HEARTBEAT_SECONDS = 15
+# Streams end after this long and the client reconnects; this also bounds
+# how long a stream outlives a client that went away without notice
+STREAM_MAX_SECONDS = 300
+RECONNECT_MS = 1000
+JOB_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class Subscription:
+    """One subscriber's queue; fed from any thread, read from a thread or an event loop"""
+
+    def __init__(self, loop=None):
+        self.loop = loop
+        self.queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE) if loop else queue.Queue(SUBSCRIBER_QUEUE_SIZE)
+
+    def put(self, event):
+        if self.loop is None:
+            self._put_nowait(event)
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._put_nowait, event)
+        except RuntimeError:
+            pass  # the loop has closed; the stream is gone
+
+    def _put_nowait(self, event):
+        # A subscriber that falls behind loses its oldest events; publishers never block
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except (queue.Full, asyncio.QueueFull):
+                try:
+                    self.queue.get_nowait()
+                except (queue.Empty, asyncio.QueueEmpty):
+                    pass
+
+
+class EventBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._subscribers = defaultdict(set)
+        self._backlog = defaultdict(lambda: deque(maxlen=BACKLOG_SIZE))
+
+    def publish(self, channel, event):
+        with self._lock:
+            event = {'id': next(self._ids), **event}
+            self._backlog[channel].append(event)
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+        return event
+
+    def subscribe(self, channel, last_event_id=None, loop=None):
+        """Subscribe to a channel; returns ``(subscription, missed)``.
+
+        ``missed`` holds the backlog events after ``last_event_id``.
+        """
+        subscription = Subscription(loop)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+            missed = [] if last_event_id is None else [e for e in self._backlog[channel] if e['id'] > last_event_id]
+        return subscription, missed
+
+    def unsubscribe(self, channel, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+
+broker = EventBroker()
+
+
+class Job:
+    """Publishes the progress of one job to its user's channel.
+
+    Every event carries the job kind, id and stage, plus the fields given
+    here and to ``progress``.
+    """
+
+    def __init__(self, user, kind, job_id=None, **fields):
+        self.channel = user.id
+        self.kind = kind
+        self.id = job_id if job_id and JOB_ID_PATTERN.match(job_id) else uuid.uuid4().hex
+        self.fields = fields
+
+    def progress(self, stage, **data):
+        broker.publish(self.channel, {'job': self.kind, 'job_id': self.id, 'stage': stage,
+                                      'time': time.time(), **self.fields, **data})
+
+
+def format_event(event):
+    return f"id: {event['id']}\ndata: {json.dumps(event)}\n\n"
+
+
+def _wanted(event, job_id):
+    return job_id is None or event['job_id'] == job_id
+
+
+async def astream_events(channel, last_event_id=None, job_id=None):
+    """SSE body for ASGI servers"""
+    loop = asyncio.get_running_loop()
+    subscription, missed = broker.subscribe(channel, last_event_id, loop)
+    try:
+        yield f'retry: {RECONNECT_MS}\n\n'
+        for event in missed:
+            if _wanted(event, job_id):
+                yield format_event(event)
+        deadline = loop.time() + STREAM_MAX_SECONDS
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), min(HEARTBEAT_SECONDS, remaining))
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            if _wanted(event, job_id):
+                yield format_event(event)
+    finally:
+        broker.unsubscribe(channel, subscription)
+
+
+def stream_events(channel, last_event_id=None, job_id=None):
+    """SSE body for WSGI servers; holds a worker thread for the stream's lifetime"""
+    subscription, missed = broker.subscribe(channel, last_event_id)
+    try:
+        yield f'retry: {RECONNECT_MS}\n\n'
+        for event in missed:
+            if _wanted(event, job_id):
+                yield format_event(event)
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                event = subscription.queue.get(timeout=min(HEARTBEAT_SECONDS, remaining))
+            except queue.Empty:
+                yield ': keep-alive\n\n'
+                continue
+            if _wanted(event, job_id):
+                yield format_event(event)
+    finally:
+        broker.unsubscribe(channel, subscription)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets DRF accept ``Accept: text/event-stream``; errors are sent as JSON text"""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode('utf-8')
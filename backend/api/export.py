@@ -0,0 +1,216 @@
+"""Bulk export of datasets as gzip CSV, Parquet or Arrow IPC.
+
+Exports are built from chunked DB reads into a file per dataset version
+under ``EXPORT_ROOT``. The bytes are therefore stable for a given version,
+which is what lets clients resume interrupted downloads with ``Range``.
+Full-detail PDF reports are kept there the same way (``dataset_file``).
+"""
+import csv
+import gzip
+import io
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+
+from .summaries import PARAMETERS
+
+EXPORT_FORMATS = {
+    'csv.gz': 'application/gzip',
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.file',
+}
+# Same header as uploads, so exported CSVs can be uploaded again
+EXPORT_COLUMNS = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
+EXPORT_CHUNK_ROWS = 50000
+STREAM_BLOCK_SIZE = 256 * 1024
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _row_chunks(dataset):
+    rows = dataset.equipment.order_by('id').values_list('name', 'type', *PARAMETERS).iterator(chunk_size=EXPORT_CHUNK_ROWS)
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= EXPORT_CHUNK_ROWS:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _write_csv_gz(dataset, out):
+    # mtime=0 keeps the output byte-identical across rebuilds
+    with gzip.GzipFile(fileobj=out, mode='wb', mtime=0) as compressed:
+        text = io.TextIOWrapper(compressed, encoding='utf-8', newline='')
+        writer = csv.writer(text)
+        writer.writerow(EXPORT_COLUMNS)
+        for chunk in _row_chunks(dataset):
+            writer.writerows(chunk)
+        text.flush()
+        text.detach()
+
+
+def _arrow_batches(pa, dataset, schema):
+    for chunk in _row_chunks(dataset):
+        columns = list(zip(*chunk))
+        yield pa.record_batch([pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                              schema=schema)
+
+
+def _write_arrow(dataset, out, parquet):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError('Parquet and Arrow exports require pyarrow to be installed')
+    schema = pa.schema([(EXPORT_COLUMNS[0], pa.string()), (EXPORT_COLUMNS[1], pa.string())]
+                       + [(col, pa.float64()) for col in EXPORT_COLUMNS[2:]])
+    writer = pq.ParquetWriter(out, schema) if parquet else pa.ipc.new_file(out, schema)
+    with writer:
+        for batch in _arrow_batches(pa, dataset, schema):
+            if parquet:
+                writer.write_batch(batch)
+            else:
+                writer.write(batch)
+
+
+def open_export(dataset, output):
+    """Build (if needed) and open the export file for the dataset's current version"""
+    if output == 'csv.gz':
+        return open_dataset_file(dataset, output, lambda out: _write_csv_gz(dataset, out))
+    return open_dataset_file(dataset, output, lambda out: _write_arrow(dataset, out, parquet=output == 'parquet'))
+
+
+def dataset_file(dataset, suffix, write):
+    """The file ``suffix`` of the dataset's current version, calling ``write(out)`` to build it if missing.
+
+    Files of the dataset's older versions are deleted once it is built. Newer
+    ones are left alone: they belong to requests that already saw a later write.
+    """
+    os.makedirs(settings.EXPORT_ROOT, exist_ok=True)
+    prefix = f'{dataset.id}-'
+    path = os.path.join(settings.EXPORT_ROOT, f'{prefix}{dataset.version}.{suffix}')
+    if os.path.exists(path):
+        return path
+    
+    with tempfile.NamedTemporaryFile(dir=settings.EXPORT_ROOT, delete=False) as out:
+        try:
+            write(out)
+        except BaseException:
+            out.close()
+            os.unlink(out.name)
+            raise
+    os.replace(out.name, path)
+    
+    # Drop exports of older versions of this dataset
+    for name in os.listdir(settings.EXPORT_ROOT):
+        version = name[len(prefix):].split('.', 1)[0]
+        if name.startswith(prefix) and version.isdigit() and int(version) < dataset.version:
+            try:
+                os.unlink(os.path.join(settings.EXPORT_ROOT, name))
+            except FileNotFoundError:
+                pass
+    return path
+
+
+def open_dataset_file(dataset, suffix, write):
+    """``dataset_file`` opened for reading.
+
+    A file deleted between building and opening it (by ``remove_exports`` or a
+    worker pruning versions) is built again once.
+    """
+    try:
+        return open(dataset_file(dataset, suffix, write), 'rb')
+    except FileNotFoundError:
+        return open(dataset_file(dataset, suffix, write), 'rb')
+
+
+def remove_exports(dataset_id):
+    """Delete every export file of a dataset"""
+    if not os.path.isdir(settings.EXPORT_ROOT):
+        return
+    for name in os.listdir(settings.EXPORT_ROOT):
+        if name.startswith(f'{dataset_id}-'):
+            try:
+                os.unlink(os.path.join(settings.EXPORT_ROOT, name))
+            except FileNotFoundError:
+                pass
+
+
+def _file_blocks(f, start, length):
+    with f:
+        f.seek(start)
+        while length > 0:
+            block = f.read(min(STREAM_BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def requested_range(request, size, etag):
+    """``(start, end, partial)`` for a single ``Range: bytes=`` header (and ``If-Range``).
+
+    Returns None when the range cannot be satisfied.
+    """
+    range_header = request.META.get('HTTP_RANGE', '')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    match = RANGE_PATTERN.match(range_header.strip())
+    if not (match and (if_range is None or if_range == etag) and any(match.groups())):
+        return 0, size - 1, False
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    if start > end or start >= size:
+        return None
+    return start, end, True
+
+
+def _ranged_response(response, start, end, size, partial, filename, etag):
+    response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    if partial:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+def _range_not_satisfiable(size):
+    response = HttpResponse(status=416)
+    response['Content-Range'] = f'bytes */{size}'
+    return response
+
+
+def ranged_file_response(request, f, content_type, filename, etag):
+    """Stream the open file ``f`` honouring a single ``Range: bytes=`` header (and ``If-Range``).
+
+    The response closes ``f``. Streaming from the open file keeps serving it
+    even if it is deleted meanwhile.
+    """
+    size = os.fstat(f.fileno()).st_size
+    byte_range = requested_range(request, size, etag)
+    if byte_range is None:
+        f.close()
+        return _range_not_satisfiable(size)
+    start, end, partial = byte_range
+    response = StreamingHttpResponse(_file_blocks(f, start, end - start + 1), status=206 if partial else 200,
+                                     content_type=content_type)
+    return _ranged_response(response, start, end, size, partial, filename, etag)
+
+
+def ranged_content_response(request, content, content_type, filename, etag):
+    """``ranged_file_response`` for bytes held in memory"""
+    byte_range = requested_range(request, len(content), etag)
+    if byte_range is None:
+        return _range_not_satisfiable(len(content))
+    start, end, partial = byte_range
+    response = HttpResponse(content[start:end + 1], status=206 if partial else 200, content_type=content_type)
+    return _ranged_response(response, start, end, len(content), partial, filename, etag)
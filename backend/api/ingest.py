@@ -0,0 +1,327 @@
+"""Writing parsed equipment rows into datasets.
+
+Rows are passed around as columns: a list of names, a list of types and an
+``(n, 3)`` array of flowrate, pressure and temperature.
+
+Every dataset carries a content fingerprint: the sum modulo 2**256 of the
+SHA-256 digests of its normalized rows. Being a multiset hash it ignores
+row order, is computed while the upload streams through the parser, and can
+be updated row by row when an append replaces or adds rows.
+
+Uploads may be plain or gzipped CSV, a ZIP of CSVs (one dataset each), or
+Parquet/Arrow files read through pyarrow's columnar readers when it is
+installed.
+"""
+import codecs
+import csv
+import gzip
+import hashlib
+import io
+import multiprocessing
+import os
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from operator import itemgetter
+
+import django
+import numpy as np
+from django.db import transaction
+from django.db.models import F
+
+from .models import Dataset, Equipment
+from .cache import invalidate_dataset
+from .events import Job
+from .export import remove_exports
+from .search import index_equipment
+from .trends import dataset_changed, dataset_removed
+from .validation import validate_rows
+from .summaries import PARAMETERS, apply_summary_delta, build_type_summaries, summarize_by_type
+
+REQUIRED_COLUMNS = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
+UPLOAD_FORMATS = ('.csv', '.csv.gz', '.zip', '.parquet', '.arrow', '.feather')
+ZIP_MEMBER_FORMATS = ('.csv', '.csv.gz')
+# A ZIP may not hold more datasets than a user keeps
+MAX_ZIP_MEMBERS = 5
+# Starting a worker process costs about 0.5 s, about what parsing 4 MiB of CSV takes
+ZIP_PROCESS_MIN_BYTES = 16 * 2 ** 20
+MAX_USER_DATASETS = 5
+BULK_LOCKED = 'Dataset is being bulk loaded; append to it once the load finishes'
+BULK_BATCH_SIZE = 1000
+# Keep ``name__in`` lookups well under SQLite's bound-parameter limit
+LOOKUP_CHUNK_SIZE = 500
+# Rows inserted between two ingest progress events
+PROGRESS_ROWS = 10000
+
+
+FINGERPRINT_MODULUS = 1 << 256
+
+# ``errors`` is the validation report for rows left out of ``names``/``types``/``values``
+ParsedUpload = namedtuple('ParsedUpload', ['name', 'names', 'types', 'values', 'fingerprint', 'errors'])
+
+
+def row_digest(name, eq_type, flowrate, pressure, temperature):
+    """SHA-256 of one normalized row as an integer"""
+    normalized = '\x1f'.join((name.strip(), eq_type.strip(), repr(float(flowrate)),
+                               repr(float(pressure)), repr(float(temperature))))
+    return int.from_bytes(hashlib.sha256(normalized.encode('utf-8')).digest(), 'big')
+
+
+def format_fingerprint(total):
+    return f'{total % FINGERPRINT_MODULUS:064x}'
+
+
+def compute_fingerprint(dataset):
+    """Fingerprint a stored dataset from its rows"""
+    rows = dataset.equipment.values_list('name', 'type', *PARAMETERS).iterator(chunk_size=5000)
+    return format_fingerprint(sum(row_digest(*row) for row in rows))
+
+
+def missing_columns_error():
+    return ValueError(f'CSV must contain columns: {REQUIRED_COLUMNS}')
+
+
+def read_csv_columns(lines):
+    """Collect the required columns from an iterable of CSV text lines.
+
+    Uses ``csv.reader`` with header positions, not a dict per row, and
+    leaves numeric coercion to the column-batch validation. Returns
+    ``(names, types, values, fingerprint, errors)`` for the valid rows;
+    ``errors`` is the validation report, or None if every row passed.
+    """
+    reader = csv.reader(lines)
+    header = next(reader, [])
+    if not all(col in header for col in REQUIRED_COLUMNS):
+        raise missing_columns_error()
+    positions = [header.index(col) for col in REQUIRED_COLUMNS]
+    pick = itemgetter(*positions)
+    
+    picked, line_numbers, short_rows = [], [], []
+    for row in reader:
+        if not row:
+            continue
+        try:
+            picked.append(pick(row))
+        except IndexError:
+            short_rows.append(len(picked))
+            picked.append(tuple(row[i] if i < len(row) else '' for i in positions))
+        line_numbers.append(reader.line_num)
+    
+    columns = [list(column) for column in zip(*picked)] or [[] for _ in REQUIRED_COLUMNS]
+    short = np.zeros(len(picked), dtype=bool)
+    short[short_rows] = True
+    return _validated_columns(columns[0], columns[1], columns[2:], line_numbers, short)
+
+
+def read_table_columns(table):
+    """Collect the required columns from a pyarrow Table; row numbers stand in for lines"""
+    if not all(col in table.column_names for col in REQUIRED_COLUMNS):
+        raise missing_columns_error()
+    names = ['' if v is None else str(v) for v in table.column('Equipment Name').to_pylist()]
+    types = ['' if v is None else str(v) for v in table.column('Type').to_pylist()]
+    columns = [table.column(col).to_numpy(zero_copy_only=False) for col in REQUIRED_COLUMNS[2:]]
+    return _validated_columns(names, types, columns, np.arange(1, len(names) + 1))
+
+
+def _validated_columns(names, types, columns, lines, short_rows=None):
+    result = validate_rows(names, types, columns, lines, short_rows)
+    values = result.values
+    if result.report is not None:
+        keep = np.flatnonzero(result.valid).tolist()
+        names = [names[i] for i in keep]
+        types = [types[i] for i in keep]
+        values = values[result.valid]
+    total = sum(map(row_digest, names, types, *values.T.tolist()))
+    return names, types, values.reshape(-1, len(PARAMETERS)), format_fingerprint(total), result.report
+
+
+def upload_format(filename):
+    """Return the matching entry of UPLOAD_FORMATS, or None"""
+    filename = filename.lower()
+    for extension in sorted(UPLOAD_FORMATS, key=len, reverse=True):
+        if filename.endswith(extension):
+            return extension
+    return None
+
+
+def read_csv_file(name, fileobj, gzipped=False):
+    """Parse a plain or gzipped CSV binary stream into a ParsedUpload"""
+    if gzipped:
+        with gzip.open(fileobj, 'rt', encoding='utf-8', newline='') as text:
+            return ParsedUpload(name, *read_csv_columns(text))
+    return ParsedUpload(name, *read_csv_columns(codecs.iterdecode(fileobj, 'utf-8')))
+
+
+def _read_zip(fileobj):
+    with zipfile.ZipFile(fileobj) as archive:
+        members = [info for info in archive.infolist()
+                   if not info.is_dir() and upload_format(info.filename) in ZIP_MEMBER_FORMATS]
+        if not members:
+            raise ValueError('ZIP archive contains no CSV files')
+        if len(members) > MAX_ZIP_MEMBERS:
+            raise ValueError(f'ZIP archive may contain at most {MAX_ZIP_MEMBERS} CSV files')
+        
+        members = [(os.path.basename(info.filename), archive.read(info), upload_format(info.filename) == '.csv.gz')
+                   for info in members]
+    
+    workers = min(len(members), os.cpu_count() or 1)
+    if workers == 1 or sum(len(data) for _, data, _ in members) < ZIP_PROCESS_MIN_BYTES:
+        return [_parse_zip_member(*member) for member in members]
+    # CSV parsing holds the GIL, so members are parsed in separate processes.
+    # Spawned rather than forked: the server that calls this may be running threads.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=django.setup) as pool:
+        return list(pool.map(_parse_zip_member, *zip(*members)))
+
+
+def _parse_zip_member(name, data, gzipped):
+    """Parse one ZIP member's bytes; runs in the worker processes"""
+    return read_csv_file(name, io.BytesIO(data), gzipped=gzipped)
+
+
+def read_upload(file):
+    """Parse an uploaded file into a list of ParsedUpload, one per dataset"""
+    fmt = upload_format(file.name)
+    if fmt in ('.csv', '.csv.gz'):
+        return [read_csv_file(file.name, file, gzipped=fmt == '.csv.gz')]
+    if fmt == '.zip':
+        return _read_zip(file)
+    if fmt in ('.parquet', '.arrow', '.feather'):
+        try:
+            import pyarrow.feather
+            import pyarrow.parquet
+        except ImportError:
+            raise ValueError('Parquet and Arrow uploads require pyarrow to be installed')
+        if fmt == '.parquet':
+            table = pyarrow.parquet.read_table(file, columns=REQUIRED_COLUMNS)
+        else:
+            table = pyarrow.feather.read_table(file, columns=REQUIRED_COLUMNS)
+        return [ParsedUpload(file.name, *read_table_columns(table))]
+    raise ValueError(f'Unsupported file type; expected one of {", ".join(UPLOAD_FORMATS)}')
+
+
+def _no_progress(stage, **data):
+    pass
+
+
+def purge_oldest_dataset(user, keep=()):
+    """Delete the user's oldest dataset if they are at MAX_USER_DATASETS, as a purge job.
+
+    Datasets whose ids are in ``keep`` and datasets a bulk ingest run owns
+    are never deleted. Call inside the transaction that creates the new
+    dataset.
+    """
+    user_datasets = Dataset.objects.filter(uploaded_by=user)
+    if user_datasets.count() >= MAX_USER_DATASETS:
+        oldest = user_datasets.exclude(id__in=keep).filter(bulk_lock='').last()
+        if oldest is None:
+            return
+        purge = Job(user, 'purge', dataset_id=oldest.id, name=oldest.name)
+        purge.progress('started')
+        oldest.delete()
+        dataset_removed(user)
+        transaction.on_commit(partial(remove_exports, oldest.id))
+        transaction.on_commit(partial(invalidate_dataset, oldest.id))
+        transaction.on_commit(partial(purge.progress, 'done'))
+
+
+def store_dataset(user, parsed, progress=_no_progress, keep=()):
+    """Create a dataset from a ParsedUpload.
+
+    Returns ``(dataset, duplicate)``; an upload identical to one of the
+    user's datasets returns that dataset without writing anything. The
+    dataset and its rows are written in one transaction. ``progress(stage,
+    **data)`` is called as rows are inserted; evicting the oldest dataset
+    is reported as a separate purge job and skips the ids in ``keep``.
+    """
+    duplicate = Dataset.objects.filter(uploaded_by=user, fingerprint=parsed.fingerprint).first()
+    if duplicate:
+        return duplicate, True
+    
+    with transaction.atomic():
+        purge_oldest_dataset(user, keep)
+        dataset = Dataset.objects.create(name=parsed.name, uploaded_by=user, file_path=parsed.name,
+                                         fingerprint=parsed.fingerprint)
+        create_rows(dataset, parsed.names, parsed.types, parsed.values, progress)
+        dataset_changed(dataset)
+        transaction.on_commit(partial(invalidate_dataset, dataset.id))
+    return dataset, False
+
+
+def create_rows(dataset, names, types, values, progress=_no_progress):
+    """Bulk-insert rows into a new dataset and build its summaries"""
+    total = len(names)
+    rows = values.tolist()
+    for start in range(0, total, PROGRESS_ROWS):
+        stop = min(start + PROGRESS_ROWS, total)
+        Equipment.objects.bulk_create(
+            (Equipment(dataset=dataset, name=name, type=eq_type, flowrate=f, pressure=p, temperature=t)
+             for name, eq_type, (f, p, t) in zip(names[start:stop], types[start:stop], rows[start:stop])),
+            batch_size=BULK_BATCH_SIZE,
+        )
+        progress('inserting', dataset_id=dataset.id, inserted=stop, total=total)
+    index_equipment(dataset.id, names, types)
+    build_type_summaries(dataset)
+    progress('summarized', dataset_id=dataset.id)
+
+
+def upsert_rows(dataset, names, types, values, progress=_no_progress):
+    """Insert or update rows of ``dataset`` by equipment name.
+
+    Rows whose name already exists in the dataset replace that unit's
+    readings (the lowest id wins if the dataset holds duplicates); the rest
+    are inserted. Within the upload the last row for a name wins. Stored
+    summaries are updated incrementally and the dataset version is bumped.
+    Returns ``(inserted, updated)`` counts. Raises ValueError while a bulk
+    ingest run owns the dataset.
+    """
+    latest = {name: i for i, name in enumerate(names)}
+    
+    existing = {}
+    unique_names = list(latest)
+    for start in range(0, len(unique_names), LOOKUP_CHUNK_SIZE):
+        chunk = unique_names[start:start + LOOKUP_CHUNK_SIZE]
+        for row in dataset.equipment.filter(name__in=chunk).order_by('-id').values_list('id', 'name', 'type', *PARAMETERS):
+            existing[row[1]] = row
+    
+    to_update, to_create = [], []
+    for name, i in latest.items():
+        flowrate, pressure, temperature = values[i].tolist()
+        if name in existing:
+            to_update.append(Equipment(id=existing[name][0], dataset=dataset, name=name, type=types[i],
+                                       flowrate=flowrate, pressure=pressure, temperature=temperature))
+        else:
+            to_create.append(Equipment(dataset=dataset, name=name, type=types[i],
+                                       flowrate=flowrate, pressure=pressure, temperature=temperature))
+    
+    old_rows = [existing[e.name] for e in to_update]
+    removed = summarize_by_type([row[2] for row in old_rows], [row[3:] for row in old_rows])
+    kept = list(latest.values())
+    added = summarize_by_type([types[i] for i in kept], values[kept])
+    
+    with transaction.atomic():
+        # A bulk ingest run recovers by deleting rows above its last id, so it must be the only writer
+        if Dataset.objects.filter(id=dataset.id).exclude(bulk_lock='').exists():
+            raise ValueError(BULK_LOCKED)
+        Equipment.objects.bulk_update(to_update, ['type', *PARAMETERS], batch_size=BULK_BATCH_SIZE)
+        progress('updating', dataset_id=dataset.id, updated=len(to_update))
+        last_id = dataset.equipment.order_by('-id').values_list('id', flat=True).first() or 0
+        Equipment.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+        index_equipment(dataset.id, [e.name for e in to_create], [e.type for e in to_create], after_id=last_id)
+        progress('inserting', dataset_id=dataset.id, inserted=len(to_create), total=len(to_create))
+        apply_summary_delta(dataset, added, removed)
+        progress('summarized', dataset_id=dataset.id)
+        dataset_changed(dataset)
+        if dataset.fingerprint:
+            total = int(dataset.fingerprint, 16)
+            total -= sum(row_digest(*row[1:]) for row in old_rows)
+            total += sum(row_digest(e.name, e.type, e.flowrate, e.pressure, e.temperature)
+                         for e in to_update + to_create)
+            fingerprint = format_fingerprint(total)
+        else:
+            fingerprint = compute_fingerprint(dataset)
+        Dataset.objects.filter(id=dataset.id).update(version=F('version') + 1, fingerprint=fingerprint)
+        transaction.on_commit(partial(invalidate_dataset, dataset.id))
+    dataset.refresh_from_db(fields=['version', 'fingerprint'])
+    return len(to_create), len(to_update)
@@ -0,0 +1,99 @@
+"""``manage.py bulk_ingest``: load CSV files into one dataset with a process pool.
+
+    python manage.py bulk_ingest data/ 'archive/**/*.csv.gz' --user admin --name plant-2023
+    python manage.py bulk_ingest --release --user admin --checkpoint .bulk_ingest.json
+
+See api/bulk_ingest.py for how files are split, parsed and written.
+"""
+import os
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from api import bulk_ingest
+from api.validation import ON_ERROR_MODES
+
+
+class Command(BaseCommand):
+    help = 'Load CSV and gzipped CSV files into one dataset, resumably, with parallel parsing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('inputs', nargs='*', help='CSV files, directories of them, or glob patterns')
+        parser.add_argument('--user', required=True, help='Username owning the dataset')
+        target = parser.add_mutually_exclusive_group()
+        target.add_argument('--name', help='Name of the new dataset (default: the first input)')
+        target.add_argument('--dataset-id', type=int, help="Add the rows to this dataset of the user's")
+        parser.add_argument('--workers', type=int, default=None, help='Parser processes (default: CPU count)')
+        parser.add_argument('--split-bytes', type=int, default=bulk_ingest.DEFAULT_SPLIT_BYTES,
+                            help='Parse plain CSVs in parts of this many bytes; 0 for whole files, '
+                                 'which quoted newlines need')
+        parser.add_argument('--batch-rows', type=int, default=bulk_ingest.DEFAULT_BATCH_ROWS,
+                            help='Rows written per transaction (at least one whole part)')
+        parser.add_argument('--checkpoint', help='Progress file; rerun with it to resume '
+                                                 '(default: .bulk_ingest.json in the current directory)')
+        parser.add_argument('--on-error', choices=ON_ERROR_MODES, default='reject',
+                            help='reject stops at the first part with invalid rows; skip leaves them out')
+        parser.add_argument('--release', action='store_true',
+                            help='Give up the unfinished run of --checkpoint, keeping the rows it wrote, '
+                                 'and unlock its dataset')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['user']).first()
+        if user is None:
+            raise CommandError(f"User {options['user']} not found")
+        if options['split_bytes'] < 0 or options['batch_rows'] < 1:
+            raise CommandError('--split-bytes must be 0 or more and --batch-rows 1 or more')
+        if options['workers'] is not None and options['workers'] < 1:
+            raise CommandError('--workers must be 1 or more')
+        checkpoint_path = options['checkpoint'] or os.path.abspath('.bulk_ingest.json')
+        if options['release']:
+            try:
+                dataset = bulk_ingest.release(user, checkpoint_path)
+            except ValueError as e:
+                raise CommandError(str(e))
+            if dataset is not None:
+                self.stdout.write(self.style.SUCCESS(f'Released dataset {dataset.id} from {checkpoint_path}'))
+            return
+        if not options['inputs']:
+            raise CommandError('Name the CSV files to load')
+
+        try:
+            files = bulk_ingest.find_files(options['inputs'])
+            if not files:
+                raise ValueError('No .csv or .csv.gz files found')
+            name = options['name'] or os.path.basename(options['inputs'][0].rstrip('/'))
+            dataset, checkpoint = bulk_ingest.start(user, files, checkpoint_path, name=name,
+                                                    dataset_id=options['dataset_id'],
+                                                    split_bytes=options['split_bytes'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        state = checkpoint.state
+        if state['done']:
+            self.stdout.write(f"Resuming dataset {dataset.id}: {state['rows']} rows in {len(state['done'])} parts written")
+        else:
+            self.stdout.write(f'Loading {len(files)} files into dataset {dataset.id} ({dataset.name})')
+
+        def progress(rows, seconds, parts_done, parts_total):
+            self.stdout.write(f'{rows} rows in {seconds:.1f}s ({rows / max(seconds, 1e-9):,.0f} rows/s), '
+                              f'{parts_done}/{parts_total} parts')
+
+        try:
+            rows, skipped, reports = bulk_ingest.run(dataset, checkpoint, files, workers=options['workers'],
+                                                     batch_rows=options['batch_rows'],
+                                                     on_error=options['on_error'], progress=progress)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for path, report in reports.items():
+            self.stderr.write(f"{path}: {report['invalid_rows']} invalid rows")
+            for row in report['rows'][:10]:
+                self.stderr.write(f"  line {row['line']}: {row['reason']}")
+            if len(report['rows']) > 10 or report['truncated']:
+                self.stderr.write(f"  ... {report['reasons']}")
+        if not state.get('finished'):
+            raise CommandError(f'Stopped at invalid rows. Rerun with --on-error skip to resume from '
+                               f'{checkpoint_path} leaving them out; files not started yet may be fixed first. '
+                               f'Dataset {dataset.id} takes no appends until the run finishes or is released')
+        self.stdout.write(self.style.SUCCESS(
+            f"Dataset {dataset.id}: {rows} rows written by this run, {state['rows']} in all, "
+            f"{state['skipped']} invalid rows skipped"))
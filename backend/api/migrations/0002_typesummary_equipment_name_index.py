@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TypeSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(max_length=100)),
+                ('count', models.IntegerField()),
+                ('flowrate_mean', models.FloatField()),
+                ('flowrate_m2', models.FloatField()),
+                ('flowrate_min', models.FloatField()),
+                ('flowrate_max', models.FloatField()),
+                ('pressure_mean', models.FloatField()),
+                ('pressure_m2', models.FloatField()),
+                ('pressure_min', models.FloatField()),
+                ('pressure_max', models.FloatField()),
+                ('temperature_mean', models.FloatField()),
+                ('temperature_m2', models.FloatField()),
+                ('temperature_min', models.FloatField()),
+                ('temperature_max', models.FloatField()),
+            ],
+            options={
+                'ordering': ['type'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='equipment',
+            index=models.Index(fields=['dataset', 'name'], name='api_equipme_dataset_65ebe9_idx'),
+        ),
+        migrations.AddField(
+            model_name='typesummary',
+            name='dataset',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='type_summaries', to='api.dataset'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='typesummary',
+            unique_together={('dataset', 'type')},
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_typesummary_equipment_name_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_dataset_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='typesummary',
+            name='sketches',
+            field=models.JSONField(default=dict),
+        ),
+    ]
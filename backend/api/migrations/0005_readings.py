@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_typesummary_sketches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadingRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('1m', '1 minute'), ('1h', '1 hour'), ('1d', '1 day')], max_length=2)),
+                ('bucket', models.BigIntegerField()),
+                ('count', models.IntegerField()),
+                ('flowrate_sum', models.FloatField()),
+                ('flowrate_min', models.FloatField()),
+                ('flowrate_max', models.FloatField()),
+                ('pressure_sum', models.FloatField()),
+                ('pressure_min', models.FloatField()),
+                ('pressure_max', models.FloatField()),
+                ('temperature_sum', models.FloatField()),
+                ('temperature_min', models.FloatField()),
+                ('temperature_max', models.FloatField()),
+                ('equipment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='api.equipment')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Reading',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.BigIntegerField()),
+                ('flowrate', models.FloatField()),
+                ('pressure', models.FloatField()),
+                ('temperature', models.FloatField()),
+                ('equipment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='readings', to='api.equipment')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='readingrollup',
+            constraint=models.UniqueConstraint(fields=('resolution', 'equipment', 'bucket'), name='unique_rollup_bucket'),
+        ),
+        migrations.AddConstraint(
+            model_name='reading',
+            constraint=models.UniqueConstraint(fields=('equipment', 'timestamp'), name='unique_reading_per_timestamp'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_readings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='dataset',
+            index=models.Index(fields=['uploaded_by', 'fingerprint'], name='api_dataset_uploade_810d49_idx'),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:49
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+# Full-text index over equipment names and types, read through api/search.py.
+# Rows are added by ingest in bulk; these triggers cover updates and deletes.
+# A later migration that makes SQLite rebuild api_equipment drops the
+# triggers with the old table and has to create them again.
+SEARCH_TABLES = [
+    """CREATE VIRTUAL TABLE api_equipment_search USING fts5(
+        name, type, content='api_equipment', content_rowid='id',
+        tokenize='unicode61', prefix='2 3 4 5 6')""",
+    """CREATE TRIGGER api_equipment_search_ad AFTER DELETE ON api_equipment BEGIN
+        INSERT INTO api_equipment_search (api_equipment_search, rowid, name, type)
+        VALUES ('delete', old.id, old.name, old.type);
+    END""",
+    """CREATE TRIGGER api_equipment_search_au AFTER UPDATE OF name, type ON api_equipment BEGIN
+        INSERT INTO api_equipment_search (api_equipment_search, rowid, name, type)
+        VALUES ('delete', old.id, old.name, old.type);
+        INSERT INTO api_equipment_search (rowid, name, type) VALUES (new.id, new.name, new.type);
+    END""",
+    # Distinct words of names and types, for completions and near misses
+    """CREATE TABLE api_equipment_search_term (
+        id INTEGER PRIMARY KEY, term TEXT NOT NULL UNIQUE)""",
+    """CREATE VIRTUAL TABLE api_equipment_search_term_fts USING fts5(
+        term, content='api_equipment_search_term', content_rowid='id', tokenize='trigram')""",
+    """CREATE TRIGGER api_equipment_search_term_ai AFTER INSERT ON api_equipment_search_term BEGIN
+        INSERT INTO api_equipment_search_term_fts (rowid, term) VALUES (new.id, new.term);
+    END""",
+]
+
+DROP_SEARCH_TABLES = [
+    'DROP TRIGGER IF EXISTS api_equipment_search_term_ai',
+    'DROP TABLE IF EXISTS api_equipment_search_term_fts',
+    'DROP TABLE IF EXISTS api_equipment_search_term',
+    'DROP TRIGGER IF EXISTS api_equipment_search_au',
+    'DROP TRIGGER IF EXISTS api_equipment_search_ad',
+    'DROP TABLE IF EXISTS api_equipment_search',
+]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for statement in SEARCH_TABLES:
+            cursor.execute(statement)
+        cursor.execute("INSERT INTO api_equipment_search (api_equipment_search) VALUES ('rebuild')")
+        # Seed the known words from the index's own vocabulary
+        cursor.execute('CREATE VIRTUAL TABLE temp.api_equipment_search_vocab '
+                       'USING fts5vocab(main, api_equipment_search, row)')
+        cursor.execute('SELECT term FROM temp.api_equipment_search_vocab')
+        terms = [(term,) for term, in cursor.fetchall() if len(term) >= 3 and term.isalpha()]
+        cursor.execute('DROP TABLE temp.api_equipment_search_vocab')
+        cursor.executemany('INSERT OR IGNORE INTO api_equipment_search_term (term) VALUES (%s)', terms)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for statement in DROP_SEARCH_TABLES:
+            cursor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_dataset_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='equipment',
+            index=models.Index(fields=['dataset', 'type'], name='api_equipme_dataset_90c4c8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipment',
+            index=models.Index(models.F('dataset'), django.db.models.functions.text.Lower('name'), name='api_equipment_name_prefix_idx'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_equipment_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='typesummary',
+            name='flowrate_pressure_c2',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='typesummary',
+            name='flowrate_temperature_c2',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='typesummary',
+            name='joint_sketches',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AddField(
+            model_name='typesummary',
+            name='pressure_temperature_c2',
+            field=models.FloatField(null=True),
+        ),
+    ]
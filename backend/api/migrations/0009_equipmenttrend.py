@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0008_typesummary_comoments'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EquipmentTrend',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('type', models.CharField(max_length=100)),
+                ('observations', models.IntegerField()),
+                ('flowrate_latest', models.FloatField()),
+                ('flowrate_drift', models.FloatField()),
+                ('flowrate_rate', models.FloatField(null=True)),
+                ('flowrate_percentile', models.FloatField(null=True)),
+                ('flowrate_percentile_change', models.FloatField(null=True)),
+                ('pressure_latest', models.FloatField()),
+                ('pressure_drift', models.FloatField()),
+                ('pressure_rate', models.FloatField(null=True)),
+                ('pressure_percentile', models.FloatField(null=True)),
+                ('pressure_percentile_change', models.FloatField(null=True)),
+                ('temperature_latest', models.FloatField()),
+                ('temperature_drift', models.FloatField()),
+                ('temperature_rate', models.FloatField(null=True)),
+                ('temperature_percentile', models.FloatField(null=True)),
+                ('temperature_percentile_change', models.FloatField(null=True)),
+                ('dataset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.dataset')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='equipment_trends', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['name'],
+                'indexes': [models.Index(fields=['user', 'type'], name='api_equipme_user_id_c98906_idx')],
+                'unique_together': {('user', 'name')},
+            },
+        ),
+    ]
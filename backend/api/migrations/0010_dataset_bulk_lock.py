@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_equipmenttrend'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='bulk_lock',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
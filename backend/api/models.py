@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Lower
 from django.contrib.auth.models import User
 
 class Dataset(models.Model):
@@ -6,9 +7,19 @@ class Dataset(models.Model):
     uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     file_path = models.CharField(max_length=500)
+    # Bumped whenever the dataset's rows change; keys cached analytics
+    version = models.PositiveIntegerField(default=1)
+    # Order-independent content hash of the rows (see api/ingest.py)
+    fingerprint = models.CharField(max_length=64, blank=True, default='')
+    # Token of the bulk ingest run that owns the dataset (see api/bulk_ingest.py);
+    # no other writer may add rows while it is set
+    bulk_lock = models.CharField(max_length=32, blank=True, default='')
     
     class Meta:
         ordering = ['-uploaded_at']
+        indexes = [
+            models.Index(fields=['uploaded_by', 'fingerprint']),
+        ]
 
 class Equipment(models.Model):
     dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name='equipment')
@@ -18,5 +29,135 @@ class Equipment(models.Model):
     pressure = models.FloatField()
     temperature = models.FloatField()
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['dataset', 'name']),
+            models.Index(fields=['dataset', 'type']),
+            # Case-insensitive name prefixes (see api/search.py)
+            models.Index('dataset', Lower('name'), name='api_equipment_name_prefix_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.type})"
+
+class TypeSummaryManager(models.Manager):
+    def get_queryset(self):
+        # Joint sketches are only read for correlations; load them with .defer(None)
+        return super().get_queryset().defer('joint_sketches')
+
+class TypeSummary(models.Model):
+    """Per-type summary statistics stored at ingest (see api/summaries.py)"""
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name='type_summaries')
+    type = models.CharField(max_length=100)
+    count = models.IntegerField()
+    flowrate_mean = models.FloatField()
+    flowrate_m2 = models.FloatField()
+    flowrate_min = models.FloatField()
+    flowrate_max = models.FloatField()
+    pressure_mean = models.FloatField()
+    pressure_m2 = models.FloatField()
+    pressure_min = models.FloatField()
+    pressure_max = models.FloatField()
+    temperature_mean = models.FloatField()
+    temperature_m2 = models.FloatField()
+    temperature_min = models.FloatField()
+    temperature_max = models.FloatField()
+    # Per-parameter quantile sketches (see api/sketches.py)
+    sketches = models.JSONField(default=dict)
+    # Co-moments of the parameter pairs; null for summaries stored before they were added
+    flowrate_pressure_c2 = models.FloatField(null=True)
+    flowrate_temperature_c2 = models.FloatField(null=True)
+    pressure_temperature_c2 = models.FloatField(null=True)
+    # Per-pair joint sketches for rank correlations (see api/sketches.py)
+    joint_sketches = models.JSONField(default=dict)
+    
+    objects = TypeSummaryManager()
+    
+    class Meta:
+        ordering = ['type']
+        unique_together = ['dataset', 'type']
+    
+    def __str__(self):
+        return f"{self.dataset_id}: {self.type} ({self.count})"
+
+class Reading(models.Model):
+    """One timestamped telemetry sample for an equipment unit.
+
+    ``timestamp`` is stored as epoch milliseconds (an 8-byte integer) rather
+    than a DateTimeField, which SQLite keeps as a ~26 character string.
+    """
+    equipment = models.ForeignKey(Equipment, on_delete=models.CASCADE, related_name='readings')
+    timestamp = models.BigIntegerField()
+    flowrate = models.FloatField()
+    pressure = models.FloatField()
+    temperature = models.FloatField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['equipment', 'timestamp'], name='unique_reading_per_timestamp'),
+        ]
+
+class ReadingRollup(models.Model):
+    """Time-bucketed aggregate of readings at 1m, 1h or 1d resolution"""
+    RESOLUTION_CHOICES = [('1m', '1 minute'), ('1h', '1 hour'), ('1d', '1 day')]
+    
+    equipment = models.ForeignKey(Equipment, on_delete=models.CASCADE, related_name='rollups')
+    resolution = models.CharField(max_length=2, choices=RESOLUTION_CHOICES)
+    # Bucket start in epoch milliseconds
+    bucket = models.BigIntegerField()
+    count = models.IntegerField()
+    flowrate_sum = models.FloatField()
+    flowrate_min = models.FloatField()
+    flowrate_max = models.FloatField()
+    pressure_sum = models.FloatField()
+    pressure_min = models.FloatField()
+    pressure_max = models.FloatField()
+    temperature_sum = models.FloatField()
+    temperature_min = models.FloatField()
+    temperature_max = models.FloatField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['resolution', 'equipment', 'bucket'], name='unique_rollup_bucket'),
+        ]
+
+
+class EquipmentTrend(models.Model):
+    """How a unit's readings moved across the user's datasets, precomputed at ingest (see api/trends.py).
+
+    Only units found in two or more datasets have one. Per parameter it holds
+    the latest mean, the drift since the first dataset, the rate of change
+    per day, and the percentile within the unit's type with its change since
+    the previous dataset.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='equipment_trends')
+    name = models.CharField(max_length=255)
+    type = models.CharField(max_length=100)
+    # Newest dataset holding the unit
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name='+')
+    observations = models.IntegerField()
+    flowrate_latest = models.FloatField()
+    flowrate_drift = models.FloatField()
+    flowrate_rate = models.FloatField(null=True)
+    flowrate_percentile = models.FloatField(null=True)
+    flowrate_percentile_change = models.FloatField(null=True)
+    pressure_latest = models.FloatField()
+    pressure_drift = models.FloatField()
+    pressure_rate = models.FloatField(null=True)
+    pressure_percentile = models.FloatField(null=True)
+    pressure_percentile_change = models.FloatField(null=True)
+    temperature_latest = models.FloatField()
+    temperature_drift = models.FloatField()
+    temperature_rate = models.FloatField(null=True)
+    temperature_percentile = models.FloatField(null=True)
+    temperature_percentile_change = models.FloatField(null=True)
+    
+    class Meta:
+        ordering = ['name']
+        unique_together = ['user', 'name']
+        indexes = [
+            models.Index(fields=['user', 'type']),
+        ]
+    
     def __str__(self):
-        return f"{self.name} ({self.type})"
\ No newline at end of file
+        return f"{self.name} ({self.type}, {self.observations} datasets)"
@@ -0,0 +1,81 @@
+"""Binary response encodings, chosen by the request's ``Accept`` header.
+
+* ``application/msgpack`` - MessagePack, for every endpoint. The payload
+  has the same shape as its JSON. NumPy float arrays, which column data
+  such as the bundle's chart series is kept as, are sent as packed
+  little-endian float64 blocks (ext type ``FLOAT64_ARRAY``) instead of
+  one number at a time. Clients without an ext hook for that type get
+  the raw ``ExtType`` back.
+* ``application/vnd.apache.arrow.stream`` - an Arrow IPC stream of a row
+  list, for endpoints that return rows (``ROW_RENDERERS``). It needs
+  pyarrow, and is only offered when pyarrow is installed.
+
+JSON stays the default, and NumPy arrays reach it as plain lists.
+"""
+import importlib.util
+import json
+
+import msgpack
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils import encoders
+
+FLOAT64_ARRAY = 1
+# Schema metadata key holding the non-row fields of an Arrow response
+ARROW_META_KEY = b'meta'
+
+_json_default = encoders.JSONEncoder().default
+
+
+def _pack_default(obj):
+    if getattr(obj, 'dtype', None) is not None and obj.dtype.kind == 'f' and obj.ndim == 1:
+        return msgpack.ExtType(FLOAT64_ARRAY, obj.astype('<f8', copy=False).tobytes())
+    # Dates, decimals, UUIDs and the like become what the JSON renderer sends
+    return _json_default(obj)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_pack_default)
+
+
+class ArrowRenderer(BaseRenderer):
+    """A list of flat rows as one Arrow record batch.
+
+    A dict payload (a page, or an error) contributes its ``results`` list
+    as the rows. Its other fields are JSON in the schema metadata under
+    ``ARROW_META_KEY``.
+    """
+    media_type = 'application/vnd.apache.arrow.stream'
+    format = 'arrow'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        import pyarrow as pa
+
+        if data is None:
+            return b''
+        meta = {}
+        if isinstance(data, dict):
+            meta = {key: value for key, value in data.items() if key != 'results'}
+            data = data.get('results', [])
+        table = pa.Table.from_pylist(data)
+        if meta:
+            table = table.replace_schema_metadata({ARROW_META_KEY: json.dumps(meta, default=_json_default)})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+
+# pyarrow is found without importing it, which would slow down start-up
+ROW_RENDERERS = [*api_settings.DEFAULT_RENDERER_CLASSES,
+                 *([ArrowRenderer] if importlib.util.find_spec('pyarrow') else [])]
@@ -0,0 +1,510 @@
+"""PDF reports: matplotlib and ReportLab charts, tables and the report layout.
+
+Only ``views.generate_pdf_report`` imports this module, on the first
+report a worker renders, so workers that never render one do not load
+matplotlib or ReportLab (see ``benchmarks/bench_worker_startup.py``).
+"""
+from itertools import chain, islice
+import matplotlib
+matplotlib.use('Agg')  # Use non-interactive backend
+import matplotlib.pyplot as plt
+import numpy as np
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, LongTable, TableStyle, Image, PageBreak
+from reportlab.lib.units import inch
+from reportlab.graphics.shapes import Drawing, Group, String
+from reportlab.graphics.charts.barcharts import VerticalBarChart
+from reportlab.graphics.charts.lineplots import LinePlot
+from reportlab.graphics.charts.piecharts import Pie
+from reportlab.graphics.charts.legends import Legend
+from reportlab.graphics.widgets.markers import makeMarker
+from io import BytesIO
+from .summaries import get_type_summaries, overall_stats
+from .correlation import linear_fit
+from .anomalies import count_mahalanobis_outliers, summary_fences
+
+CHART_COLORS = ['#60a5fa', '#34d399', '#fbbf24', '#f87171', '#a78bfa', '#06b6d4', '#8b5cf6', '#f59e0b', '#ef4444', '#10b981']
+
+def fit_line(data):
+    """End points of a scatter chart's fitted line across its x range"""
+    fit = data['fit']
+    xs = [min(data['x']), max(data['x'])]
+    return xs, [fit['intercept'] + fit['slope'] * x for x in xs]
+
+def fit_label(fit):
+    label = f"y = {fit['slope']:.3g}x {'-' if fit['intercept'] < 0 else '+'} {abs(fit['intercept']):.3g}"
+    return label if fit['r_squared'] is None else f"{label} (R² = {fit['r_squared']:.3f})"
+
+def create_chart(data, chart_type, title, xlabel, ylabel, filename):
+    """Create various types of charts and return as BytesIO object"""
+    plt.figure(figsize=(12, 8))  # Increased figure size
+    plt.style.use('default')
+    
+    if chart_type == 'bar':
+        bars = plt.bar(data['x'], data['y'], color=CHART_COLORS)
+        # Rotate x-axis labels for better readability
+        plt.xticks(rotation=45, ha='right')
+        # Add value labels on top of bars
+        for bar in bars:
+            height = bar.get_height()
+            plt.text(bar.get_x() + bar.get_width()/2., height + max(data['y'])*0.01,
+                    f'{height:.1f}', ha='center', va='bottom', fontsize=10, fontweight='bold')
+    elif chart_type == 'line':
+        plt.plot(data['x'], data['y'], marker='o', linewidth=3, markersize=8, color='#60a5fa')
+        plt.xticks(rotation=45, ha='right')
+    elif chart_type == 'scatter':
+        plt.scatter(data['x'], data['y'], alpha=0.7, s=80, color='#60a5fa', edgecolors='white', linewidth=1)
+        if data.get('fit'):
+            fit_x, fit_y = fit_line(data)
+            plt.plot(fit_x, fit_y, '--', color='#f87171', linewidth=2.5, label=fit_label(data['fit']))
+            plt.legend(fontsize=11)
+    elif chart_type == 'pie':
+        colors = ['#60a5fa', '#34d399', '#fbbf24', '#f87171', '#a78bfa', '#06b6d4', '#8b5cf6', '#f59e0b']
+        # Create pie chart with better label positioning
+        wedges, texts, autotexts = plt.pie(data['y'], labels=data['x'], autopct='%1.1f%%', 
+                                          startangle=90, colors=colors[:len(data['x'])],
+                                          pctdistance=0.85, labeldistance=1.1,
+                                          textprops={'fontsize': 11, 'fontweight': 'bold'})
+        
+        # Improve label positioning to avoid overlap
+        for autotext in autotexts:
+            autotext.set_color('white')
+            autotext.set_fontweight('bold')
+            autotext.set_fontsize(10)
+        
+        # Add legend instead of labels for better readability
+        plt.legend(wedges, [f'{label} ({count})' for label, count in zip(data['x'], data['y'])],
+                  title="Equipment Types", loc="center left", bbox_to_anchor=(1, 0, 0.5, 1),
+                  fontsize=10)
+        
+        # Remove labels from pie chart to reduce congestion
+        for text in texts:
+            text.set_text('')
+    
+    plt.title(title, fontsize=16, fontweight='bold', pad=20)
+    if chart_type != 'pie':
+        plt.xlabel(xlabel, fontsize=14, fontweight='600')
+        plt.ylabel(ylabel, fontsize=14, fontweight='600')
+    
+    plt.grid(True, alpha=0.3, linestyle='--')
+    plt.tight_layout(pad=2.0)  # Increased padding
+    
+    # Save to BytesIO
+    img_buffer = BytesIO()
+    plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight', facecolor='white')
+    img_buffer.seek(0)
+    plt.close()
+    
+    return img_buffer
+
+def create_vector_chart(data, chart_type, title, xlabel, ylabel, width=7*inch, height=5*inch):
+    """Create a chart as a native ReportLab Drawing (vector) flowable.
+
+    Mirrors the chart types of ``create_chart`` but is embedded in the PDF as
+    drawing operators instead of a rasterized PNG.
+    """
+    drawing = Drawing(width, height)
+    drawing.add(String(width / 2, height - 18, title, fontName='Helvetica-Bold',
+                       fontSize=13, textAnchor='middle', fillColor=colors.HexColor('#1e293b')))
+    palette = [colors.HexColor(c) for c in CHART_COLORS]
+    
+    if chart_type == 'pie':
+        pie = Pie()
+        pie.x, pie.y = 30, 30
+        pie.width = pie.height = min(width * 0.5, height - 80)
+        pie.data = list(data['y'])
+        pie.labels = [f"{value / sum(data['y']) * 100:.1f}%" for value in data['y']]
+        pie.startAngle = 90
+        pie.direction = 'clockwise'
+        pie.slices.strokeColor = colors.white
+        pie.slices.fontName = 'Helvetica-Bold'
+        for i in range(len(pie.data)):
+            pie.slices[i].fillColor = palette[i % len(palette)]
+        drawing.add(pie)
+        
+        legend = Legend()
+        legend.x = pie.x + pie.width + 40
+        legend.y = pie.y + pie.height
+        legend.fontName = 'Helvetica'
+        legend.fontSize = 10
+        legend.alignment = 'right'
+        legend.colorNamePairs = [(palette[i % len(palette)], f"{label} ({count})")
+                                 for i, (label, count) in enumerate(zip(data['x'], data['y']))]
+        drawing.add(legend)
+        return drawing
+    
+    if chart_type == 'bar':
+        chart = VerticalBarChart()
+        chart.data = [list(data['y'])]
+        chart.categoryAxis.categoryNames = [str(label) for label in data['x']]
+        chart.categoryAxis.labels.angle = 45
+        chart.categoryAxis.labels.boxAnchor = 'ne'
+        chart.categoryAxis.labels.fontName = 'Helvetica'
+        chart.categoryAxis.labels.fontSize = 8
+        chart.valueAxis.labels.fontName = 'Helvetica'
+        chart.valueAxis.valueMin = 0
+        chart.bars.strokeColor = None
+        for i in range(len(data['y'])):
+            chart.bars[(0, i)].fillColor = palette[i % len(palette)]
+        chart.barLabelFormat = '%.1f'
+        chart.barLabels.nudge = 7
+        chart.barLabels.fontSize = 8
+        chart.barLabels.fontName = 'Helvetica-Bold'
+    else:
+        chart = LinePlot()
+        points = list(zip(data['x'], data['y'])) if chart_type == 'scatter' else list(enumerate(data['y']))
+        chart.data = [points]
+        chart.lines[0].strokeColor = palette[0]
+        chart.lines[0].symbol = makeMarker('FilledCircle', size=4 if chart_type == 'scatter' else 6)
+        chart.lines[0].symbol.fillColor = palette[0]
+        if chart_type == 'scatter':
+            chart.lines[0].strokeColor = None
+            if data.get('fit'):
+                chart.data.append(list(zip(*fit_line(data))))
+                chart.lines[1].strokeColor = palette[3]
+                chart.lines[1].strokeWidth = 1.5
+                chart.lines[1].strokeDashArray = (4, 3)
+                chart.lines[1].symbol = None
+                drawing.add(String(width - 30, height - 36, fit_label(data['fit']), fontName='Helvetica',
+                                   fontSize=9, textAnchor='end', fillColor=palette[3]))
+        chart.xValueAxis.labels.fontName = 'Helvetica'
+        chart.xValueAxis.labels.fontSize = 8
+        chart.yValueAxis.labels.fontName = 'Helvetica'
+        chart.yValueAxis.labels.fontSize = 8
+    
+    chart.x, chart.y = 60, 70
+    chart.width, chart.height = width - 90, height - 120
+    drawing.add(chart)
+    drawing.add(String(chart.x + chart.width / 2, 10, xlabel, fontName='Helvetica-Bold',
+                       fontSize=10, textAnchor='middle'))
+    # Rotated 90 degrees, so (x, y) here lands at (-y, x) on the page
+    ylabel_group = Group(String(chart.y + chart.height / 2, -14, ylabel, fontName='Helvetica-Bold',
+                                fontSize=10, textAnchor='middle'))
+    ylabel_group.rotate(90)
+    drawing.add(ylabel_group)
+    return drawing
+
+REPORT_TABLE_HEADER = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
+REPORT_TABLE_COL_WIDTHS = [1.5*inch, 1*inch, 1*inch, 1*inch, 1*inch]
+DETAIL_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f1f5f9')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#1e293b')),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+    ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
+    ('FONTSIZE', (0, 1), (-1, -1), 9)
+])
+
+def format_equipment_row(name, eq_type, flowrate, pressure, temperature):
+    """Format one equipment row for the detailed data table"""
+    return [
+        name[:20] + '...' if len(name) > 20 else name,
+        eq_type,
+        f"{flowrate:.1f}",
+        f"{pressure:.1f}",
+        f"{temperature:.1f}"
+    ]
+
+def iter_detail_tables(equipment, max_rows, chunk_size):
+    """Yield every equipment row as a series of LongTable flowables.
+
+    Rows are read from the DB ``chunk_size`` at a time and each chunk becomes
+    its own LongTable with a repeated header row, so neither the full queryset
+    nor one giant Table is ever held in memory.
+    """
+    rows = (equipment.order_by('id')
+            .values_list('name', 'type', 'flowrate', 'pressure', 'temperature')[:max_rows]
+            .iterator(chunk_size=chunk_size))
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        table_data = [REPORT_TABLE_HEADER] + [format_equipment_row(*row) for row in chunk]
+        table = LongTable(table_data, colWidths=REPORT_TABLE_COL_WIDTHS, repeatRows=1)
+        table.setStyle(DETAIL_TABLE_STYLE)
+        yield table
+
+def scatter_sample(equipment, total, max_points, chunk_size):
+    """Every k-th ``(pressure, temperature)`` row, at most ``max_points`` of them.
+
+    Rows are streamed in chunks and only the sample is kept.
+    """
+    step = max(-(-total // max_points), 1)
+    rows = equipment.order_by('id').values_list('pressure', 'temperature').iterator(chunk_size=chunk_size)
+    return list(islice(rows, 0, None, step))
+
+class StreamingStory(list):
+    """Story list that is topped up from an iterator while ReportLab builds.
+
+    ``SimpleDocTemplate.build`` consumes flowables from the front of the list,
+    so only the flowables for the chunk being laid out are alive at any time.
+    """
+
+    def __init__(self, flowables, source):
+        super().__init__(flowables)
+        self._source = iter(source)
+
+    def __len__(self):
+        while self._source is not None and super().__len__() < 2:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                self._source = None
+        return super().__len__()
+
+
+def build_report(output, dataset, job, full_detail=False, vector_charts=False):
+    """Render the report of ``dataset`` as a PDF into the file-like ``output``.
+
+    ``full_detail`` lists every row instead of the first 15, and
+    ``vector_charts`` draws ReportLab charts instead of matplotlib PNGs.
+    Progress is reported to ``job``. Statistics come from the stored type
+    summaries; rows are only read for the bounded preview, chart samples and
+    the streamed full-detail table.
+    """
+    equipment = dataset.equipment.all()
+    summaries = get_type_summaries(dataset)
+    detail_tables = None
+    
+    # Create PDF document with better margins
+    doc = SimpleDocTemplate(output, pagesize=A4, rightMargin=50, leftMargin=50, topMargin=50, bottomMargin=50)
+    story = []
+    styles = getSampleStyleSheet()
+    
+    # Custom styles
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=20,
+        spaceAfter=20,
+        textColor=colors.HexColor('#1e293b'),
+        alignment=1  # Center alignment
+    )
+    
+    heading_style = ParagraphStyle(
+        'CustomHeading',
+        parent=styles['Heading2'],
+        fontSize=16,
+        spaceAfter=15,
+        spaceBefore=20,
+        textColor=colors.HexColor('#374151'),
+        borderWidth=1,
+        borderColor=colors.HexColor('#e5e7eb'),
+        borderPadding=10,
+        backColor=colors.HexColor('#f8fafc')
+    )
+    
+    charts_rendered = 0
+    
+    def chart_flowable(data, chart_type, title, xlabel, ylabel, filename, height=5*inch):
+        nonlocal charts_rendered
+        if vector_charts:
+            chart = create_vector_chart(data, chart_type, title, xlabel, ylabel, width=7*inch, height=height)
+        else:
+            chart = Image(create_chart(data, chart_type, title, xlabel, ylabel, filename), width=7*inch, height=height)
+        charts_rendered += 1
+        job.progress('chart', charts=charts_rendered)
+        return chart
+    
+    def page_built(canvas, doc):
+        job.progress('page', pages=doc.page)
+    
+    # Title
+    story.append(Paragraph(f"Equipment Analysis Report: {dataset.name}", title_style))
+    story.append(Spacer(1, 12))
+    
+    if summaries:
+        # Calculate statistics
+        stats = overall_stats(summaries)
+        total_rows = stats['count']
+        avg_flow, avg_pressure, avg_temp = stats['mean']
+        
+        # Equipment type distribution
+        type_counts = {s.type: s.count for s in summaries}
+        
+        # Executive Summary
+        story.append(Paragraph("Executive Summary", heading_style))
+        summary_data = [
+            ['Metric', 'Value'],
+            ['Total Equipment', str(total_rows)],
+            ['Average Flowrate', f"{avg_flow:.2f} L/min"],
+            ['Average Pressure', f"{avg_pressure:.2f} bar"],
+            ['Average Temperature', f"{avg_temp:.2f} °C"],
+            ['Equipment Types', str(len(type_counts))]
+        ]
+        
+        summary_table = Table(summary_data, colWidths=[2*inch, 2*inch])
+        summary_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f1f5f9')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#1e293b')),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0'))
+        ]))
+        story.append(summary_table)
+        story.append(Spacer(1, 20))
+        
+        # Equipment Type Distribution Chart
+        story.append(Paragraph("Equipment Type Distribution", heading_style))
+        type_chart_data = {
+            'x': list(type_counts.keys()),
+            'y': list(type_counts.values())
+        }
+        story.append(chart_flowable(type_chart_data, 'pie', 'Equipment Distribution by Type', '', '', 'type_dist'))
+        story.append(PageBreak())  # Start new page for parameter analysis
+        
+        # Parameter Analysis Charts
+        story.append(Paragraph("Parameter Analysis", heading_style))
+        
+        # Flowrate by Equipment Type
+        # Create shorter, more readable equipment names
+        equipment_list = list(equipment[:8])  # Reduced to 8 items for better readability
+        equipment_names = []
+        for e in equipment_list:
+            name = e.name
+            # If name is too long, use equipment type + index
+            if len(name) > 12:
+                type_count = sum(1 for eq in equipment_list[:equipment_list.index(e)+1] if eq.type == e.type)
+                equipment_names.append(f"{e.type}-{type_count}")
+            else:
+                equipment_names.append(name)
+        
+        flowrate_chart_data = {
+            'x': equipment_names,
+            'y': [e.flowrate for e in equipment_list]
+        }
+        story.append(chart_flowable(flowrate_chart_data, 'bar', 'Flowrate by Equipment (Top 8)', 'Equipment', 'Flowrate (L/min)', 'flowrate'))
+        story.append(Spacer(1, 25))
+        
+        # Pressure vs Temperature Scatter Plot
+        # The fit line comes from the stored co-moments, not the plotted points
+        pressures, temperatures = zip(*scatter_sample(equipment, total_rows, settings.REPORT_SCATTER_MAX_POINTS,
+                                                      settings.REPORT_DETAIL_CHUNK_ROWS))
+        scatter_data = {
+            'x': list(pressures),
+            'y': list(temperatures),
+            'fit': linear_fit(stats, 'pressure', 'temperature'),
+        }
+        story.append(chart_flowable(scatter_data, 'scatter', 'Pressure vs Temperature Correlation', 'Pressure (bar)', 'Temperature (°C)', 'scatter'))
+        story.append(Spacer(1, 25))
+        
+        # Add Parameter Comparison Chart
+        story.append(Paragraph("Parameter Comparison by Equipment Type", heading_style))
+        
+        # Per-type averages are kept in the type summaries
+        type_avg_data = {s.type: {'flowrate': s.flowrate_mean, 'pressure': s.pressure_mean,
+                                  'temperature': s.temperature_mean}
+                         for s in summaries}
+        
+        # Create comparison bar chart for average flowrates by type
+        if type_avg_data:
+            comparison_data = {
+                'x': list(type_avg_data.keys()),
+                'y': [data['flowrate'] for data in type_avg_data.values()]
+            }
+            story.append(chart_flowable(comparison_data, 'bar', 'Average Flowrate by Equipment Type', 'Equipment Type', 'Average Flowrate (L/min)', 'comparison', height=4*inch))
+            story.append(PageBreak())  # Start new page for detailed data
+        
+        # Detailed Equipment Data Table
+        story.append(Paragraph("Detailed Equipment Data", heading_style))
+        
+        if full_detail:
+            max_rows = settings.REPORT_DETAIL_MAX_ROWS
+            if total_rows > max_rows:
+                story.append(Paragraph(f"Showing the first {max_rows} of {total_rows} items (report size cap).", styles['Normal']))
+                story.append(Spacer(1, 6))
+            detail_tables = iter_detail_tables(equipment, max_rows, settings.REPORT_DETAIL_CHUNK_ROWS)
+            # Everything after the table is queued behind the streamed chunks
+            story_head, story = story, []
+        else:
+            table_data = [REPORT_TABLE_HEADER]
+            
+            for e in equipment[:15]:  # Show first 15 items
+                table_data.append(format_equipment_row(e.name, e.type, e.flowrate, e.pressure, e.temperature))
+            
+            if total_rows > 15:
+                table_data.append(['...', '...', '...', '...', '...'])
+                table_data.append([f"Total: {total_rows} items", '', '', '', ''])
+            
+            equipment_table = Table(table_data, colWidths=REPORT_TABLE_COL_WIDTHS)
+            equipment_table.setStyle(DETAIL_TABLE_STYLE)
+            story.append(equipment_table)
+        story.append(Spacer(1, 20))
+        
+        # Statistical Analysis
+        story.append(Paragraph("Statistical Analysis", heading_style))
+        
+        # Population standard deviations, like np.std
+        flow_std, pressure_std, temp_std = np.sqrt(stats['m2'] / total_rows)
+        minimums, maximums = stats['min'], stats['max']
+        
+        stats_data = [
+            ['Parameter', 'Mean', 'Std Dev', 'Min', 'Max'],
+            ['Flowrate (L/min)', f"{avg_flow:.2f}", f"{flow_std:.2f}", f"{minimums[0]:.2f}", f"{maximums[0]:.2f}"],
+            ['Pressure (bar)', f"{avg_pressure:.2f}", f"{pressure_std:.2f}", f"{minimums[1]:.2f}", f"{maximums[1]:.2f}"],
+            ['Temperature (°C)', f"{avg_temp:.2f}", f"{temp_std:.2f}", f"{minimums[2]:.2f}", f"{maximums[2]:.2f}"]
+        ]
+        
+        stats_table = Table(stats_data, colWidths=[1.5*inch, 1*inch, 1*inch, 1*inch, 1*inch])
+        stats_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f1f5f9')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#1e293b')),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
+            ('FONTSIZE', (0, 1), (-1, -1), 9)
+        ]))
+        story.append(stats_table)
+        story.append(Spacer(1, 20))
+        
+        # Recommendations
+        story.append(Paragraph("Recommendations & Insights", heading_style))
+        recommendations = []
+        
+        # Outliers beyond the IQR fences and unusual reading combinations, counted by the database
+        lower_fences, upper_fences = summary_fences(stats)
+        
+        high_temp_count = equipment.filter(temperature__gt=float(upper_fences[2])).count()
+        if high_temp_count:
+            recommendations.append(f"• {high_temp_count} equipment items are operating at unusually high temperatures (>{upper_fences[2]:.1f}°C). Consider reviewing cooling systems.")
+        
+        high_pressure_count = equipment.filter(pressure__gt=float(upper_fences[1])).count()
+        if high_pressure_count:
+            recommendations.append(f"• {high_pressure_count} equipment items are operating at unusually high pressures (>{upper_fences[1]:.1f} bar). Monitor for safety compliance.")
+        
+        unusual_count = count_mahalanobis_outliers(equipment, stats)
+        if unusual_count:
+            recommendations.append(f"• {unusual_count} equipment items show an unusual combination of flowrate, pressure and temperature. Inspect them for sensor faults or abnormal operation.")
+        
+        # Equipment type recommendations
+        most_common_type = max(type_counts, key=type_counts.get)
+        recommendations.append(f"• {most_common_type} equipment represents {type_counts[most_common_type]/total_rows*100:.1f}% of your fleet. Consider standardization benefits.")
+        
+        recommendations.append("• Regular maintenance scheduling recommended based on operating parameters.")
+        recommendations.append("• Consider implementing real-time monitoring for critical equipment.")
+        
+        for rec in recommendations:
+            story.append(Paragraph(rec, styles['Normal']))
+            story.append(Spacer(1, 6))
+        
+    else:
+        story.append(Paragraph("No equipment data available for this dataset.", styles['Normal']))
+    
+    if detail_tables is not None:
+        story = StreamingStory(story_head, chain(detail_tables, story))
+    
+    # Build PDF
+    doc.build(story, onFirstPage=page_built, onLaterPages=page_built)
+    job.progress('done', charts=charts_rendered, pages=doc.page)
@@ -0,0 +1,271 @@
+"""Equipment search across a user's datasets.
+
+Results come in three tiers, best first, and each result records how it
+matched:
+
+1. ``prefix`` - the name starts with the query. This tier is read from the
+   ``(dataset, lower(name))`` index, newest dataset first and alphabetically
+   within a dataset. Case is ignored for ASCII letters only.
+2. ``name`` or ``type`` - every query word starts a word of the name or of
+   the type. ``name`` means the name alone matched. Newest rows come first.
+3. ``fuzzy`` - words may also be near misses of known words.
+
+On SQLite, tiers 2 and 3 are answered by an FTS5 table
+(``api_equipment_search``, created by migration 0007) that reads the
+equipment table as external content.
+- Ingest indexes its new rows with one ``INSERT ... SELECT`` after its bulk
+  inserts; a per-row insert trigger made uploads about four times slower.
+- Single saves are indexed by a ``post_save`` handler.
+- Triggers keep the index in step on update and delete.
+
+Each tier is read in rowid order, which FTS5 serves straight from its
+doclists. Ordering by bm25 would score every match, which takes most of a
+second for a word like "pump" at a million rows.
+
+Words of 2 to 6 characters are prefix-matched through the FTS5 prefix
+indexes. Longer words are expanded to the known words they begin, and
+one-character words only match whole words. Known words are the distinct
+alphabetic words of all names and types, kept in
+``api_equipment_search_term``. Near misses are found through a trigram index
+over that table.
+
+Other databases use ``icontains`` lookups for tier 2 and have no fuzzy tier.
+"""
+import difflib
+import re
+import string
+import unicodedata
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Equipment
+
+SEARCH_FIELDS = ('id', 'dataset_id', 'name', 'type', 'flowrate', 'pressure', 'temperature')
+MIN_QUERY_LENGTH = 2
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# Every page re-reads the results before it, so paging stops this deep
+MAX_RESULTS = 1000
+# The longest prefix= length of api_equipment_search (see migration 0007)
+MAX_INDEXED_PREFIX = 6
+MAX_EXPANSIONS = 20
+MIN_TERM_LENGTH = 3
+MIN_FUZZY_LENGTH = 4
+FUZZY_CANDIDATES = 50
+FUZZY_MATCHES = 5
+FUZZY_CUTOFF = 0.75
+
+# Same word boundaries as FTS5's unicode61 tokenizer
+TOKEN_PATTERN = re.compile(r'[^\W_]+')
+# Whole words of letters only; ids and codes are left out
+TERM_PATTERN = re.compile(r'\b[^\W\d_]{%d,}\b' % MIN_TERM_LENGTH)
+# SQLite's lower() only folds ASCII
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def search_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def fold(word):
+    """Lower-case and strip diacritics, as unicode61 does"""
+    word = word.lower()
+    if word.isascii():
+        return word
+    return ''.join(c for c in unicodedata.normalize('NFKD', word) if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    return [fold(token) for token in TOKEN_PATTERN.findall(text)]
+
+
+def index_terms(strings):
+    """Distinct folded words of ``strings`` worth completing or correcting to"""
+    return {fold(word) for word in set(TERM_PATTERN.findall('\n'.join(strings)))}
+
+
+def index_equipment(dataset_id, names, types, after_id=0):
+    """Index rows of a dataset with an id above ``after_id``.
+
+    ``names`` and ``types`` are the values those rows were created with.
+    Call this after bulk inserts, which skip ``post_save``.
+    """
+    if not search_enabled():
+        return
+    terms = index_terms(names) | index_terms(set(types))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'INSERT INTO api_equipment_search (rowid, name, type) '
+            'SELECT id, name, type FROM api_equipment WHERE dataset_id = %s AND id > %s',
+            [dataset_id, after_id],
+        )
+        cursor.executemany('INSERT OR IGNORE INTO api_equipment_search_term (term) VALUES (%s)',
+                           [(term,) for term in terms])
+
+
+@receiver(post_save, sender=Equipment)
+def index_saved_equipment(sender, instance, created, raw=False, **kwargs):
+    # Updates are handled by the api_equipment_search_au trigger
+    if created and not raw:
+        index_equipment(instance.dataset_id, [instance.name], [instance.type], after_id=instance.id - 1)
+
+
+def _quote(word):
+    # Tokens are letters and digits only, so they never hold a quote
+    return f'"{word}"'
+
+
+def _any(words):
+    words = list(dict.fromkeys(words))
+    if len(words) == 1:
+        return words[0]
+    return '(' + ' OR '.join(words) + ')'
+
+
+def _completions(cursor, token):
+    cursor.execute(
+        'SELECT term FROM api_equipment_search_term WHERE term > %s AND term < %s ORDER BY term LIMIT %s',
+        [token, token + '\U0010ffff', MAX_EXPANSIONS],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _near_misses(cursor, token):
+    trigrams = {token[i:i + 3] for i in range(len(token) - 2)}
+    cursor.execute(
+        'SELECT term FROM api_equipment_search_term_fts WHERE api_equipment_search_term_fts MATCH %s '
+        'ORDER BY rank LIMIT %s',
+        [' OR '.join(map(_quote, sorted(trigrams))), FUZZY_CANDIDATES],
+    )
+    candidates = [row[0] for row in cursor.fetchall()]
+    return [term for term in difflib.get_close_matches(token, candidates, FUZZY_MATCHES, FUZZY_CUTOFF)
+            if term != token]
+
+
+def _word(cursor, token):
+    """FTS5 expression matching words that start with ``token``"""
+    if len(token) == 1:
+        return _quote(token)
+    if len(token) <= MAX_INDEXED_PREFIX:
+        return _quote(token) + '*'
+    # Longer prefixes have no index and would read every matching doclist
+    return _any(map(_quote, [token, *_completions(cursor, token)]))
+
+
+def match_expressions(cursor, tokens, fuzzy=True):
+    """Yield ``(tier, expression)`` for the word and fuzzy tiers.
+
+    Near misses are only looked up once the fuzzy tier is reached.
+    """
+    words = [_word(cursor, token) for token in tokens]
+    yield 'words', ' AND '.join(words)
+    if fuzzy:
+        expanded = [_any([word, *map(_quote, _near_misses(cursor, token))])
+                    if len(token) >= MIN_FUZZY_LENGTH and token.isalpha() else word
+                    for token, word in zip(tokens, words)]
+        if expanded != words:
+            yield 'fuzzy', ' AND '.join(expanded)
+
+
+def _id_bounds(cursor, dataset_ids):
+    """Smallest and largest equipment id in the datasets, through the dataset index"""
+    ends = ', '.join('(SELECT id FROM api_equipment WHERE dataset_id = %s ORDER BY id LIMIT 1), '
+                     '(SELECT id FROM api_equipment WHERE dataset_id = %s ORDER BY id DESC LIMIT 1)'
+                     for _ in dataset_ids)
+    cursor.execute(f'SELECT {ends}', [i for dataset_id in dataset_ids for i in (dataset_id, dataset_id)])
+    ids = [i for i in cursor.fetchone() if i is not None]
+    return (min(ids), max(ids)) if ids else None
+
+
+def _prefix_rows(cursor, query, dataset_ids, eq_type, limit):
+    prefix = ' '.join(query.split()).translate(ASCII_LOWER)
+    columns = ', '.join(SEARCH_FIELDS)
+    # Matches the api_equipment_name_prefix_idx expression index
+    sql = (f'SELECT {columns} FROM api_equipment WHERE dataset_id = %s '
+           f'AND LOWER(name) >= %s AND LOWER(name) < %s')
+    if eq_type:
+        sql += ' AND type = %s'
+    sql += ' ORDER BY LOWER(name) LIMIT %s'
+    rows = []
+    for dataset_id in sorted(dataset_ids, reverse=True):
+        if len(rows) >= limit:
+            break
+        cursor.execute(sql, [dataset_id, prefix, prefix + '\U0010ffff', *([eq_type] if eq_type else []),
+                             limit - len(rows)])
+        rows.extend(cursor.fetchall())
+    return rows
+
+
+def _fts_rows(cursor, tokens, dataset_ids, eq_type, limit, fuzzy):
+    bounds = _id_bounds(cursor, dataset_ids)
+    if bounds is None:
+        return
+    columns = ', '.join(f'e.{field}' for field in SEARCH_FIELDS)
+    placeholders = ', '.join(['%s'] * len(dataset_ids))
+    sql = (f'SELECT {columns} FROM api_equipment_search s JOIN api_equipment e ON e.id = s.rowid '
+           f'WHERE s.api_equipment_search MATCH %s AND s.rowid BETWEEN %s AND %s '
+           f'AND e.dataset_id IN ({placeholders})')
+    # The type is also matched inside FTS5, which intersects doclists far
+    # faster than the join filters rows
+    type_phrase = ' '.join(tokenize(eq_type or ''))
+    type_match = f' AND type : (^"{type_phrase}")' if type_phrase else ''
+    if eq_type:
+        sql += ' AND e.type = %s'
+    sql += ' ORDER BY s.rowid DESC LIMIT %s'
+    for tier, expression in match_expressions(cursor, tokens, fuzzy):
+        params = [expression + type_match, *bounds, *dataset_ids, *([eq_type] if eq_type else []), limit]
+        cursor.execute(sql, params)
+        yield tier, cursor.fetchall()
+
+
+def _orm_rows(tokens, dataset_ids, eq_type, limit):
+    rows = Equipment.objects.filter(dataset_id__in=dataset_ids)
+    if eq_type:
+        rows = rows.filter(type=eq_type)
+    for token in tokens:
+        rows = rows.filter(Q(name__icontains=token) | Q(type__icontains=token))
+    yield 'words', rows.order_by('-id').values_list(*SEARCH_FIELDS)[:limit]
+
+
+def _name_matches(tokens, name):
+    words = tokenize(name)
+    return all(any(word.startswith(token) for word in words) for token in tokens)
+
+
+def search_equipment(query, dataset_ids, eq_type=None, page=1, page_size=DEFAULT_PAGE_SIZE, fuzzy=True):
+    """One page of ranked matches for ``query`` in the given datasets.
+
+    Returns ``(results, has_more)``; each result holds the equipment fields
+    and how it ``match``-ed.
+    """
+    tokens = tokenize(query)
+    offset = (page - 1) * page_size
+    end = min(offset + page_size, MAX_RESULTS)
+    if not tokens or not dataset_ids or offset >= end:
+        return [], False
+
+    # A tier shares at most len(results) rows with the tiers before it, so
+    # its first ``end + 1`` rows always hold enough new ones
+    limit = end + 1
+    with connection.cursor() as cursor:
+        results = {row[0]: {**dict(zip(SEARCH_FIELDS, row)), 'match': 'prefix'}
+                   for row in _prefix_rows(cursor, query, dataset_ids, eq_type, limit)}
+        if len(results) <= end:
+            if search_enabled():
+                tiers = _fts_rows(cursor, tokens, dataset_ids, eq_type, limit, fuzzy)
+            else:
+                tiers = _orm_rows(tokens, dataset_ids, eq_type, limit)
+            for tier, rows in tiers:
+                for row in rows:
+                    if row[0] not in results:
+                        match = tier
+                        if tier == 'words':
+                            match = 'name' if _name_matches(tokens, row[2]) else 'type'
+                        results[row[0]] = {**dict(zip(SEARCH_FIELDS, row)), 'match': match}
+                if len(results) > end:
+                    break
+    results = list(results.values())
+    return results[offset:end], len(results) > end and end < MAX_RESULTS
@@ -11,7 +11,7 @@ class DatasetSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Dataset
-        fields = ['id', 'name', 'uploaded_at', 'equipment_count']
+        fields = ['id', 'name', 'uploaded_at', 'equipment_count', 'fingerprint']
     
     def get_equipment_count(self, obj):
         return obj.equipment.count()
\ No newline at end of file
@@ -0,0 +1,200 @@
+"""Mergeable quantile sketches for equipment parameters.
+
+A sketch maps every value to a logarithmic bucket ``ceil(log_gamma(|x|))``
+(DDSketch), so any quantile read back from it is within
+``RELATIVE_ACCURACY`` of the true value. Sketches with the same accuracy
+merge by adding bucket counts, so percentiles and histograms over several
+types or datasets cost O(buckets) and never touch equipment rows.
+
+Sketches are stored as JSON-friendly dicts::
+
+    {'zero': 0, 'pos': {'keys': [...], 'counts': [...]},
+     'neg': {'keys': [...], 'counts': [...]}}
+"""
+import math
+
+import numpy as np
+
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+# Magnitudes below this are counted in the zero bucket
+MIN_MAGNITUDE = 1e-9
+
+
+def _store(magnitudes):
+    keys, counts = np.unique(np.ceil(np.log(magnitudes) / LOG_GAMMA).astype(np.int64), return_counts=True)
+    return {'keys': keys.tolist(), 'counts': counts.tolist()}
+
+
+def build_sketch(values):
+    """Sketch a 1-d array of values"""
+    values = np.asarray(values, dtype=float)
+    return {
+        'zero': int(np.count_nonzero(np.abs(values) < MIN_MAGNITUDE)),
+        'pos': _store(values[values >= MIN_MAGNITUDE]),
+        'neg': _store(-values[values <= -MIN_MAGNITUDE]),
+    }
+
+
+def _merge_store(a, b, sign=1):
+    keys = np.concatenate([a['keys'], b['keys']]).astype(np.int64)
+    counts = np.concatenate([a['counts'], np.multiply(b['counts'], sign)]).astype(np.int64)
+    merged_keys, inverse = np.unique(keys, return_inverse=True)
+    merged_counts = np.bincount(inverse, weights=counts, minlength=len(merged_keys)).astype(np.int64)
+    nonzero = merged_counts > 0
+    return {'keys': merged_keys[nonzero].tolist(), 'counts': merged_counts[nonzero].tolist()}
+
+
+def merge_sketches(a, b):
+    """Merge two sketches; ``None`` acts as the empty sketch"""
+    if a is None:
+        return b
+    return {
+        'zero': a['zero'] + b['zero'],
+        'pos': _merge_store(a['pos'], b['pos']),
+        'neg': _merge_store(a['neg'], b['neg']),
+    }
+
+
+def subtract_sketches(a, b):
+    """Remove the values sketched in ``b`` from ``a`` (``b`` must be a subset of ``a``)"""
+    return {
+        'zero': a['zero'] - b['zero'],
+        'pos': _merge_store(a['pos'], b['pos'], sign=-1),
+        'neg': _merge_store(a['neg'], b['neg'], sign=-1),
+    }
+
+
+def _buckets(sketch):
+    """Return ``(values, counts)`` of bucket representatives in ascending order"""
+    neg_keys = np.asarray(sketch['neg']['keys'], dtype=float)[::-1]
+    pos_keys = np.asarray(sketch['pos']['keys'], dtype=float)
+    values = np.concatenate([
+        -2 * GAMMA ** neg_keys / (GAMMA + 1),
+        [0.0] if sketch['zero'] else [],
+        2 * GAMMA ** pos_keys / (GAMMA + 1),
+    ])
+    counts = np.concatenate([
+        np.asarray(sketch['neg']['counts'], dtype=np.int64)[::-1],
+        [sketch['zero']] if sketch['zero'] else [],
+        np.asarray(sketch['pos']['counts'], dtype=np.int64),
+    ])
+    return values, counts
+
+
+def sketch_count(sketch):
+    return sketch['zero'] + sum(sketch['pos']['counts']) + sum(sketch['neg']['counts'])
+
+
+def quantiles(sketch, qs, lower=None, upper=None):
+    """Approximate quantiles ``qs`` (each in [0, 1]), clamped to ``[lower, upper]``"""
+    values, counts = _buckets(sketch)
+    if not len(values):
+        return [None] * len(qs)
+    ranks = np.asarray(qs, dtype=float) * (counts.sum() - 1)
+    result = values[np.searchsorted(np.cumsum(counts), ranks, side='right')]
+    if lower is not None or upper is not None:
+        result = np.clip(result, lower, upper)
+    return result.tolist()
+
+
+def _representatives(values):
+    """The bucket representative of each value, as ``_buckets`` computes them"""
+    values = np.asarray(values, dtype=float)
+    magnitudes = np.maximum(np.abs(values), MIN_MAGNITUDE)
+    representatives = 2 * GAMMA ** np.ceil(np.log(magnitudes) / LOG_GAMMA) / (GAMMA + 1)
+    representatives[np.abs(values) < MIN_MAGNITUDE] = 0.0
+    return np.where(values < 0, -representatives, representatives)
+
+
+def ranks(sketch, values):
+    """Fraction of the sketched values below each of ``values``; a value's own bucket counts half"""
+    buckets, counts = _buckets(sketch)
+    if not len(buckets):
+        return np.full(len(values), np.nan)
+    representatives = _representatives(values)
+    below = np.concatenate([[0], np.cumsum(counts)])
+    start = np.searchsorted(buckets, representatives, side='left')
+    stop = np.searchsorted(buckets, representatives, side='right')
+    return (below[start] + below[stop]) / 2 / counts.sum()
+
+
+def histogram(sketch, bins, lower, upper):
+    """Equal-width histogram over ``[lower, upper]`` built from bucket representatives"""
+    values, counts = _buckets(sketch)
+    if lower == upper:
+        upper = lower + 1
+    counts, edges = np.histogram(np.clip(values, lower, upper), bins=bins, range=(lower, upper), weights=counts)
+    return {'edges': edges.tolist(), 'counts': counts.astype(np.int64).tolist()}
+
+
+# Joint sketches count value pairs per 2-d bucket, for rank correlations.
+# They use coarser buckets than the 1-d sketches to stay small.
+JOINT_RELATIVE_ACCURACY = 0.02
+JOINT_LOG_GAMMA = math.log((1 + JOINT_RELATIVE_ACCURACY) / (1 - JOINT_RELATIVE_ACCURACY))
+
+
+def joint_keys(values):
+    """Signed joint-sketch bucket keys that sort like ``values``; 0 is the zero bucket"""
+    magnitudes = np.maximum(np.abs(values), MIN_MAGNITUDE)
+    keys = (np.ceil(np.log(magnitudes) / JOINT_LOG_GAMMA)
+            - math.ceil(math.log(MIN_MAGNITUDE) / JOINT_LOG_GAMMA) + 1).astype(np.int64)
+    keys[np.abs(values) < MIN_MAGNITUDE] = 0
+    return np.where(values < 0, -keys, keys)
+
+
+def _joint_store(x, y, counts=None):
+    """Count cells under one int64 per (x, y) key pair; ``counts`` default to one per pair.
+
+    1-d np.unique is several times faster than np.unique(axis=0) on the pairs.
+    """
+    cells = (np.asarray(x, dtype=np.int64) << 32) + (np.asarray(y, dtype=np.int64) + (1 << 31))
+    if counts is None:
+        cells, counts = np.unique(cells, return_counts=True)
+    else:
+        cells, inverse = np.unique(cells, return_inverse=True)
+        counts = np.bincount(inverse, weights=counts, minlength=len(cells)).astype(np.int64)
+    nonzero = counts > 0
+    cells = cells[nonzero]
+    return {'x': (cells >> 32).tolist(), 'y': ((cells & 0xFFFFFFFF) - (1 << 31)).tolist(),
+            'counts': counts[nonzero].tolist()}
+
+
+def build_joint_sketch(x_keys, y_keys):
+    """Sketch value pairs from the ``joint_keys`` of either side"""
+    return _joint_store(x_keys, y_keys)
+
+
+def merge_joint_sketches(a, b, sign=1):
+    """Merge two joint sketches, or remove ``b`` from ``a`` with ``sign=-1``; ``None`` acts as empty"""
+    if a is None:
+        return b
+    return _joint_store(a['x'] + b['x'], a['y'] + b['y'], np.concatenate([a['counts'], np.multiply(b['counts'], sign)]))
+
+
+def _midranks(keys, counts):
+    """Mid-rank of each cell's bucket along one axis; tied values share a rank"""
+    buckets, inverse = np.unique(keys, return_inverse=True)
+    totals = np.bincount(inverse, weights=counts, minlength=len(buckets))
+    return (np.cumsum(totals) - (totals - 1) / 2)[inverse]
+
+
+def rank_correlation(joint):
+    """Spearman's rho from a joint sketch, or None if either side is constant.
+
+    Values in one bucket count as ties, so the result is that of values
+    rounded to ``JOINT_RELATIVE_ACCURACY``.
+    """
+    counts = np.asarray(joint['counts'], dtype=float)
+    if not len(counts):
+        return None
+    x = _midranks(np.asarray(joint['x']), counts)
+    y = _midranks(np.asarray(joint['y']), counts)
+    n = counts.sum()
+    dx = x - (counts * x).sum() / n
+    dy = y - (counts * y).sum() / n
+    sxx, syy = (counts * dx * dx).sum(), (counts * dy * dy).sum()
+    if sxx <= 0 or syy <= 0:
+        return None
+    return float((counts * dx * dy).sum() / math.sqrt(sxx * syy))
@@ -0,0 +1,269 @@
+"""Stored per-type summary statistics for datasets.
+
+Each dataset keeps one ``TypeSummary`` row per equipment type holding the
+count, mean, M2 (sum of squared deviations, as in Welford's algorithm), min,
+max and a quantile sketch (see api/sketches.py) of every parameter. For
+every pair of parameters it also holds the co-moment C2 (sum of products
+of deviations) and a joint sketch, from which api/correlation.py derives
+correlations and linear fits. Summaries are computed once at ingest and can be merged across types or
+datasets without rescanning equipment rows.
+"""
+from itertools import combinations
+
+import numpy as np
+from django.db import models
+
+from .models import TypeSummary
+from .sketches import (build_sketch, merge_sketches, subtract_sketches, quantiles, histogram, joint_keys,
+                       build_joint_sketch, merge_joint_sketches)
+
+PARAMETERS = ('flowrate', 'pressure', 'temperature')
+# Column indices of the parameter pairs, and their names as in the model fields
+PAIR_INDICES = tuple(combinations(range(len(PARAMETERS)), 2))
+PAIRS = tuple(f'{PARAMETERS[i]}_{PARAMETERS[j]}' for i, j in PAIR_INDICES)
+_PAIR_ROWS, _PAIR_COLUMNS = (list(index) for index in zip(*PAIR_INDICES))
+
+
+def factorize(labels):
+    """Map labels to integer codes in first-seen order.
+
+    Returns ``(uniques, codes)``. Two C-level passes over the labels are
+    several times faster than ``np.unique`` on an object array of strings.
+    """
+    uniques = list(dict.fromkeys(labels))
+    index = {label: i for i, label in enumerate(uniques)}
+    codes = np.fromiter(map(index.__getitem__, labels), dtype=np.intp, count=len(labels))
+    return uniques, codes
+
+
+def summarize_by_type(types, values):
+    """Compute per-type statistics in one vectorized pass.
+
+    ``types`` is a sequence of type labels and ``values`` an ``(n, 3)`` array
+    of flowrate, pressure and temperature. Returns ``{type: stats}`` where
+    stats holds ``count`` and per-parameter ``mean``, ``m2``, ``min`` and
+    ``max`` arrays plus a ``sketches`` dict of per-parameter quantile
+    sketches, and per-pair (``PAIRS``) ``c2`` co-moments and ``joint``
+    sketches.
+    """
+    values = np.asarray(values, dtype=float).reshape(-1, len(PARAMETERS))
+    if not len(values):
+        return {}
+    labels, inverse = factorize(types)
+    counts = np.bincount(inverse, minlength=len(labels))
+    sums = np.stack([np.bincount(inverse, weights=values[:, i], minlength=len(labels))
+                     for i in range(len(PARAMETERS))], axis=1)
+    means = sums / counts[:, None]
+    deviations = values - means[inverse]
+    m2 = np.stack([np.bincount(inverse, weights=deviations[:, i] ** 2, minlength=len(labels))
+                   for i in range(len(PARAMETERS))], axis=1)
+    c2 = np.stack([np.bincount(inverse, weights=deviations[:, i] * deviations[:, j], minlength=len(labels))
+                   for i, j in PAIR_INDICES], axis=1)
+    mins = np.full((len(labels), len(PARAMETERS)), np.inf)
+    maxs = np.full((len(labels), len(PARAMETERS)), -np.inf)
+    np.minimum.at(mins, inverse, values)
+    np.maximum.at(maxs, inverse, values)
+    
+    order = np.argsort(inverse, kind='stable')
+    groups = np.split(values[order], np.cumsum(counts)[:-1])
+    key_groups = np.split(np.column_stack([joint_keys(values[:, i]) for i in range(len(PARAMETERS))])[order],
+                          np.cumsum(counts)[:-1])
+    return {
+        str(label): {
+            'count': int(counts[i]), 'mean': means[i], 'm2': m2[i], 'min': mins[i], 'max': maxs[i],
+            'sketches': {param: build_sketch(groups[i][:, j]) for j, param in enumerate(PARAMETERS)},
+            'c2': c2[i],
+            'joint': {pair: build_joint_sketch(key_groups[i][:, a], key_groups[i][:, b])
+                      for pair, (a, b) in zip(PAIRS, PAIR_INDICES)},
+        }
+        for i, label in enumerate(labels)
+    }
+
+
+def to_model(dataset, eq_type, stats):
+    fields = {'dataset': dataset, 'type': eq_type, 'count': stats['count'], 'sketches': stats['sketches']}
+    for i, param in enumerate(PARAMETERS):
+        for stat in ('mean', 'm2', 'min', 'max'):
+            fields[f'{param}_{stat}'] = float(stats[stat][i])
+    for i, pair in enumerate(PAIRS):
+        fields[f'{pair}_c2'] = float(stats['c2'][i])
+    fields['joint_sketches'] = stats['joint']
+    return TypeSummary(**fields)
+
+
+def from_model(summary, joint=False):
+    """The stats dict of a TypeSummary; joint sketches are left out unless ``joint``"""
+    stats = {
+        'count': summary.count,
+        'sketches': summary.sketches,
+        **{stat: np.array([getattr(summary, f'{param}_{stat}') for param in PARAMETERS])
+           for stat in ('mean', 'm2', 'min', 'max')},
+        'c2': np.array([getattr(summary, f'{pair}_c2') for pair in PAIRS]),
+    }
+    if joint:
+        stats['joint'] = summary.joint_sketches
+    return stats
+
+
+def build_type_summaries(dataset):
+    """(Re)compute and store the per-type summaries of ``dataset``"""
+    rows = list(dataset.equipment.values_list('type', *PARAMETERS))
+    types = [row[0] for row in rows]
+    values = [row[1:] for row in rows]
+    TypeSummary.objects.filter(dataset=dataset).delete()
+    summaries = [to_model(dataset, eq_type, stats)
+                 for eq_type, stats in summarize_by_type(types, values).items()]
+    return TypeSummary.objects.bulk_create(summaries)
+
+
+def summaries_complete(summaries):
+    """Whether stored summaries hold every statistic; older ones lack sketches or co-moments"""
+    return bool(summaries) and all(s.sketches and s.flowrate_pressure_c2 is not None for s in summaries)
+
+
+def get_type_summaries(dataset, joint=False):
+    """Return the stored per-type summaries, building them for older datasets.
+
+    Joint sketches are only loaded with ``joint``.
+    """
+    summaries = dataset.type_summaries.all()
+    summaries = list(summaries.defer(None) if joint else summaries)
+    if not summaries_complete(summaries) and dataset.equipment.exists():
+        summaries = build_type_summaries(dataset)
+    return summaries
+
+
+def dataset_summary(summaries):
+    """The ``/api/summary/<id>/`` payload from stored per-type summaries"""
+    stats = overall_stats(summaries)
+    return {
+        'total_count': stats['count'],
+        'avg_flowrate': float(stats['mean'][0]),
+        'avg_pressure': float(stats['mean'][1]),
+        'avg_temperature': float(stats['mean'][2]),
+        'type_distribution': {s.type: s.count for s in summaries}
+    }
+
+
+def build_summary(dataset, summaries=None):
+    """The ``/api/summary/<id>/`` payload, or None for a dataset without rows.
+
+    ``summaries`` are the dataset's per-type summaries, if already loaded.
+    """
+    if summaries is None:
+        summaries = get_type_summaries(dataset)
+    return dataset_summary(summaries) if summaries else None
+
+
+def merge_stats(a, b):
+    """Merge two stats dicts (Chan et al. parallel variance update).
+
+    Joint sketches are merged when both sides carry them.
+    """
+    if a is None:
+        return b
+    count = a['count'] + b['count']
+    delta = b['mean'] - a['mean']
+    merged = {
+        'count': count,
+        'mean': a['mean'] + delta * b['count'] / count,
+        'm2': a['m2'] + b['m2'] + delta ** 2 * a['count'] * b['count'] / count,
+        'min': np.minimum(a['min'], b['min']),
+        'max': np.maximum(a['max'], b['max']),
+        'sketches': {param: merge_sketches(a['sketches'][param], b['sketches'][param]) for param in PARAMETERS},
+        'c2': a['c2'] + b['c2'] + delta[_PAIR_ROWS] * delta[_PAIR_COLUMNS] * a['count'] * b['count'] / count,
+    }
+    if 'joint' in a and 'joint' in b:
+        merged['joint'] = {pair: merge_joint_sketches(a['joint'].get(pair), b['joint'][pair]) for pair in PAIRS}
+    return merged
+
+
+def subtract_stats(a, b):
+    """Remove the rows summarized by ``b`` from ``a`` (inverse of ``merge_stats``).
+
+    Min and max cannot be reversed; they are kept and ``stale_bounds`` is set
+    when a removed value sat on either bound.
+    """
+    count = a['count'] - b['count']
+    if count <= 0:
+        return None
+    mean = (a['mean'] * a['count'] - b['mean'] * b['count']) / count
+    delta = b['mean'] - mean
+    remaining = {
+        'count': count,
+        'mean': mean,
+        'm2': np.maximum(a['m2'] - b['m2'] - delta ** 2 * count * b['count'] / a['count'], 0.0),
+        'min': a['min'],
+        'max': a['max'],
+        'sketches': {param: subtract_sketches(a['sketches'][param], b['sketches'][param]) for param in PARAMETERS},
+        'c2': a['c2'] - b['c2'] - delta[_PAIR_ROWS] * delta[_PAIR_COLUMNS] * count * b['count'] / a['count'],
+        'stale_bounds': bool(np.any(b['min'] <= a['min']) or np.any(b['max'] >= a['max'])),
+    }
+    if 'joint' in a and 'joint' in b:
+        remaining['joint'] = {pair: merge_joint_sketches(a['joint'][pair], b['joint'][pair], sign=-1)
+                              for pair in PAIRS}
+    return remaining
+
+
+def apply_summary_delta(dataset, added, removed):
+    """Incrementally update stored summaries for rows added to and removed from ``dataset``.
+
+    ``added`` and ``removed`` are ``summarize_by_type`` results. Types whose
+    min/max may have moved inward are re-aggregated from the database.
+    Call after writing the rows: if the dataset has rows but its stored
+    summaries are missing, predate co-moments or do not add up to its row
+    count with the change, they are rebuilt from the database instead,
+    which already includes the change.
+    """
+    stored = {s.type: s for s in dataset.type_summaries.defer(None)}
+    rows = dataset.equipment.count()
+    expected = (sum(s.count for s in stored.values()) + sum(stats['count'] for stats in added.values())
+                - sum(stats['count'] for stats in removed.values()))
+    if rows and (not summaries_complete(stored.values()) or expected != rows):
+        build_type_summaries(dataset)
+        return
+    for eq_type in set(added) | set(removed):
+        summary = stored.get(eq_type)
+        stats = from_model(summary, joint=True) if summary else None
+        stale_bounds = False
+        if eq_type in removed and stats is not None:
+            stats = subtract_stats(stats, removed[eq_type])
+            stale_bounds = stats is not None and stats.pop('stale_bounds')
+        if eq_type in added:
+            stats = merge_stats(stats, added[eq_type])
+        
+        if summary is not None:
+            summary.delete()
+        if stats is None:
+            continue
+        if stale_bounds:
+            aggregates = dataset.equipment.filter(type=eq_type).aggregate(
+                **{f'{param}_{stat}': func(param) for param in PARAMETERS
+                   for stat, func in (('min', models.Min), ('max', models.Max))})
+            stats['min'] = np.array([aggregates[f'{param}_min'] for param in PARAMETERS])
+            stats['max'] = np.array([aggregates[f'{param}_max'] for param in PARAMETERS])
+        to_model(dataset, eq_type, stats).save()
+
+
+def overall_stats(summaries):
+    """Merge a list of TypeSummary rows into dataset-wide stats"""
+    merged = None
+    for summary in summaries:
+        merged = merge_stats(merged, from_model(summary))
+    return merged
+
+
+def describe_distribution(stats, percentiles=(50, 90, 99), bins=20):
+    """Percentiles and an equal-width histogram per parameter from merged stats"""
+    result = {}
+    for j, param in enumerate(PARAMETERS):
+        sketch = stats['sketches'][param]
+        lower, upper = float(stats['min'][j]), float(stats['max'][j])
+        values = quantiles(sketch, [p / 100 for p in percentiles], lower, upper)
+        result[param] = {
+            'min': lower,
+            'max': upper,
+            'percentiles': {f'p{p:g}': value for p, value in zip(percentiles, values)},
+            'histogram': histogram(sketch, bins, lower, upper),
+        }
+    return result
@@ -0,0 +1,227 @@
+"""Time-series telemetry: batch ingest of readings and rollup queries.
+
+Readings arrive as NDJSON or CSV records with an equipment name, a timestamp
+and the three parameters. Each batch is inserted with ``bulk_create`` and
+folded into 1m/1h/1d ``ReadingRollup`` buckets (count, sum, min, max) in the
+same transaction, so range queries read the rollups and never scan raw
+samples.
+"""
+import codecs
+import csv
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Max, Min, Sum
+
+from .cache import invalidate_dataset
+from .models import Dataset, Reading, ReadingRollup
+from .summaries import PARAMETERS, factorize
+
+ROLLUP_RESOLUTIONS = {'1m': 60_000, '1h': 3_600_000, '1d': 86_400_000}
+INGEST_BATCH_SIZE = 5000
+# Auto resolution picks the finest rollup that yields at most this many points
+MAX_SERIES_POINTS = 1000
+MAX_RAW_POINTS = 10000
+
+
+def parse_timestamp(value):
+    """Parse an ISO 8601 string or epoch seconds into epoch milliseconds"""
+    if isinstance(value, (int, float)):
+        return int(round(value * 1000))
+    value = str(value).strip()
+    try:
+        return int(round(float(value) * 1000))
+    except ValueError:
+        pass
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(round(parsed.timestamp() * 1000))
+
+
+def _records_to_columns(records):
+    """Turn an iterable of dicts into (names, timestamps, values, errors)"""
+    names, timestamps, values, errors = [], [], [], []
+    for line, record in enumerate(records, start=1):
+        try:
+            row = (float(record['flowrate']), float(record['pressure']), float(record['temperature']))
+            timestamp = parse_timestamp(record['timestamp'])
+            name = str(record['equipment'])
+        except (KeyError, TypeError, ValueError) as e:
+            errors.append({'line': line, 'error': f'{type(e).__name__}: {e}'})
+            continue
+        names.append(name)
+        timestamps.append(timestamp)
+        values.append(row)
+    return names, np.array(timestamps, dtype=np.int64), np.array(values, dtype=float).reshape(-1, 3), errors
+
+
+def _normalize_csv_record(record):
+    """Accept both ``equipment`` and the upload CSV's ``Equipment Name`` style headers"""
+    lowered = {key.strip().lower(): value for key, value in record.items() if key}
+    if 'equipment name' in lowered:
+        lowered['equipment'] = lowered['equipment name']
+    return lowered
+
+
+def parse_ndjson(lines):
+    """Parse NDJSON from an iterable of byte lines (an upload or request stream)"""
+    return _records_to_columns(json.loads(line) for line in lines if line.strip())
+
+
+def parse_csv(lines):
+    """Parse CSV from an iterable of byte lines (an upload or request stream)"""
+    reader = csv.DictReader(codecs.iterdecode(lines, 'utf-8'))
+    return _records_to_columns(_normalize_csv_record(record) for record in reader)
+
+
+def _rollup(equipment_ids, timestamps, values, width):
+    """Aggregate one batch into ``(equipment_id, bucket)`` groups.
+
+    Returns ``(equipment_ids, buckets, counts, sums, mins, maxs)`` arrays.
+    """
+    buckets = timestamps // width * width
+    order = np.lexsort((buckets, equipment_ids))
+    eq_sorted, bucket_sorted, values_sorted = equipment_ids[order], buckets[order], values[order]
+    starts = np.flatnonzero(np.r_[True, (np.diff(eq_sorted) != 0) | (np.diff(bucket_sorted) != 0)])
+    counts = np.diff(np.r_[starts, len(order)])
+    return (eq_sorted[starts], bucket_sorted[starts], counts,
+            np.add.reduceat(values_sorted, starts), np.minimum.reduceat(values_sorted, starts),
+            np.maximum.reduceat(values_sorted, starts))
+
+
+def _merge_rollups(resolution, groups):
+    eq_ids, buckets, counts, sums, mins, maxs = groups
+    existing = {
+        (r.equipment_id, r.bucket): r
+        for r in ReadingRollup.objects.filter(resolution=resolution, equipment_id__in=set(eq_ids.tolist()),
+                                              bucket__gte=int(buckets.min()), bucket__lte=int(buckets.max()))
+    }
+    created, updated = [], []
+    for i, key in enumerate(zip(eq_ids.tolist(), buckets.tolist())):
+        rollup = existing.get(key)
+        if rollup is None:
+            rollup = ReadingRollup(equipment_id=key[0], resolution=resolution, bucket=key[1], count=0)
+            for j, param in enumerate(PARAMETERS):
+                setattr(rollup, f'{param}_sum', 0.0)
+                setattr(rollup, f'{param}_min', float(mins[i, j]))
+                setattr(rollup, f'{param}_max', float(maxs[i, j]))
+            created.append(rollup)
+        else:
+            updated.append(rollup)
+        rollup.count += int(counts[i])
+        for j, param in enumerate(PARAMETERS):
+            setattr(rollup, f'{param}_sum', getattr(rollup, f'{param}_sum') + float(sums[i, j]))
+            setattr(rollup, f'{param}_min', min(getattr(rollup, f'{param}_min'), float(mins[i, j])))
+            setattr(rollup, f'{param}_max', max(getattr(rollup, f'{param}_max'), float(maxs[i, j])))
+    ReadingRollup.objects.bulk_create(created)
+    fields = ['count'] + [f'{param}_{stat}' for param in PARAMETERS for stat in ('sum', 'min', 'max')]
+    ReadingRollup.objects.bulk_update(updated, fields)
+
+
+def _ingest_batch(equipment_ids, timestamps, values):
+    """Insert one batch of new readings and fold it into the rollups"""
+    # Drop samples already stored, and duplicates within the batch
+    existing = set(Reading.objects.filter(
+        equipment_id__in=set(equipment_ids.tolist()),
+        timestamp__gte=int(timestamps.min()), timestamp__lte=int(timestamps.max()),
+    ).values_list('equipment_id', 'timestamp'))
+    keys = list(zip(equipment_ids.tolist(), timestamps.tolist()))
+    seen = set(existing)
+    keep = np.zeros(len(keys), dtype=bool)
+    for i, key in enumerate(keys):
+        if key not in seen:
+            seen.add(key)
+            keep[i] = True
+    equipment_ids, timestamps, values = equipment_ids[keep], timestamps[keep], values[keep]
+    if not len(timestamps):
+        return 0
+    
+    with transaction.atomic():
+        Reading.objects.bulk_create([
+            Reading(equipment_id=eq, timestamp=ts, flowrate=f, pressure=p, temperature=t)
+            for eq, ts, (f, p, t) in zip(equipment_ids.tolist(), timestamps.tolist(), values.tolist())
+        ])
+        for resolution, width in ROLLUP_RESOLUTIONS.items():
+            _merge_rollups(resolution, _rollup(equipment_ids, timestamps, values, width))
+    return len(timestamps)
+
+
+def ingest_readings(dataset, names, timestamps, values):
+    """Ingest parsed readings into ``dataset``; unknown equipment names are skipped"""
+    equipment_by_name = dict(dataset.equipment.values_list('name', 'id'))
+    unique_names, codes = factorize(names)
+    ids_by_code = np.array([equipment_by_name.get(name, -1) for name in unique_names], dtype=np.int64)
+    equipment_ids = ids_by_code[codes] if len(codes) else np.zeros(0, dtype=np.int64)
+    known = equipment_ids >= 0
+    
+    inserted = 0
+    equipment_ids, timestamps, values = equipment_ids[known], timestamps[known], values[known]
+    for start in range(0, len(timestamps), INGEST_BATCH_SIZE):
+        batch = slice(start, start + INGEST_BATCH_SIZE)
+        inserted += _ingest_batch(equipment_ids[batch], timestamps[batch], values[batch])
+    if inserted:
+        # The version is part of the series cache key, so other processes stop serving old series too
+        Dataset.objects.filter(id=dataset.id).update(version=F('version') + 1)
+        invalidate_dataset(dataset.id)
+    
+    return {
+        'received': len(names),
+        'inserted': inserted,
+        'duplicates': int(known.sum()) - inserted,
+        'unknown_equipment': sorted(name for name in unique_names if name not in equipment_by_name),
+    }
+
+
+def choose_resolution(start, end):
+    """Finest rollup resolution giving at most MAX_SERIES_POINTS buckets"""
+    for resolution, width in ROLLUP_RESOLUTIONS.items():
+        if (end - start) / width <= MAX_SERIES_POINTS:
+            return resolution
+    return '1d'
+
+
+def query_series(dataset, start, end, resolution='auto', equipment_name=None):
+    """Series between ``start`` and ``end`` (epoch ms) from rollups, or raw readings.
+
+    Rollups of several units are merged per bucket in the database.
+    """
+    if resolution == 'auto':
+        resolution = choose_resolution(start, end)
+    
+    if resolution == 'raw':
+        readings = Reading.objects.filter(equipment__dataset=dataset, timestamp__gte=start, timestamp__lt=end)
+        if equipment_name:
+            readings = readings.filter(equipment__name=equipment_name)
+        rows = list(readings.order_by('timestamp').values_list('timestamp', *PARAMETERS)[:MAX_RAW_POINTS])
+        columns = list(zip(*rows)) or [[]] * (len(PARAMETERS) + 1)
+        return {
+            'resolution': 'raw',
+            'timestamps': list(columns[0]),
+            **{param: {'value': list(columns[j + 1])} for j, param in enumerate(PARAMETERS)},
+        }
+    
+    width = ROLLUP_RESOLUTIONS[resolution]
+    rollups = ReadingRollup.objects.filter(equipment__dataset=dataset, resolution=resolution,
+                                           bucket__gte=start // width * width, bucket__lt=end)
+    if equipment_name:
+        rollups = rollups.filter(equipment__name=equipment_name)
+    aggregates = {'total': Sum('count')}
+    for param in PARAMETERS:
+        aggregates[f'{param}_total'] = Sum(f'{param}_sum')
+        aggregates[f'{param}_low'] = Min(f'{param}_min')
+        aggregates[f'{param}_high'] = Max(f'{param}_max')
+    rows = list(rollups.values('bucket').annotate(**aggregates).order_by('bucket'))
+    
+    return {
+        'resolution': resolution,
+        'timestamps': [row['bucket'] for row in rows],
+        'count': [row['total'] for row in rows],
+        **{param: {
+            'min': [row[f'{param}_low'] for row in rows],
+            'max': [row[f'{param}_high'] for row in rows],
+            'mean': [row[f'{param}_total'] / row['total'] for row in rows],
+        } for param in PARAMETERS},
+    }
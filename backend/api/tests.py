@@ -1,3 +1,1108 @@
-from django.test import TestCase
+import base64
+import gzip
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import msgpack
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from . import anomalies, bulk_ingest, events, export, trends
+from .anomalies import count_mahalanobis_outliers, detect_anomalies
+from .cache import cache_stats, cached, invalidate_dataset
+from .export import requested_range
+from .ingest import (MAX_USER_DATASETS, ParsedUpload, compute_fingerprint, read_csv_columns, store_dataset,
+                     upsert_rows)
+from .models import Dataset, Equipment, EquipmentTrend, TypeSummary
+from .renderers import ARROW_META_KEY, FLOAT64_ARRAY
+from .summaries import PARAMETERS, from_model, get_type_summaries, overall_stats, summarize_by_type
+from .uploads import MIN_CHUNK_SIZE
+
+HEADER = 'Equipment Name,Type,Flowrate,Pressure,Temperature\n'
+TYPES = ('Pump', 'Valve', 'Compressor')
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+
+def make_rows(count, seed=0, prefix='U'):
+    """``count`` rows whose pressure and temperature follow flowrate, within the validation ranges"""
+    rng = np.random.default_rng(seed)
+    flowrate = rng.uniform(50, 250, count)
+    pressure = 2 + 0.03 * flowrate + rng.normal(0, 0.5, count)
+    temperature = 100 + 0.2 * flowrate + rng.normal(0, 5, count)
+    return [(f'{prefix}-{i}', TYPES[i % len(TYPES)], round(f, 3), round(p, 3), round(t, 3))
+            for i, (f, p, t) in enumerate(zip(flowrate, pressure, temperature))]
+
+
+def csv_text(rows):
+    return HEADER + ''.join(f'{name},{eq_type},{f},{p},{t}\n' for name, eq_type, f, p, t in rows)
+
+
+def parse_rows(name, rows):
+    return ParsedUpload(name, *read_csv_columns(io.StringIO(csv_text(rows))))
+
+
+class ApiTestCase(TestCase):
+    def setUp(self):
+        # Cache keys hold dataset ids, which the test database hands out again
+        cache.clear()
+        self.user = User.objects.create_user('tester', password='tester-pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        media = override_settings(EXPORT_ROOT=os.path.join(self.root, 'exports'),
+                                  CHUNKED_UPLOAD_ROOT=os.path.join(self.root, 'uploads'))
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def store(self, name, rows):
+        dataset, _ = store_dataset(self.user, parse_rows(name, rows))
+        return dataset
+
+    def assertStatsEqual(self, actual, expected):
+        self.assertEqual(actual['count'], expected['count'])
+        for stat in ('mean', 'm2', 'min', 'max', 'c2'):
+            np.testing.assert_allclose(actual[stat], expected[stat], rtol=1e-9, atol=1e-6, err_msg=stat)
+
+
+def page_count(pdf):
+    return len(re.findall(rb'/Type /Page\b(?!s)', pdf))
+
+
+class ReportTests(ApiTestCase):
+    def test_report_reads_rows_only_for_previews(self):
+        dataset = self.store('plant.csv', make_rows(600))
+        with mock.patch.object(Equipment, 'from_db', side_effect=Equipment.from_db) as from_db, \
+                override_settings(REPORT_SCATTER_MAX_POINTS=50):
+            response = self.client.get(f'/api/report/{dataset.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content.startswith(b'%PDF'))
+        # The bar chart's 8 units and the 15-row preview table
+        self.assertLessEqual(from_db.call_count, 23)
+
+    def test_outlier_counts_from_summaries_match_rows(self):
+        rows = make_rows(300)
+        # Each reading is typical on its own, but not together
+        rows[7] = ('U-7', 'Pump', 180.0, 2.0, 80.0)
+        rows[8] = ('U-8', 'Valve', 20.0, 9.0, 140.0)
+        dataset = self.store('plant.csv', rows)
+        stats = overall_stats(get_type_summaries(dataset))
+        expected = detect_anomalies([row[1] for row in rows], [row[2:] for row in rows])['mahalanobis']
+        self.assertGreaterEqual(expected.sum(), 2)
+        self.assertEqual(count_mahalanobis_outliers(dataset.equipment.all(), stats), expected.sum())
+
+    def test_scatter_sample_is_bounded(self):
+        from .reports import scatter_sample
+        rows = make_rows(250)
+        dataset = self.store('plant.csv', rows)
+        sample = scatter_sample(dataset.equipment.all(), 250, 40, 30)
+        self.assertEqual(len(sample), 36)
+        self.assertEqual(sample[:2], [rows[0][3:], rows[7][3:]])
+
+    def test_full_detail_report_is_served_from_a_file(self):
+        dataset = self.store('plant.csv', make_rows(600))
+        url = f'/api/report/{dataset.id}/'
+        preview = self.client.get(url).content
+        with override_settings(REPORT_DETAIL_CHUNK_ROWS=100):
+            response = self.client.get(url, {'detail': 'full'})
+        self.assertEqual(response.status_code, 200)
+        pdf = b''.join(response.streaming_content)
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        # 600 rows need far more pages than the 15-row preview
+        self.assertGreater(page_count(pdf), page_count(preview) + 5)
+        self.assertEqual(len(os.listdir(os.path.join(self.root, 'exports'))), 1)
+
+        etag = response['ETag']
+        tail = self.client.get(url, {'detail': 'full'}, HTTP_RANGE='bytes=1000-', HTTP_IF_RANGE=etag)
+        self.assertEqual(tail.status_code, 206)
+        self.assertEqual(b''.join(tail.streaming_content), pdf[1000:])
+
+        parsed = parse_rows('more.csv', make_rows(5, prefix='N'))
+        upsert_rows(dataset, parsed.names, parsed.types, parsed.values)
+        self.assertNotEqual(self.client.get(url, {'detail': 'full'})['ETag'], etag)
+
+    @override_settings(REPORT_DETAIL_MAX_ROWS=40)
+    def test_full_detail_report_stops_at_the_row_cap(self):
+        dataset = self.store('plant.csv', make_rows(600))
+        capped = b''.join(self.client.get(f'/api/report/{dataset.id}/', {'detail': 'full'}).streaming_content)
+        self.assertLessEqual(page_count(capped), page_count(self.client.get(f'/api/report/{dataset.id}/').content) + 2)
+
+    def test_vector_charts_embed_no_images(self):
+        dataset = self.store('plant.csv', make_rows(200))
+        url = f'/api/report/{dataset.id}/'
+        png = self.client.get(url).content
+        vector = self.client.get(url, {'charts': 'vector'}).content
+        self.assertTrue(vector.startswith(b'%PDF'))
+        self.assertIn(b'/Subtype /Image', png)
+        self.assertNotIn(b'/Subtype /Image', vector)
+        self.assertEqual(page_count(vector), page_count(png))
+        self.assertLess(len(vector), len(png) / 4)
+        # Each chart mode is cached on its own
+        self.assertNotIn(b'/Subtype /Image', self.client.get(url, {'charts': 'vector'}).content)
+        full = b''.join(self.client.get(url, {'detail': 'full', 'charts': 'vector'}).streaming_content)
+        self.assertNotIn(b'/Subtype /Image', full)
+
+
+class CompareTests(ApiTestCase):
+    def compare(self, *datasets):
+        return self.client.get('/api/compare/', {'ids': ','.join(str(d.id) for d in datasets)})
+
+    def test_deltas_against_the_first_dataset(self):
+        base = self.store('base.csv', [('A-1', 'Pump', 10.0, 2.0, 100.0), ('A-2', 'Valve', 20.0, 3.0, 110.0)])
+        later = self.store('later.csv', [('A-1', 'Pump', 12.0, 2.0, 90.0), ('A-1', 'Pump', 14.0, 2.0, 90.0),
+                                         ('B-1', 'Compressor', 30.0, 4.0, 120.0)])
+        response = self.compare(base, later)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([d['id'] for d in data['datasets']], [base.id, later.id])
+        self.assertEqual(data['by_type']['Pump'], {'count': [1, 2], 'mean': [[10.0, 2.0, 100.0], [13.0, 2.0, 90.0]],
+                                                   'delta': [[3.0, 0.0, -10.0]]})
+        # A type missing from a dataset has no means
+        self.assertEqual(data['by_type']['Valve']['count'], [1, 0])
+        self.assertEqual(data['by_type']['Valve']['delta'], [[None, None, None]])
+        self.assertEqual(data['by_type']['Compressor']['mean'][0], [None, None, None])
+        # Only units in the baseline and another dataset; duplicates are averaged
+        self.assertEqual(data['by_equipment'], {'names': ['A-1'], 'mean': [[[10.0, 2.0, 100.0], [13.0, 2.0, 90.0]]],
+                                                'delta': [[[3.0, 0.0, -10.0]]]})
+
+    def test_rejects_bad_id_lists(self):
+        first, second = self.store('a.csv', make_rows(5)), self.store('b.csv', make_rows(5, seed=1))
+        self.assertEqual(self.compare(first).status_code, 400)
+        self.assertEqual(self.client.get('/api/compare/', {'ids': f'{first.id},{first.id}'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/compare/', {'ids': 'a,b'}).status_code, 400)
+        other = User.objects.create_user('other')
+        foreign, _ = store_dataset(other, parse_rows('c.csv', make_rows(5)))
+        self.assertEqual(self.compare(first, foreign).status_code, 404)
+        self.assertEqual(self.compare(second, first).status_code, 200)
+
+
+class AnomalyTests(ApiTestCase):
+    def test_limit_caps_rows_not_counts(self):
+        rows = make_rows(300)
+        rows[3] = ('U-3', 'Pump', 900.0, 2.0, 100.0)
+        rows[4] = ('U-4', 'Valve', 100.0, 2.0, 400.0)
+        dataset = self.store('plant.csv', rows)
+        url = f'/api/anomalies/{dataset.id}/'
+        full = self.client.get(url).json()
+        self.assertEqual(full['total_count'], 300)
+        self.assertEqual(full['total_flagged'], len(full['anomalies']))
+        # The most severe first
+        self.assertCountEqual([row['name'] for row in full['anomalies'][:2]], ['U-3', 'U-4'])
+        reasons = {row['name']: row['reasons'] for row in full['anomalies']}
+        self.assertIn('iqr:flowrate', reasons['U-3'])
+        self.assertIn('iqr:temperature', reasons['U-4'])
+
+        limited = self.client.get(url, {'limit': 1}).json()
+        self.assertEqual(limited['anomalies'], full['anomalies'][:1])
+        self.assertEqual(limited['total_flagged'], full['total_flagged'])
+        self.assertEqual(self.client.get(url, {'limit': 0}).json()['anomalies'], [])
+        self.assertEqual(self.client.get(url, {'limit': 'all'}).status_code, 400)
+
+    def test_results_are_cached_per_version(self):
+        dataset = self.store('plant.csv', make_rows(100))
+        url = f'/api/anomalies/{dataset.id}/'
+        with mock.patch.object(anomalies, '_dataset_anomalies', side_effect=anomalies._dataset_anomalies) as compute:
+            first = self.client.get(url).json()
+            self.assertEqual(self.client.get(url).json(), first)
+            self.assertEqual(compute.call_count, 1)
+
+            parsed = parse_rows('more.csv', [('N-1', 'Pump', 5000.0, 2.0, 100.0)])
+            upsert_rows(dataset, parsed.names, parsed.types, parsed.values)
+            second = self.client.get(url).json()
+        self.assertEqual(compute.call_count, 2)
+        self.assertEqual(second['total_count'], 101)
+        self.assertEqual(second['anomalies'][0]['name'], 'N-1')
+
+
+class ReadingTests(ApiTestCase):
+    # 2023-11-14T00:00:00Z, on a day boundary
+    T0 = 1699920000
+
+    def setUp(self):
+        super().setUp()
+        self.dataset = self.store('plant.csv', [('A', 'Pump', 1.0, 1.0, 1.0), ('B', 'Valve', 1.0, 1.0, 1.0)])
+        self.url = f'/api/readings/{self.dataset.id}/'
+
+    def record(self, name, offset, flowrate):
+        return json.dumps({'equipment': name, 'timestamp': self.T0 + offset, 'flowrate': flowrate,
+                           'pressure': 2.0, 'temperature': 50.0})
+
+    def ingest(self, *records, content_type='application/x-ndjson'):
+        return self.client.post(self.url + 'ingest/', '\n'.join(records), content_type=content_type)
+
+    def series(self, resolution, **params):
+        return self.client.get(self.url, {'start': self.T0, 'end': self.T0 + 3600, 'resolution': resolution,
+                                          **params}).json()
+
+    def test_ingest_reports_skipped_records(self):
+        response = self.ingest(self.record('A', 0, 10.0), self.record('A', 30, 20.0), self.record('A', 90, 30.0),
+                               self.record('B', 30, 40.0), self.record('C', 0, 1.0), self.record('A', 0, 99.0),
+                               '{"equipment": "A"}')
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual({key: result[key] for key in ('received', 'inserted', 'duplicates', 'unknown_equipment',
+                                                       'invalid')},
+                         {'received': 6, 'inserted': 4, 'duplicates': 1, 'unknown_equipment': ['C'], 'invalid': 1})
+        self.assertEqual(result['errors'][0]['line'], 7)
+        response = self.ingest('a,b', content_type='text/plain')
+        self.assertEqual(response.status_code, 415)
+
+    def test_rollups_merge_units_per_bucket(self):
+        self.ingest(self.record('A', 0, 10.0), self.record('A', 30, 20.0), self.record('A', 90, 30.0),
+                    self.record('B', 30, 40.0))
+        minutes = self.series('1m')
+        self.assertEqual(minutes['timestamps'], [self.T0 * 1000, (self.T0 + 60) * 1000])
+        self.assertEqual(minutes['count'], [3, 1])
+        self.assertEqual((minutes['flowrate']['min'], minutes['flowrate']['max']), ([10.0, 30.0], [40.0, 30.0]))
+        np.testing.assert_allclose(minutes['flowrate']['mean'], [70 / 3, 30.0])
+        self.assertEqual(self.series('1m', equipment='A')['flowrate']['mean'], [15.0, 30.0])
+        self.assertEqual(self.series('1h')['count'], [4])
+        self.assertEqual(self.series('auto')['resolution'], '1m')
+        raw = self.series('raw', equipment='A')
+        self.assertEqual(raw['timestamps'], [self.T0 * 1000, (self.T0 + 30) * 1000, (self.T0 + 90) * 1000])
+        self.assertEqual(raw['flowrate'], {'value': [10.0, 20.0, 30.0]})
+        self.assertEqual(self.client.get(self.url, {'resolution': '5m'}).status_code, 400)
+
+    def test_ingest_refreshes_cached_series(self):
+        self.ingest(self.record('A', 0, 10.0))
+        self.assertEqual(self.series('1m')['count'], [1])
+        # CSV with the upload's header style and an ISO timestamp
+        body = 'Equipment Name,timestamp,flowrate,pressure,temperature\nB,2023-11-14T00:00:45Z,20,2,50\n'
+        self.assertEqual(self.ingest(body, content_type='text/csv').json()['inserted'], 1)
+        series = self.series('1m')
+        self.assertEqual(series['count'], [2])
+        self.assertEqual(series['flowrate']['mean'], [15.0])
+
+
+class SummaryTests(ApiTestCase):
+    def stored_stats(self, dataset):
+        return {s.type: from_model(s) for s in TypeSummary.objects.filter(dataset=dataset)}
+
+    def rebuilt_stats(self, dataset):
+        rows = list(dataset.equipment.values_list('type', *PARAMETERS))
+        return summarize_by_type([row[0] for row in rows], [row[1:] for row in rows])
+
+    def test_upsert_updates_summaries_like_a_rebuild(self):
+        dataset = self.store('plant.csv', make_rows(300))
+        # Half the rows replace existing units, half are new units
+        changed = make_rows(300, seed=1)[150:] + make_rows(150, seed=2, prefix='N')
+        parsed = parse_rows('more.csv', changed)
+        inserted, updated = upsert_rows(dataset, parsed.names, parsed.types, parsed.values)
+        self.assertEqual((inserted, updated), (150, 150))
+        self.assertEqual(dataset.equipment.count(), 450)
+        stored, rebuilt = self.stored_stats(dataset), self.rebuilt_stats(dataset)
+        self.assertEqual(set(stored), set(rebuilt))
+        for eq_type in rebuilt:
+            self.assertStatsEqual(stored[eq_type], rebuilt[eq_type])
+
+    def test_upsert_rebuilds_missing_summaries(self):
+        dataset = self.store('plant.csv', make_rows(90))
+        TypeSummary.objects.filter(dataset=dataset, type='Pump').delete()
+        parsed = parse_rows('more.csv', make_rows(30, prefix='N'))
+        upsert_rows(dataset, parsed.names, parsed.types, parsed.values)
+        stored, rebuilt = self.stored_stats(dataset), self.rebuilt_stats(dataset)
+        self.assertEqual(set(stored), set(TYPES))
+        for eq_type in rebuilt:
+            self.assertStatsEqual(stored[eq_type], rebuilt[eq_type])
+
+    def test_upsert_bumps_the_version_and_summary_endpoint_follows(self):
+        dataset = self.store('plant.csv', make_rows(60))
+        before = self.client.get(f'/api/summary/{dataset.id}/').json()
+        parsed = parse_rows('more.csv', make_rows(60, prefix='N'))
+        upsert_rows(dataset, parsed.names, parsed.types, parsed.values)
+        dataset.refresh_from_db()
+        self.assertEqual(dataset.version, 2)
+        after = self.client.get(f'/api/summary/{dataset.id}/').json()
+        self.assertEqual(before['total_count'], 60)
+        self.assertEqual(after['total_count'], 120)
+
+
+class FingerprintTests(ApiTestCase):
+    def test_row_order_does_not_change_the_fingerprint(self):
+        rows = make_rows(50)
+        self.assertEqual(parse_rows('a.csv', rows).fingerprint, parse_rows('b.csv', rows[::-1]).fingerprint)
+        changed = rows[:-1] + [rows[-1][:4] + (rows[-1][4] + 1,)]
+        self.assertNotEqual(parse_rows('a.csv', rows).fingerprint, parse_rows('a.csv', changed).fingerprint)
+
+    def test_identical_upload_returns_the_existing_dataset(self):
+        rows = make_rows(50)
+        dataset = self.store('a.csv', rows)
+        self.assertEqual(compute_fingerprint(dataset), dataset.fingerprint)
+        duplicate, is_duplicate = store_dataset(self.user, parse_rows('b.csv', rows[::-1]))
+        self.assertTrue(is_duplicate)
+        self.assertEqual(duplicate.id, dataset.id)
+        self.assertEqual(Dataset.objects.filter(uploaded_by=self.user).count(), 1)
+
+    def test_identical_upload_over_http(self):
+        body = csv_text(make_rows(50)).encode()
+        first = self.client.post('/api/upload/', {'file': SimpleUploadedFile('a.csv', body)})
+        second = self.client.post('/api/upload/', {'file': SimpleUploadedFile('a.csv.gz', gzip.compress(body))})
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertTrue(second.json()['duplicate'])
+        self.assertEqual(second.json()['dataset_id'], first.json()['dataset_id'])
+
+    def test_purge_keeps_the_newest_datasets(self):
+        datasets = [self.store(f'{i}.csv', make_rows(10, seed=i)) for i in range(MAX_USER_DATASETS + 1)]
+        remaining = set(Dataset.objects.filter(uploaded_by=self.user).values_list('id', flat=True))
+        self.assertEqual(remaining, {d.id for d in datasets[1:]})
+
+
+class UploadFormatTests(ApiTestCase):
+    def zip_upload(self, members):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            for name, data in members.items():
+                archive.writestr(name, data)
+        return SimpleUploadedFile('batch.zip', buffer.getvalue())
+
+    def arrow_table(self, rows):
+        import pyarrow as pa
+        columns = list(zip(*rows))
+        return pa.table({'Equipment Name': list(columns[0]), 'Type': list(columns[1]), 'Flowrate': list(columns[2]),
+                         'Pressure': list(columns[3]), 'Temperature': list(columns[4]),
+                         'Notes': ['spare'] * len(rows)})
+
+    def test_zip_members_become_datasets(self):
+        first, second = make_rows(40), make_rows(30, seed=1, prefix='B')
+        upload = self.zip_upload({'plant/a.csv': csv_text(first), 'b.csv.gz': gzip.compress(csv_text(second).encode()),
+                                  'notes.txt': 'ignored'})
+        response = self.client.post('/api/upload/', {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['datasets']
+        self.assertEqual([result['name'] for result in results], ['a.csv', 'b.csv.gz'])
+        self.assertEqual([Dataset.objects.get(id=result['dataset_id']).equipment.count() for result in results],
+                         [40, 30])
+        self.assertEqual(results[1]['fingerprint'], parse_rows('b', second).fingerprint)
+
+    def test_zip_never_purges_a_dataset_an_earlier_member_returned(self):
+        datasets = [self.store(f'{i}.csv', make_rows(10, seed=i)) for i in range(MAX_USER_DATASETS)]
+        # The first member is identical to the oldest dataset; the second is new and triggers a purge
+        upload = self.zip_upload({'old.csv': csv_text(make_rows(10, seed=0)),
+                                  'new.csv': csv_text(make_rows(10, seed=99))})
+        results = self.client.post('/api/upload/', {'file': upload}).json()['datasets']
+        self.assertEqual(results[0]['dataset_id'], datasets[0].id)
+        self.assertTrue(results[0]['duplicate'])
+        self.assertTrue(Dataset.objects.filter(id=datasets[0].id).exists())
+        self.assertFalse(Dataset.objects.filter(id=datasets[1].id).exists())
+
+    def test_zip_without_csv_is_rejected(self):
+        response = self.client.post('/api/upload/', {'file': self.zip_upload({'notes.txt': 'nothing'})})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Dataset.objects.exists())
+
+    @skipUnless(HAS_PYARROW, 'pyarrow is not installed')
+    def test_parquet_and_arrow_match_csv(self):
+        import pyarrow.feather
+        import pyarrow.parquet
+        rows = make_rows(50)
+        parquet, arrow = io.BytesIO(), io.BytesIO()
+        pyarrow.parquet.write_table(self.arrow_table(rows), parquet)
+        pyarrow.feather.write_feather(self.arrow_table(rows[::-1]), arrow)
+
+        response = self.client.post('/api/upload/', {'file': SimpleUploadedFile('plant.parquet', parquet.getvalue())})
+        self.assertEqual(response.status_code, 200)
+        dataset = Dataset.objects.get(id=response.json()['dataset_id'])
+        self.assertEqual(dataset.equipment.count(), 50)
+        self.assertEqual(dataset.fingerprint, parse_rows('plant.csv', rows).fingerprint)
+        # The same rows in another format and order are a duplicate
+        response = self.client.post('/api/upload/', {'file': SimpleUploadedFile('plant.arrow', arrow.getvalue())})
+        self.assertEqual(response.json()['dataset_id'], dataset.id)
+        self.assertTrue(response.json()['duplicate'])
+
+    @skipUnless(HAS_PYARROW, 'pyarrow is not installed')
+    def test_parquet_rows_are_validated(self):
+        import pyarrow.parquet
+        rows = make_rows(10)
+        rows[3] = rows[3][:3] + (5000.0,) + rows[3][4:]
+        parquet = io.BytesIO()
+        pyarrow.parquet.write_table(self.arrow_table(rows), parquet)
+        response = self.client.post('/api/upload/', {'file': SimpleUploadedFile('plant.parquet', parquet.getvalue()),
+                                                     'on_error': 'skip'})
+        self.assertEqual(response.json()['skipped'], 1)
+        self.assertEqual(response.json()['validation'][0]['rows'][0]['line'], 4)
+
+
+class ValidationTests(ApiTestCase):
+    def bad_csv(self):
+        rows = make_rows(20)
+        lines = csv_text(rows).splitlines(keepends=True)
+        # Lines 3, 6 and 9 of the file: a non-number, an out-of-range pressure and a blank name
+        lines[2] = 'U-1,Valve,abc,5,120\n'
+        lines[5] = 'U-4,Valve,100,5000,120\n'
+        lines[8] = ',Pump,100,5,120\n'
+        return ''.join(lines).encode()
+
+    def test_report_names_lines_and_reasons(self):
+        names, types, values, _, report = read_csv_columns(io.StringIO(self.bad_csv().decode()))
+        self.assertEqual(len(names), 17)
+        self.assertEqual(values.shape, (17, 3))
+        self.assertEqual(report['invalid_rows'], 3)
+        self.assertEqual([row['line'] for row in report['rows']], [3, 6, 9])
+        self.assertIn('Equipment Name is empty', report['reasons'])
+
+    def test_reject_imports_nothing(self):
+        response = self.client.post('/api/upload/', {'file': SimpleUploadedFile('bad.csv', self.bad_csv())})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['validation'][0]['invalid_rows'], 3)
+        self.assertFalse(Dataset.objects.exists())
+
+    def test_skip_imports_the_valid_rows(self):
+        response = self.client.post('/api/upload/', {'file': SimpleUploadedFile('bad.csv', self.bad_csv()),
+                                                     'on_error': 'skip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['skipped'], 3)
+        self.assertEqual(Dataset.objects.get(id=response.json()['dataset_id']).equipment.count(), 17)
+
+    def test_missing_column_is_rejected(self):
+        body = b'Equipment Name,Type,Flowrate\nU-1,Pump,100\n'
+        response = self.client.post('/api/upload/', {'file': SimpleUploadedFile('short.csv', body)})
+        self.assertEqual(response.status_code, 400)
+
+
+class RangeTests(ApiTestCase):
+    def byte_range(self, size=100, etag='"v1"', **headers):
+        return requested_range(RequestFactory().get('/', **headers), size, etag)
+
+    def test_requested_range(self):
+        self.assertEqual(self.byte_range(), (0, 99, False))
+        self.assertEqual(self.byte_range(HTTP_RANGE='bytes=10-19'), (10, 19, True))
+        self.assertEqual(self.byte_range(HTTP_RANGE='bytes=90-'), (90, 99, True))
+        self.assertEqual(self.byte_range(HTTP_RANGE='bytes=-5'), (95, 99, True))
+        self.assertEqual(self.byte_range(HTTP_RANGE='bytes=50-500'), (50, 99, True))
+        self.assertIsNone(self.byte_range(HTTP_RANGE='bytes=100-'))
+        self.assertIsNone(self.byte_range(HTTP_RANGE='bytes=20-10'))
+        # Unsupported or stale ranges get the whole body
+        self.assertEqual(self.byte_range(HTTP_RANGE='bytes=0-1,5-6'), (0, 99, False))
+        self.assertEqual(self.byte_range(HTTP_RANGE='bytes=-'), (0, 99, False))
+        self.assertEqual(self.byte_range(HTTP_RANGE='bytes=10-', HTTP_IF_RANGE='"v0"'), (0, 99, False))
+        self.assertEqual(self.byte_range(HTTP_RANGE='bytes=10-', HTTP_IF_RANGE='"v1"'), (10, 99, True))
+
+    def test_export_resumes(self):
+        dataset = self.store('plant.csv', make_rows(200))
+        url = f'/api/export/{dataset.id}/'
+        full = self.client.get(url)
+        self.assertEqual(full.status_code, 200)
+        body = b''.join(full.streaming_content)
+        etag = full['ETag']
+        self.assertEqual(gzip.decompress(body).decode().count('\n'), 201)
+
+        tail = self.client.get(url, HTTP_RANGE='bytes=100-', HTTP_IF_RANGE=etag)
+        self.assertEqual(tail.status_code, 206)
+        self.assertEqual(tail['Content-Range'], f'bytes 100-{len(body) - 1}/{len(body)}')
+        self.assertEqual(b''.join(tail.streaming_content), body[100:])
+        self.assertEqual(self.client.get(url, HTTP_RANGE=f'bytes={len(body)}-').status_code, 416)
+
+        # A write changes the version, so the old ETag no longer resumes
+        parsed = parse_rows('more.csv', make_rows(10, prefix='N'))
+        upsert_rows(dataset, parsed.names, parsed.types, parsed.values)
+        stale = self.client.get(url, HTTP_RANGE='bytes=100-', HTTP_IF_RANGE=etag)
+        self.assertEqual(stale.status_code, 200)
+        self.assertNotEqual(stale['ETag'], etag)
+
+    def test_export_keeps_newer_versions(self):
+        dataset = self.store('plant.csv', make_rows(20))
+        exports = os.path.join(self.root, 'exports')
+        os.makedirs(exports)
+        newer = os.path.join(exports, f'{dataset.id}-{dataset.version + 1}.csv.gz')
+        older = os.path.join(exports, f'{dataset.id}-{dataset.version - 1}.csv.gz')
+        for path in (newer, older):
+            open(path, 'wb').close()
+        # A request holding an older version must not delete what a newer one built
+        self.client.get(f'/api/export/{dataset.id}/')
+        self.assertTrue(os.path.exists(newer))
+        self.assertFalse(os.path.exists(older))
+
+    def test_export_deleted_before_serving_is_rebuilt(self):
+        dataset = self.store('plant.csv', make_rows(20))
+        build = export.dataset_file
+
+        def build_then_delete(*args):
+            path = build(*args)
+            if not deleted:
+                deleted.append(path)
+                os.unlink(path)
+            return path
+
+        deleted = []
+        with mock.patch.object(export, 'dataset_file', side_effect=build_then_delete):
+            response = self.client.get(f'/api/export/{dataset.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(deleted), 1)
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)).decode().count('\n'), 21)
+
+
+class AsyncViewTests(TransactionTestCase):
+    # authenticate() runs on a thread of its own, which cannot see a TestCase's open transaction
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('tester', password='tester-pass')
+        self.dataset, _ = store_dataset(self.user, parse_rows('plant.csv', make_rows(30)))
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        credentials = base64.b64encode(b'tester:tester-pass').decode()
+        self.auth = {'headers': {'Authorization': f'Basic {credentials}'}}
+
+    async def assertSameJson(self, path):
+        response = await self.async_client.get(f'/api/async/{path}', **self.auth)
+        self.assertEqual(response.status_code, 200)
+        expected = await sync_to_async(self.api.get)(f'/api/{path}')
+        self.assertEqual(response.json(), expected.json())
+
+    async def test_views_match_their_sync_counterparts(self):
+        await self.assertSameJson('datasets/')
+        await self.assertSameJson(f'equipment/{self.dataset.id}/')
+        await self.assertSameJson(f'summary/{self.dataset.id}/')
+
+    async def test_summary_builds_missing_type_summaries(self):
+        expected = (await sync_to_async(self.api.get)(f'/api/summary/{self.dataset.id}/')).json()
+        await TypeSummary.objects.filter(dataset=self.dataset).adelete()
+        response = await self.async_client.get(f'/api/async/summary/{self.dataset.id}/', **self.auth)
+        summary = response.json()
+        self.assertEqual(await TypeSummary.objects.filter(dataset=self.dataset).acount(), len(TYPES))
+        # Rebuilt summaries may merge in another order
+        for key, value in expected.items():
+            if key.startswith('avg_'):
+                self.assertAlmostEqual(summary[key], value, places=9)
+            else:
+                self.assertEqual(summary[key], value)
+
+    async def test_requests_need_basic_credentials(self):
+        health = await self.async_client.get('/api/async/health/')
+        self.assertEqual(health.json()['status'], 'ok')
+        response = await self.async_client.get('/api/async/datasets/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Basic realm="api"')
+        wrong = base64.b64encode(b'tester:wrong').decode()
+        response = await self.async_client.get('/api/async/datasets/', headers={'Authorization': f'Basic {wrong}'})
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.post('/api/async/datasets/', **self.auth)
+        self.assertEqual(response.status_code, 405)
+
+    async def test_other_users_datasets_are_not_found(self):
+        other = await sync_to_async(User.objects.create_user)('other', password='other-pass')
+        foreign, _ = await sync_to_async(store_dataset)(other, parse_rows('x.csv', make_rows(5)))
+        for path in (f'equipment/{foreign.id}/', f'summary/{foreign.id}/'):
+            response = await self.async_client.get(f'/api/async/{path}', **self.auth)
+            self.assertEqual(response.status_code, 404)
+        response = await self.async_client.get('/api/async/datasets/', **self.auth)
+        self.assertEqual([row['id'] for row in response.json()], [self.dataset.id])
+
+
+class EventStreamTests(ApiTestCase):
+    def open_stream(self, **params):
+        response = self.client.get('/api/events/', params, HTTP_ACCEPT='text/event-stream')
+        self.addCleanup(response.close)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = (chunk.decode() for chunk in response.streaming_content)
+        self.assertEqual(next(chunks), f'retry: {events.RECONNECT_MS}\n\n')
+        return response, chunks
+
+    def read_event(self, chunks):
+        chunk = next(chunks)
+        event_id, data = chunk.rstrip('\n').split('\n')
+        event = json.loads(data.removeprefix('data: '))
+        self.assertEqual(event_id, f"id: {event['id']}")
+        return event
+
+    def test_reconnect_replays_missed_events(self):
+        upload = SimpleUploadedFile('plant.csv', csv_text(make_rows(20)).encode())
+        self.client.post('/api/upload/', {'file': upload, 'job_id': 'upload-1'})
+        _, chunks = self.open_stream(last_event_id=0, job_id='upload-1')
+        stages = []
+        while not stages or stages[-1] != 'done':
+            event = self.read_event(chunks)
+            self.assertEqual((event['job'], event['file']), ('ingest', 'plant.csv'))
+            stages.append(event['stage'])
+        self.assertEqual(stages[:2], ['started', 'parsed'])
+
+        # The Last-Event-ID header resumes after the given event
+        _, chunks = self.open_stream(job_id='upload-1', last_event_id=0)
+        first = self.read_event(chunks)
+        response = self.client.get('/api/events/', {'job_id': 'upload-1'}, HTTP_ACCEPT='text/event-stream',
+                                   HTTP_LAST_EVENT_ID=str(first['id']))
+        self.addCleanup(response.close)
+        chunks = (chunk.decode() for chunk in response.streaming_content)
+        next(chunks)
+        self.assertEqual(self.read_event(chunks)['stage'], stages[1])
+
+    def test_live_events_are_filtered_by_job_and_user(self):
+        response, chunks = self.open_stream(job_id='wanted')
+        other = User.objects.create_user('other')
+        events.Job(other, 'report', 'wanted').progress('started')
+        events.Job(self.user, 'report', 'unwanted').progress('started')
+        events.Job(self.user, 'report', 'wanted', dataset_id=3).progress('chart', charts=1)
+        event = self.read_event(chunks)
+        self.assertEqual({key: event[key] for key in ('job', 'job_id', 'stage', 'dataset_id', 'charts')},
+                         {'job': 'report', 'job_id': 'wanted', 'stage': 'chart', 'dataset_id': 3, 'charts': 1})
+        response.close()
+        # Closing the response ends the subscription
+        self.assertNotIn(self.user.id, events.broker._subscribers)
+
+    def test_idle_streams_send_heartbeats(self):
+        with mock.patch.object(events, 'HEARTBEAT_SECONDS', 0.01):
+            _, chunks = self.open_stream()
+            self.assertEqual(next(chunks), ': keep-alive\n\n')
+
+    def test_rejects_a_bad_last_event_id(self):
+        response = self.client.get('/api/events/', {'last_event_id': 'x'}, HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 400)
+
+
+class CacheTests(ApiTestCase):
+    def summary_count(self, dataset):
+        return self.client.get(f'/api/summary/{dataset.id}/').json()['total_count']
+
+    def summary_counts(self):
+        return cache_stats()['namespaces'].get('summary', {'hits': 0, 'misses': 0, 'sets': 0})
+
+    def test_append_invalidates_cached_results(self):
+        dataset = self.store('plant.csv', make_rows(20))
+        before = self.summary_counts()
+        self.assertEqual(self.summary_count(dataset), 20)
+        self.assertEqual(self.summary_count(dataset), 20)
+        after = self.summary_counts()
+        self.assertEqual((after['misses'] - before['misses'], after['hits'] - before['hits']), (1, 1))
+
+        invalidations = cache_stats()['invalidations']
+        more = SimpleUploadedFile('more.csv', csv_text(make_rows(5, prefix='N')).encode())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/upload/', {'file': more, 'mode': 'append', 'dataset_id': dataset.id})
+        self.assertEqual(cache_stats()['invalidations'], invalidations + 1)
+        self.assertEqual(self.summary_count(dataset), 25)
+
+    def test_version_bump_alone_refreshes_results(self):
+        dataset = self.store('plant.csv', make_rows(20))
+        self.assertEqual(self.summary_count(dataset), 20)
+        # Another process wrote: the version moved, but this cache never saw the invalidation
+        parsed = parse_rows('more.csv', make_rows(5, prefix='N'))
+        upsert_rows(dataset, parsed.names, parsed.types, parsed.values)
+        self.assertEqual(self.summary_count(dataset), 25)
+
+    def test_results_invalidated_while_computing_are_not_served(self):
+        dataset = self.store('plant.csv', make_rows(5))
+        results = iter(['stale', 'fresh'])
+
+        def compute():
+            result = next(results)
+            if result == 'stale':
+                invalidate_dataset(dataset.id)
+            return result
+
+        self.assertEqual(cached('summary', dataset.id, (dataset.version,), compute), 'stale')
+        self.assertEqual(cached('summary', dataset.id, (dataset.version,), compute), 'fresh')
+        self.assertEqual(cached('summary', dataset.id, (dataset.version,), compute), 'fresh')
+
+    def test_stats_are_for_admins(self):
+        self.assertEqual(self.client.get('/api/cache/stats/').status_code, 403)
+        self.client.force_authenticate(User.objects.create_superuser('admin', password='admin-pass'))
+        response = self.client.get('/api/cache/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['backend'], 'api.cache_backends.CountingLocMemCache')
+        self.assertEqual(response.json()['evictions'], 0)
+
+
+class SearchTests(ApiTestCase):
+    NAMES = (('Pump Alpha', 'Pump'), ('Cooling Pump 2', 'Pump'), ('Booster 7', 'Pump'),
+             ('Pumphouse Drain', 'Valve'), ('Feed Valve', 'Valve'), ('Centrifugal Compressor', 'Compressor'))
+
+    def setUp(self):
+        super().setUp()
+        self.dataset = self.store('plant.csv', [(name, eq_type, 10.0, 2.0, 50.0) for name, eq_type in self.NAMES])
+
+    def search(self, q, **params):
+        response = self.client.get('/api/search/', {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def matches(self, q, **params):
+        return [(result['name'], result['match']) for result in self.search(q, **params)['results']]
+
+    def test_tiers_rank_prefix_then_words(self):
+        # Prefix matches alphabetically, then word matches newest first
+        self.assertEqual(self.matches('pump'), [('Pump Alpha', 'prefix'), ('Pumphouse Drain', 'prefix'),
+                                                ('Booster 7', 'type'), ('Cooling Pump 2', 'name')])
+        self.assertEqual(self.matches('cool pu'), [('Cooling Pump 2', 'name')])
+        # Words longer than the indexed prefixes are completed from known words
+        self.assertEqual(self.matches('centrifu'), [('Centrifugal Compressor', 'prefix')])
+        self.assertEqual(self.matches('compress'), [('Centrifugal Compressor', 'name')])
+        self.assertEqual(self.matches('pump', type='Valve'), [('Pumphouse Drain', 'prefix')])
+        result = self.search('pump')['results'][0]
+        self.assertEqual((result['dataset_id'], result['dataset_name']), (self.dataset.id, 'plant.csv'))
+
+    def test_fuzzy_tier_matches_near_misses(self):
+        self.assertEqual(self.matches('compresor'), [('Centrifugal Compressor', 'fuzzy')])
+        self.assertEqual(self.matches('feed valv'), [('Feed Valve', 'prefix')])
+        self.assertEqual(self.matches('centrifugl compressor'), [('Centrifugal Compressor', 'fuzzy')])
+        self.assertEqual(self.matches('compresor', fuzzy='false'), [])
+
+    def test_scope_and_paging(self):
+        other = User.objects.create_user('other')
+        store_dataset(other, parse_rows('theirs.csv', [('Pump Beta', 'Pump', 1.0, 1.0, 1.0)]))
+        newer = self.store('newer.csv', [('Pump Gamma', 'Pump', 1.0, 1.0, 1.0)])
+        self.assertEqual(self.matches('pump')[0], ('Pump Gamma', 'prefix'))
+        self.assertNotIn(('Pump Beta', 'prefix'), self.matches('pump'))
+        self.assertEqual(self.matches('pump', ids=str(newer.id)), [('Pump Gamma', 'prefix')])
+
+        first = self.search('pump', page_size=2)
+        second = self.search('pump', page_size=2, page=2)
+        self.assertTrue(first['has_more'])
+        self.assertEqual([r['name'] for r in first['results'] + second['results']],
+                         [name for name, _ in self.matches('pump')][:4])
+        self.assertEqual(self.client.get('/api/search/', {'q': 'p'}).status_code, 400)
+
+    def test_index_follows_saves_and_deletes(self):
+        unit = Equipment.objects.create(dataset=self.dataset, name='Spare Turbine', type='Turbine',
+                                        flowrate=1.0, pressure=1.0, temperature=1.0)
+        self.assertEqual(self.matches('turbine'), [('Spare Turbine', 'name')])
+        unit.name = 'Spare Blower'
+        unit.save()
+        self.assertEqual(self.matches('blower'), [('Spare Blower', 'name')])
+        self.assertEqual(self.matches('turbine'), [('Spare Blower', 'type')])
+        unit.delete()
+        self.assertEqual(self.matches('blower'), [])
+
+
+class BundleTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.rows = make_rows(600)
+        self.dataset = self.store('plant.csv', self.rows)
+        self.url = f'/api/bundle/{self.dataset.id}/'
+
+    def test_sections_match_their_endpoints(self):
+        bundle = self.client.get(self.url, {'page': 2, 'page_size': 5}).json()
+        self.assertEqual(set(bundle), {'dataset_id', 'summary', 'types', 'equipment', 'series', 'correlation'})
+        self.assertEqual(bundle['summary'], self.client.get(f'/api/summary/{self.dataset.id}/').json())
+        self.assertEqual(bundle['equipment'],
+                         self.client.get(f'/api/equipment/{self.dataset.id}/', {'page': 2, 'page_size': 5}).json())
+        self.assertEqual(bundle['correlation'],
+                         self.client.get(f'/api/correlation/{self.dataset.id}/').json()['overall'])
+        self.assertEqual({t['type']: t['count'] for t in bundle['types']}, {t: 200 for t in TYPES})
+
+    def test_series_keeps_the_extremes(self):
+        series = self.client.get(self.url, {'include': 'series', 'points': 60}).json()['series']
+        self.assertEqual(series['count'], 600)
+        self.assertLessEqual(len(series['index']), 60)
+        self.assertEqual(series['index'], sorted(series['index']))
+        for j, param in enumerate(PARAMETERS):
+            column = [row[2 + j] for row in self.rows]
+            self.assertEqual(series[param], [column[i] for i in series['index']])
+            self.assertEqual((min(series[param]), max(series[param])), (min(column), max(column)))
+
+    def test_include_picks_sections(self):
+        bundle = self.client.get(self.url, {'include': 'types,summary,types'}).json()
+        self.assertEqual(list(bundle), ['dataset_id', 'types', 'summary'])
+        self.assertEqual(self.client.get(self.url, {'include': 'rows'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'points': 3}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'page_size': 500}).status_code, 400)
+
+
+class RendererTests(ApiTestCase):
+    ARROW = 'application/vnd.apache.arrow.stream'
+
+    def setUp(self):
+        super().setUp()
+        self.dataset = self.store('plant.csv', make_rows(50))
+
+    def get(self, path, accept, **params):
+        response = self.client.get(path, params, HTTP_ACCEPT=accept)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], accept)
+        return response.content
+
+    def arrow_table(self, body):
+        import pyarrow as pa
+        return pa.ipc.open_stream(body).read_all()
+
+    def test_msgpack_has_the_json_shape(self):
+        for path in (f'/api/summary/{self.dataset.id}/', f'/api/equipment/{self.dataset.id}/', '/api/datasets/'):
+            body = self.get(path, 'application/msgpack')
+            self.assertEqual(msgpack.unpackb(body), self.client.get(path).json())
+
+    def test_msgpack_packs_float_columns(self):
+        path = f'/api/bundle/{self.dataset.id}/'
+        body = self.get(path, 'application/msgpack', include='series')
+
+        def ext_hook(code, data):
+            self.assertEqual(code, FLOAT64_ARRAY)
+            return np.frombuffer(data, dtype='<f8').tolist()
+
+        series = msgpack.unpackb(body, ext_hook=ext_hook)['series']
+        self.assertEqual(series, self.client.get(path, {'include': 'series'}).json()['series'])
+        # Without the hook the columns arrive as raw ext values
+        self.assertIsInstance(msgpack.unpackb(body)['series']['flowrate'], msgpack.ExtType)
+
+    @skipUnless(HAS_PYARROW, 'pyarrow is not installed')
+    def test_arrow_rows(self):
+        path = f'/api/equipment/{self.dataset.id}/'
+        self.assertEqual(self.arrow_table(self.get(path, self.ARROW)).to_pylist(), self.client.get(path).json())
+
+        page = self.client.get(path, {'page': 2, 'page_size': 10}).json()
+        table = self.arrow_table(self.get(path, self.ARROW, page=2, page_size=10))
+        self.assertEqual(table.to_pylist(), page['results'])
+        self.assertEqual(json.loads(table.schema.metadata[ARROW_META_KEY]),
+                         {key: value for key, value in page.items() if key != 'results'})
+
+        results = self.client.get('/api/search/', {'q': 'pump'}).json()['results']
+        self.assertEqual(self.arrow_table(self.get('/api/search/', self.ARROW, q='pump')).to_pylist(), results)
+
+    def test_arrow_is_only_offered_for_rows(self):
+        response = self.client.get(f'/api/summary/{self.dataset.id}/', HTTP_ACCEPT=self.ARROW)
+        self.assertEqual(response.status_code, 406)
+
+
+class ChunkedUploadTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        # Two and a half chunks
+        self.body = csv_text(make_rows(16000)).encode()[:int(2.5 * MIN_CHUNK_SIZE)]
+        self.body = self.body[:self.body.rindex(b'\n') + 1]
+
+    def start(self, name='plant.csv', **data):
+        response = self.client.post('/api/uploads/', {'name': name, 'size': len(self.body),
+                                                      'chunk_size': MIN_CHUNK_SIZE, **data})
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def put_chunk(self, upload_id, index, checksum=None):
+        chunk = self.body[index * MIN_CHUNK_SIZE:(index + 1) * MIN_CHUNK_SIZE]
+        return self.client.put(f'/api/uploads/{upload_id}/chunks/{index}/', chunk,
+                               content_type='application/octet-stream',
+                               HTTP_X_CHUNK_SHA256=checksum or hashlib.sha256(chunk).hexdigest())
+
+    def test_lifecycle(self):
+        upload = self.start()
+        upload_id = upload['upload_id']
+        self.assertEqual(upload['chunks'], 3)
+
+        response = self.client.post(f'/api/uploads/{upload_id}/commit/')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['missing'], [0, 1, 2])
+
+        self.assertEqual(self.put_chunk(upload_id, 1, checksum='0' * 64).status_code, 400)
+        self.assertEqual(self.put_chunk(upload_id, 2).status_code, 200)
+        self.assertEqual(self.put_chunk(upload_id, 0).status_code, 200)
+        # Resuming: the client asks which chunks are in, and a repeated PUT is a no-op
+        self.assertEqual(self.client.get(f'/api/uploads/{upload_id}/').json()['received'], [0, 2])
+        self.assertEqual(self.put_chunk(upload_id, 0).status_code, 200)
+        self.assertEqual(self.client.post(f'/api/uploads/{upload_id}/commit/').json()['missing'], [1])
+        self.assertEqual(self.put_chunk(upload_id, 1).status_code, 200)
+
+        response = self.client.post(f'/api/uploads/{upload_id}/commit/')
+        self.assertEqual(response.status_code, 200)
+        dataset = Dataset.objects.get(id=response.json()['dataset_id'])
+        self.assertEqual(dataset.equipment.count(), self.body.count(b'\n') - 1)
+        self.assertEqual(self.client.get(f'/api/uploads/{upload_id}/').status_code, 404)
+
+    def test_commit_matches_a_single_upload(self):
+        upload_id = self.start()['upload_id']
+        for index in range(3):
+            self.put_chunk(upload_id, index)
+        chunked = self.client.post(f'/api/uploads/{upload_id}/commit/').json()
+        direct = read_csv_columns(io.StringIO(self.body.decode()))
+        self.assertEqual(chunked['fingerprint'], direct[3])
+
+    def test_delete_aborts(self):
+        upload_id = self.start()['upload_id']
+        self.put_chunk(upload_id, 0)
+        self.assertEqual(self.client.delete(f'/api/uploads/{upload_id}/').status_code, 204)
+        self.assertEqual(self.put_chunk(upload_id, 1).status_code, 404)
+
+    def test_uploads_are_private(self):
+        upload_id = self.start()['upload_id']
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('other', password='other-pass'))
+        self.assertEqual(other.get(f'/api/uploads/{upload_id}/').status_code, 404)
+
+
+class BulkIngestTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(self.root, 'plant.csv')
+        with open(self.path, 'w') as f:
+            f.write(csv_text(make_rows(600)))
+        self.checkpoint_path = os.path.join(self.root, 'checkpoint.json')
+
+    def test_parts_together_match_the_whole_file(self):
+        parts = bulk_ingest.split_file(self.path, 4096)
+        self.assertGreater(len(parts), 3)
+        parsed = [bulk_ingest.parse_part(part) for part in parts]
+        with open(self.path) as f:
+            whole = read_csv_columns(f)
+        self.assertEqual([name for p in parsed for name in p.names], whole[0])
+        np.testing.assert_array_equal(np.concatenate([p.values for p in parsed]), whole[2])
+        total = sum(int(p.fingerprint, 16) for p in parsed) % (1 << 256)
+        self.assertEqual(f'{total:064x}', whole[3])
+        self.assertEqual(sum(p.lines for p in parsed), 601)
+
+    def test_recover_undoes_an_unrecorded_batch(self):
+        dataset, checkpoint = bulk_ingest.start(self.user, [self.path], self.checkpoint_path, name='bulk',
+                                                split_bytes=4096)
+        parsed = [bulk_ingest.parse_part(part) for part in bulk_ingest.split_file(self.path, 4096)]
+        bulk_ingest.write_batch(dataset, checkpoint, parsed[:2], {})
+        written = dataset.equipment.count()
+        fingerprint = Dataset.objects.get(id=dataset.id).fingerprint
+
+        # The batch commits, but the process dies before the checkpoint records it
+        with mock.patch.object(checkpoint, 'commit', side_effect=RuntimeError('crash')):
+            with self.assertRaises(RuntimeError):
+                bulk_ingest.write_batch(dataset, checkpoint, parsed[2:4], {})
+        self.assertGreater(dataset.equipment.count(), written)
+
+        dataset, checkpoint = bulk_ingest.start(self.user, [self.path], self.checkpoint_path, split_bytes=4096)
+        self.assertIsNone(checkpoint.state['pending'])
+        self.assertEqual(dataset.equipment.count(), written)
+        self.assertEqual(Dataset.objects.get(id=dataset.id).fingerprint, fingerprint)
+        self.assertEqual(sum(s.count for s in TypeSummary.objects.filter(dataset=dataset)), written)
+
+    def test_run_owns_the_dataset_until_released(self):
+        target = self.store('plant.csv', make_rows(30, prefix='T'))
+        dataset, _ = bulk_ingest.start(self.user, [self.path], self.checkpoint_path, dataset_id=target.id)
+        dataset.refresh_from_db()
+        parsed = parse_rows('more.csv', make_rows(5, prefix='N'))
+        with self.assertRaises(ValueError):
+            upsert_rows(dataset, parsed.names, parsed.types, parsed.values)
+        more = SimpleUploadedFile('more.csv', csv_text(make_rows(5)).encode())
+        response = self.client.post('/api/upload/', {'file': more, 'mode': 'append', 'dataset_id': dataset.id})
+        self.assertEqual(response.status_code, 409)
+        with self.assertRaises(ValueError):
+            bulk_ingest.start(self.user, [self.path], os.path.join(self.root, 'other.json'), dataset_id=target.id)
+
+        bulk_ingest.release(self.user, self.checkpoint_path)
+        self.assertFalse(os.path.exists(self.checkpoint_path))
+        self.assertEqual(upsert_rows(dataset, parsed.names, parsed.types, parsed.values), (5, 0))
+
+    def test_skip_after_reject_reports_file_line_numbers(self):
+        rows = make_rows(600)
+        rows[400] = rows[400][:3] + (5000.0,) + rows[400][4:]
+        with open(self.path, 'w') as f:
+            f.write(csv_text(rows))
+        dataset, checkpoint = bulk_ingest.start(self.user, [self.path], self.checkpoint_path, name='bulk',
+                                                split_bytes=4096)
+        written, _, reports = bulk_ingest.run(dataset, checkpoint, [self.path], workers=1, batch_rows=10 ** 6)
+        # Line 1 is the header, so rows[400] sits on line 402
+        self.assertEqual([row['line'] for row in reports[self.path]['rows']], [402])
+        self.assertGreater(written, 0)
+
+        dataset, checkpoint = bulk_ingest.start(self.user, [self.path], self.checkpoint_path, split_bytes=4096)
+        resumed, skipped, reports = bulk_ingest.run(dataset, checkpoint, [self.path], workers=1, on_error='skip')
+        self.assertEqual([row['line'] for row in reports[self.path]['rows']], [402])
+        self.assertEqual((skipped, written + resumed), (1, 599))
+        self.assertEqual(dataset.equipment.count(), 599)
+
+
+class CorrelationTests(ApiTestCase):
+    def test_pearson_matches_numpy(self):
+        first_rows, second_rows = make_rows(500), make_rows(400, seed=1, prefix='B')
+        first, second = self.store('a.csv', first_rows), self.store('b.csv', second_rows)
+        # One dataset, then both merged
+        for url, rows in ((f'/api/correlation/{first.id}/', first_rows),
+                          (f'/api/correlation/?ids={first.id},{second.id}', first_rows + second_rows)):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            values = np.array([row[2:] for row in rows])
+            np.testing.assert_allclose(response.json()['overall']['pearson'], np.corrcoef(values.T), atol=1e-9)
+            pumps = values[[row[1] == 'Pump' for row in rows]]
+            np.testing.assert_allclose(response.json()['types']['Pump']['pearson'], np.corrcoef(pumps.T), atol=1e-9)
+
+    def test_spearman_and_fits(self):
+        rows = make_rows(2000)
+        dataset = self.store('a.csv', rows)
+        result = self.client.get(f'/api/correlation/{dataset.id}/').json()['overall']
+        values = np.array([row[2:] for row in rows])
+        ranks = values.argsort(axis=0).argsort(axis=0)
+        np.testing.assert_allclose(result['spearman'], np.corrcoef(ranks.T), atol=0.02)
+        fit = next(fit for fit in result['fits'] if (fit['x'], fit['y']) == ('flowrate', 'temperature'))
+        slope, intercept = np.polyfit(values[:, 0], values[:, 2], 1)
+        self.assertAlmostEqual(fit['slope'], slope, places=6)
+        self.assertAlmostEqual(fit['intercept'], intercept, places=4)
+
+
+class TrendTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.rows = make_rows(30)
+        # The same units, 5 degrees hotter, two days later
+        self.first = self.store('jan.csv', self.rows)
+        self.second = self.store('feb.csv', [row[:4] + (round(row[4] + 5, 3),) for row in self.rows])
+        Dataset.objects.filter(id=self.second.id).update(uploaded_at=self.first.uploaded_at + timedelta(days=2))
+        self.second.refresh_from_db()
+        trends.dataset_changed(self.second)
+
+    def test_stored_trends(self):
+        self.assertEqual(EquipmentTrend.objects.filter(user=self.user).count(), 30)
+        trend = EquipmentTrend.objects.get(user=self.user, name='U-0')
+        self.assertEqual(trend.dataset_id, self.second.id)
+        self.assertEqual(trend.observations, 2)
+        self.assertAlmostEqual(trend.temperature_latest, self.rows[0][4] + 5, places=6)
+        self.assertAlmostEqual(trend.temperature_drift, 5, places=6)
+        self.assertAlmostEqual(trend.temperature_rate, 2.5, places=6)
+        self.assertAlmostEqual(trend.flowrate_drift, 0, places=6)
+        self.assertTrue(0 <= trend.temperature_percentile <= 100)
+
+    def test_units_in_one_dataset_have_no_trend(self):
+        self.store('mar.csv', make_rows(5, seed=3, prefix='X'))
+        self.assertFalse(EquipmentTrend.objects.filter(name__startswith='X-').exists())
+
+    def test_endpoints(self):
+        response = self.client.get('/api/trends/', {'parameter': 'temperature', 'order': '-drift', 'limit': 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 5)
+        self.assertEqual(self.client.get('/api/trends/', {'order': 'bogus'}).status_code, 400)
+        history = self.client.get('/api/trends/history/', {'name': 'U-0'}).json()
+        self.assertEqual([entry['dataset_id'] for entry in history['history']], [self.first.id, self.second.id])
+
+    def test_removing_a_dataset_drops_its_trends(self):
+        self.first.delete()
+        trends.dataset_removed(self.user)
+        self.assertFalse(EquipmentTrend.objects.filter(user=self.user).exists())
+
+
+class DistributionTests(ApiTestCase):
+    def test_merged_percentiles_and_histogram(self):
+        first_rows, second_rows = make_rows(600), make_rows(400, seed=1, prefix='B')
+        first, second = self.store('a.csv', first_rows), self.store('b.csv', second_rows)
+        response = self.client.get('/api/distribution/', {'ids': f'{first.id},{second.id}', 'bins': 10,
+                                                          'percentiles': '10,50,90'})
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(result['datasets'], [first.id, second.id])
+        self.assertEqual(result['count'], 1000)
+        temperature = np.array([row[4] for row in first_rows + second_rows])
+        stats = result['parameters']['temperature']
+        self.assertEqual((stats['min'], stats['max']), (temperature.min(), temperature.max()))
+        for p in (10, 50, 90):
+            # Sketch quantiles are within 1% of the value at that rank
+            self.assertAlmostEqual(stats['percentiles'][f'p{p}'], np.percentile(temperature, p),
+                                   delta=0.02 * np.percentile(temperature, p))
+        self.assertEqual(len(stats['histogram']['counts']), 10)
+        self.assertEqual(sum(stats['histogram']['counts']), 1000)
+
+    def test_type_filter(self):
+        dataset = self.store('a.csv', make_rows(90))
+        result = self.client.get(f'/api/distribution/{dataset.id}/', {'type': 'Pump'}).json()
+        self.assertEqual(result['count'], 30)
+        self.assertEqual(self.client.get(f'/api/distribution/{dataset.id}/', {'type': 'Boiler'}).status_code, 404)
+
+    def test_bad_parameters(self):
+        dataset = self.store('a.csv', make_rows(20))
+        self.assertEqual(self.client.get(f'/api/distribution/?ids={dataset.id},{dataset.id}').status_code, 400)
+        self.assertEqual(self.client.get(f'/api/correlation/?ids={dataset.id},{dataset.id}').status_code, 400)
+        self.assertEqual(self.client.get(f'/api/distribution/{dataset.id}/', {'bins': 0}).status_code, 400)
+        self.assertEqual(self.client.get(f'/api/distribution/{dataset.id}/', {'percentiles': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/distribution/').status_code, 400)
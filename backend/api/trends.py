@@ -0,0 +1,191 @@
+"""Per-equipment trends across a user's datasets.
+
+Successive uploads usually describe the same units, so rows of a user's
+datasets are joined on equipment name. The join runs in the database
+on the ``(dataset, name)`` index and yields one mean per unit and
+dataset. Drift, rate and percentile changes are computed for all units
+at once with NumPy.
+
+Results are stored as one ``EquipmentTrend`` per unit found in two or
+more datasets. They are refreshed in the transaction that writes a
+dataset, so questions like "which pumps are trending hotter" are a
+single indexed query:
+
+* a new or appended dataset refreshes the units it shares with the
+  user's other datasets;
+* removing a dataset refreshes every stored trend.
+
+Per parameter, a trend holds:
+
+* ``latest`` - the mean in the newest dataset holding the unit;
+* ``drift`` - ``latest`` minus the mean in the oldest one;
+* ``rate`` - the least-squares slope of the means against upload time,
+  per day;
+* ``percentile`` - where ``latest`` falls among all rows of its type in
+  that dataset, read from the stored quantile sketches;
+* ``percentile_change`` - the change in percentile since the previous
+  dataset holding the unit.
+
+Duplicate names within a dataset are averaged.
+"""
+import numpy as np
+from django.db import connection
+from django.db.models import Avg, Count, Max
+
+from .models import Dataset, Equipment, EquipmentTrend
+from .sketches import ranks
+from .summaries import PARAMETERS, get_type_summaries
+
+TREND_METRICS = ('latest', 'drift', 'rate', 'percentile', 'percentile_change')
+SECONDS_PER_DAY = 86400
+# Names per IN (...) lookup, below SQLite's bound parameter limit
+NAME_CHUNK = 5000
+# Columns of a computed trend row, in order
+TREND_COLUMNS = ('user_id', 'name', 'type', 'dataset_id', 'observations',
+                 *(f'{param}_{metric}' for metric in TREND_METRICS for param in PARAMETERS))
+
+
+def _chunks(names):
+    names = sorted(names)
+    return (names[i:i + NAME_CHUNK] for i in range(0, len(names), NAME_CHUNK))
+
+
+def shared_names(dataset):
+    """Names of ``dataset``'s units that are also in another dataset of its owner"""
+    return set(Equipment.objects.filter(dataset__uploaded_by=dataset.uploaded_by_id,
+                                        name__in=dataset.equipment.values('name'))
+               .exclude(dataset=dataset).order_by().values_list('name', flat=True))
+
+
+def unit_means(user, names):
+    """Per (dataset, name) means of the user's rows for ``names``"""
+    rows = []
+    for chunk in _chunks(names):
+        rows.extend(Equipment.objects.filter(dataset__uploaded_by=user, name__in=chunk).order_by()
+                    .values('dataset_id', 'name')
+                    .annotate(unit_type=Max('type'), rows=Count('id'),
+                              **{f'mean_{p}': Avg(p) for p in PARAMETERS})
+                    .values_list('dataset_id', 'name', 'unit_type', 'rows', *(f'mean_{p}' for p in PARAMETERS)))
+    return rows
+
+
+def compute_trends(user, rows):
+    """Trend rows (tuples of ``TREND_COLUMNS``) from ``unit_means`` rows"""
+    datasets = list(Dataset.objects.filter(uploaded_by=user).order_by('uploaded_at', 'id'))
+    if not rows or len(datasets) < 2:
+        return []
+    position = {dataset.id: i for i, dataset in enumerate(datasets)}
+    columns = list(zip(*rows))
+    ds_codes = np.fromiter((position[d] for d in columns[0]), dtype=np.intp, count=len(rows))
+    names, name_codes = np.unique(np.asarray(columns[1], dtype=object), return_inverse=True)
+
+    # (unit, dataset, parameter) means, NaN where the unit is not in the dataset
+    means = np.full((len(names), len(datasets), len(PARAMETERS)), np.nan)
+    means[name_codes, ds_codes] = np.column_stack([np.asarray(col, dtype=float) for col in columns[4:]])
+    types = np.empty((len(names), len(datasets)), dtype=object)
+    types[name_codes, ds_codes] = columns[2]
+    observed = ~np.isnan(means[:, :, 0])
+    observations = observed.sum(axis=1)
+    keep = observations >= 2
+    means, types, observed, observations, names = means[keep], types[keep], observed[keep], observations[keep], names[keep]
+    if not len(names):
+        return []
+
+    units = np.arange(len(names))
+    positions = np.arange(len(datasets))
+    first = observed.argmax(axis=1)
+    last = len(datasets) - 1 - observed[:, ::-1].argmax(axis=1)
+    previous = len(datasets) - 1 - (observed & (positions < last[:, None]))[:, ::-1].argmax(axis=1)
+    latest = means[units, last]
+    drift = latest - means[units, first]
+
+    # Least-squares slope against upload time over the datasets holding each unit
+    days = np.array([(d.uploaded_at - datasets[0].uploaded_at).total_seconds() / SECONDS_PER_DAY for d in datasets])
+    weights = observed.astype(float)
+    values = np.nan_to_num(means)
+    mean_day = (weights * days).sum(axis=1) / observations
+    day_deviations = (days - mean_day[:, None]) * weights
+    mean_value = (values * weights[:, :, None]).sum(axis=1) / observations[:, None]
+    covariance = (day_deviations[:, :, None] * (values - mean_value[:, None, :]) * weights[:, :, None]).sum(axis=1)
+    variance = (day_deviations ** 2).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rate = np.where(variance[:, None] > 0, covariance / variance[:, None], np.nan)
+
+    # Percentile of each unit's mean among its type's rows, per dataset
+    percentiles = np.full(means.shape, np.nan)
+    for d, dataset in enumerate(datasets):
+        in_dataset = observed[:, d]
+        if not in_dataset.any():
+            continue
+        for summary in get_type_summaries(dataset):
+            selected = in_dataset & (types[:, d] == summary.type)
+            if selected.any():
+                for j, param in enumerate(PARAMETERS):
+                    percentiles[selected, d, j] = 100 * ranks(summary.sketches[param], means[selected, d, j])
+    percentile = percentiles[units, last]
+    percentile_change = percentile - percentiles[units, previous]
+
+    # One column per (metric, parameter), in TREND_COLUMNS order, NULL for NaN
+    metrics = np.concatenate([latest, drift, rate, percentile, percentile_change], axis=1).astype(object)
+    metrics[np.isnan(metrics.astype(float))] = None
+    dataset_ids = np.array([d.id for d in datasets])[last].tolist()
+    return [
+        (user.id, name, unit_type, dataset_id, count, *values)
+        for name, unit_type, dataset_id, count, values in zip(
+            names.tolist(), types[units, last].tolist(), dataset_ids, observations.tolist(), metrics.tolist())
+    ]
+
+
+def _write_trends(rows):
+    # Plain executemany: building model instances for bulk_create costs
+    # more than computing the trends
+    columns = ', '.join(connection.ops.quote_name(column) for column in TREND_COLUMNS)
+    placeholders = ', '.join(['%s'] * len(TREND_COLUMNS))
+    with connection.cursor() as cursor:
+        cursor.executemany(f'INSERT INTO {EquipmentTrend._meta.db_table} ({columns}) VALUES ({placeholders})', rows)
+
+
+def refresh_trends(user, names):
+    """Recompute the stored trends of ``names``. Call inside the writing transaction."""
+    trends = compute_trends(user, unit_means(user, names))
+    for chunk in _chunks(names):
+        EquipmentTrend.objects.filter(user=user, name__in=chunk).delete()
+    _write_trends(trends)
+    return len(trends)
+
+
+def dataset_changed(dataset):
+    """Refresh the trends of the units ``dataset`` shares with its owner's other datasets"""
+    return refresh_trends(dataset.uploaded_by, shared_names(dataset))
+
+
+def dataset_removed(user):
+    """Refresh every stored trend of ``user`` after one of their datasets was deleted"""
+    names = EquipmentTrend.objects.filter(user=user).values_list('name', flat=True)
+    trends = compute_trends(user, unit_means(user, set(names)))
+    EquipmentTrend.objects.filter(user=user).delete()
+    _write_trends(trends)
+    return len(trends)
+
+
+def trend_payload(trend):
+    return {
+        'name': trend.name,
+        'type': trend.type,
+        'dataset_id': trend.dataset_id,
+        'observations': trend.observations,
+        **{param: {metric: getattr(trend, f'{param}_{metric}') for metric in TREND_METRICS} for param in PARAMETERS},
+    }
+
+
+def unit_history(user, name):
+    """The unit's mean readings in each of the user's datasets holding it, oldest first"""
+    rows = unit_means(user, [name])
+    datasets = Dataset.objects.in_bulk([row[0] for row in rows])
+    history = [
+        {'dataset_id': dataset_id, 'dataset_name': datasets[dataset_id].name,
+         'uploaded_at': datasets[dataset_id].uploaded_at, 'type': unit_type, 'rows': count,
+         **dict(zip(PARAMETERS, values))}
+        for dataset_id, _, unit_type, count, *values in rows
+    ]
+    return sorted(history, key=lambda entry: (entry['uploaded_at'], entry['dataset_id']))
@@ -0,0 +1,354 @@
+"""Chunked, resumable uploads.
+
+A client starts an upload with the file's name and size, PUTs the file in
+fixed-size chunks (in any order, several at once, each with its SHA-256)
+and commits once every chunk is in. Chunks are written straight into a
+preallocated file under ``CHUNKED_UPLOAD_ROOT``. A chunk counts as received
+once its marker file exists, so the state survives restarts and is shared
+by worker processes. A client resumes by asking which chunks are already
+received.
+
+CSV and gzipped CSV uploads are parsed while they arrive. A thread started
+with the upload reads the file in order and waits for chunks that are still
+missing, so a commit only has to store the rows. That thread runs in the
+process that started the upload; a commit handled by another process
+parses the assembled file itself, and so does a commit after the parse gave
+up waiting (``CHUNKED_UPLOAD_PARSE_IDLE_SECONDS``) or after its finished
+result was dropped for going unclaimed that long. ZIP, Parquet and Arrow
+files need the whole file and are parsed on commit.
+
+Expired uploads are swept when an upload starts and at most once a minute
+while chunks arrive. A commit holds a marker file naming its host, process
+and start time; a marker left by a dead process, or older than
+``CHUNKED_UPLOAD_COMMIT_TIMEOUT``, no longer blocks a retry.
+"""
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import socket
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+
+from .ingest import read_csv_file, read_upload, upload_format
+
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+STREAMED_FORMATS = ('.csv', '.csv.gz')
+BLOCK_SIZE = 1024 * 1024
+# How often a waiting parse checks for chunks written by other processes
+CHUNK_POLL_SECONDS = 0.5
+# Least time between two sweeps for expired uploads made while chunks arrive
+SWEEP_INTERVAL_SECONDS = 60
+
+# Woken whenever this process stores a chunk
+_arrivals = threading.Condition()
+# Parses of uploads started in this process, by upload id
+_parses = {}
+_parses_lock = threading.Lock()
+_last_sweep = float('-inf')
+
+
+class ChunkedUpload:
+    """An upload in progress, as stored under ``CHUNKED_UPLOAD_ROOT``"""
+
+    def __init__(self, upload_id, meta):
+        self.id = upload_id
+        self.meta = meta
+        self.directory = os.path.join(settings.CHUNKED_UPLOAD_ROOT, upload_id)
+        self.data_path = os.path.join(self.directory, 'data')
+
+    @property
+    def name(self):
+        return self.meta['name']
+
+    @property
+    def size(self):
+        return self.meta['size']
+
+    @property
+    def chunk_size(self):
+        return self.meta['chunk_size']
+
+    @property
+    def chunk_count(self):
+        return -(-self.size // self.chunk_size)
+
+    def chunk_range(self, index):
+        start = index * self.chunk_size
+        return start, min(start + self.chunk_size, self.size)
+
+    def _marker(self, index):
+        return os.path.join(self.directory, f'{index}.chunk')
+
+    def has_chunk(self, index):
+        return os.path.exists(self._marker(index))
+
+    def received(self):
+        return sorted(int(name[:-len('.chunk')]) for name in os.listdir(self.directory) if name.endswith('.chunk'))
+
+    def missing(self):
+        received = set(self.received())
+        return [index for index in range(self.chunk_count) if index not in received]
+
+    def status(self):
+        return {
+            'upload_id': self.id,
+            'name': self.name,
+            'size': self.size,
+            'chunk_size': self.chunk_size,
+            'chunks': self.chunk_count,
+            'received': self.received(),
+        }
+
+    def write_chunk(self, index, stream, length, checksum):
+        """Store chunk ``index`` read from ``stream``; ``checksum`` is its SHA-256 in hex.
+
+        Sending a received chunk again with the same checksum is a no-op,
+        so a client can retry a PUT whose response it never got.
+        """
+        if not 0 <= index < self.chunk_count:
+            raise ValueError(f'Chunk index must be between 0 and {self.chunk_count - 1}')
+        start, end = self.chunk_range(index)
+        if length != end - start:
+            raise ValueError(f'Chunk {index} must be {end - start} bytes, got {length}')
+        checksum = checksum.strip().lower()
+        marker = self._marker(index)
+        if os.path.exists(marker):
+            with open(marker) as f:
+                if f.read() == checksum:
+                    return
+            raise ValueError(f'Chunk {index} was already received with a different checksum')
+
+        digest = hashlib.sha256()
+        with open(self.data_path, 'r+b') as f:
+            f.seek(start)
+            remaining = length
+            while remaining:
+                block = stream.read(min(BLOCK_SIZE, remaining))
+                if not block:
+                    raise ValueError(f'Chunk {index} ended after {length - remaining} bytes')
+                digest.update(block)
+                f.write(block)
+                remaining -= len(block)
+            f.flush()
+            os.fsync(f.fileno())
+        if digest.hexdigest() != checksum:
+            raise ValueError(f'Chunk {index} does not match its checksum')
+        with open(marker, 'w') as f:
+            f.write(checksum)
+        with _arrivals:
+            _arrivals.notify_all()
+
+    def claim_commit(self):
+        """True for the one caller that may commit this upload"""
+        marker = os.path.join(self.directory, 'commit')
+        try:
+            fd = os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if not self._commit_stale(marker):
+                return False
+            # Only one of several callers finding the same stale marker can move it away
+            try:
+                os.rename(marker, f'{marker}.stale-{uuid.uuid4().hex}')
+            except FileNotFoundError:
+                return False
+            return self.claim_commit()
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'host': socket.gethostname(), 'pid': os.getpid(), 'started': time.time()}, f)
+        return True
+
+    @staticmethod
+    def _commit_stale(marker):
+        try:
+            with open(marker) as f:
+                owner = json.load(f)
+        except FileNotFoundError:
+            return False
+        except ValueError:
+            # Written by a process that died between creating and filling it
+            return time.time() - os.path.getmtime(marker) > settings.CHUNKED_UPLOAD_COMMIT_TIMEOUT
+        if time.time() - owner['started'] > settings.CHUNKED_UPLOAD_COMMIT_TIMEOUT:
+            return True
+        if owner['host'] != socket.gethostname():
+            return False
+        try:
+            os.kill(owner['pid'], 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        return False
+
+    def release_commit(self):
+        os.unlink(os.path.join(self.directory, 'commit'))
+
+    def wait_for_chunk(self, index):
+        """Block until chunk ``index`` is received; fails once the upload is gone or idle too long"""
+        deadline = time.monotonic() + settings.CHUNKED_UPLOAD_PARSE_IDLE_SECONDS
+        with _arrivals:
+            while not self.has_chunk(index):
+                if not os.path.isdir(self.directory):
+                    raise ValueError('Upload was aborted')
+                if time.monotonic() > deadline:
+                    raise ValueError(f'Timed out waiting for chunk {index}')
+                _arrivals.wait(CHUNK_POLL_SECONDS)
+
+
+class _ChunkReader(io.RawIOBase):
+    """Reads an upload's file front to back, waiting for chunks that have not arrived"""
+
+    def __init__(self, upload):
+        super().__init__()
+        self.upload = upload
+        self.position = 0
+        self.file = open(upload.data_path, 'rb')
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.position >= self.upload.size:
+            return 0
+        index = self.position // self.upload.chunk_size
+        self.upload.wait_for_chunk(index)
+        _, end = self.upload.chunk_range(index)
+        self.file.seek(self.position)
+        count = self.file.readinto(memoryview(buffer)[:end - self.position])
+        self.position += count
+        return count
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+class _Parse:
+    """Parses a CSV upload on a thread of its own as its chunks arrive"""
+
+    def __init__(self, upload):
+        self.result = None
+        self.error = None
+        self.thread = threading.Thread(target=self._run, args=(upload,), daemon=True)
+        self.thread.start()
+
+    def _run(self, upload):
+        try:
+            with io.BufferedReader(_ChunkReader(upload), BLOCK_SIZE) as reader:
+                self.result = [read_csv_file(upload.name, reader, gzipped=upload_format(upload.name) == '.csv.gz')]
+        except Exception as e:
+            # The commit parses the assembled file instead
+            self.error = e
+            _drop_parse(upload.id, self)
+            return
+        # A result no commit claims in time is not kept in memory
+        timer = threading.Timer(settings.CHUNKED_UPLOAD_PARSE_IDLE_SECONDS, _drop_parse, (upload.id, self))
+        timer.daemon = True
+        timer.start()
+
+
+def _drop_parse(upload_id, parse):
+    with _parses_lock:
+        if _parses.get(upload_id) is parse:
+            del _parses[upload_id]
+
+
+def _load(upload_id):
+    directory = os.path.join(settings.CHUNKED_UPLOAD_ROOT, upload_id)
+    try:
+        with open(os.path.join(directory, 'meta.json')) as f:
+            return ChunkedUpload(upload_id, json.load(f))
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def expire_uploads():
+    """Remove uploads that have not received a chunk for ``CHUNKED_UPLOAD_EXPIRY_SECONDS``"""
+    global _last_sweep
+    _last_sweep = time.monotonic()
+    if not os.path.isdir(settings.CHUNKED_UPLOAD_ROOT):
+        return
+    cutoff = time.time() - settings.CHUNKED_UPLOAD_EXPIRY_SECONDS
+    for upload_id in os.listdir(settings.CHUNKED_UPLOAD_ROOT):
+        try:
+            # Storing a chunk adds a marker file, which touches the directory
+            expired = os.path.getmtime(os.path.join(settings.CHUNKED_UPLOAD_ROOT, upload_id)) < cutoff
+        except FileNotFoundError:
+            continue
+        if expired:
+            remove_upload(upload_id)
+
+
+def start_upload(user, name, size, chunk_size=None, **options):
+    """Create an upload of ``size`` bytes; ``options`` are kept for the commit"""
+    if upload_format(name) is None:
+        raise ValueError('File must be CSV, gzipped CSV, ZIP of CSVs, Parquet or Arrow')
+    try:
+        size = int(size)
+        chunk_size = int(chunk_size or settings.CHUNKED_UPLOAD_CHUNK_SIZE)
+    except (TypeError, ValueError):
+        raise ValueError('size and chunk_size must be integers')
+    if not 0 < size <= settings.CHUNKED_UPLOAD_MAX_BYTES:
+        raise ValueError(f'size must be between 1 and {settings.CHUNKED_UPLOAD_MAX_BYTES} bytes')
+    chunk_size = min(max(chunk_size, MIN_CHUNK_SIZE), MAX_CHUNK_SIZE)
+
+    expire_uploads()
+    upload = ChunkedUpload(uuid.uuid4().hex, {'user': user.id, 'name': name, 'size': size,
+                                              'chunk_size': chunk_size, **options})
+    os.makedirs(upload.directory)
+    with open(upload.data_path, 'wb') as f:
+        f.truncate(size)
+    with open(os.path.join(upload.directory, 'meta.json'), 'w') as f:
+        json.dump(upload.meta, f)
+    if upload_format(name) in STREAMED_FORMATS:
+        with _parses_lock:
+            _parses[upload.id] = _Parse(upload)
+    return upload
+
+
+def sweep_uploads():
+    """Run ``expire_uploads`` unless this process did within SWEEP_INTERVAL_SECONDS"""
+    if time.monotonic() - _last_sweep >= SWEEP_INTERVAL_SECONDS:
+        expire_uploads()
+
+
+def get_upload(user, upload_id):
+    """The user's upload with this id, or None"""
+    if not UPLOAD_ID_PATTERN.match(upload_id):
+        return None
+    upload = _load(upload_id)
+    if upload is None or upload.meta['user'] != user.id:
+        return None
+    return upload
+
+
+def parse_upload(upload):
+    """ParsedUploads of a complete upload.
+
+    Uses the parse that ran while the chunks arrived when this process
+    started one and it succeeded; otherwise parses the assembled file.
+    """
+    with _parses_lock:
+        parse = _parses.pop(upload.id, None)
+    if parse is not None:
+        parse.thread.join()
+        if parse.error is None:
+            return parse.result
+    with open(upload.data_path, 'rb') as f:
+        return read_upload(File(f, name=upload.name))
+
+
+def remove_upload(upload_id):
+    """Delete an upload's files; a parse waiting on its chunks fails"""
+    shutil.rmtree(os.path.join(settings.CHUNKED_UPLOAD_ROOT, upload_id), ignore_errors=True)
+    with _parses_lock:
+        _parses.pop(upload_id, None)
+    with _arrivals:
+        _arrivals.notify_all()
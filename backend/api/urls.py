@@ -1,12 +1,37 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path('login/', views.login_view, name='login'),
     path('register/', views.register_view, name='register'),
     path('upload/', views.upload_csv, name='upload_csv'),
+    path('uploads/', views.start_chunked_upload, name='start_chunked_upload'),
+    path('uploads/<str:upload_id>/', views.chunked_upload, name='chunked_upload'),
+    path('uploads/<str:upload_id>/chunks/<int:index>/', views.upload_chunk, name='upload_chunk'),
+    path('uploads/<str:upload_id>/commit/', views.commit_chunked_upload, name='commit_chunked_upload'),
     path('datasets/', views.get_datasets, name='get_datasets'),
     path('equipment/<int:dataset_id>/', views.get_equipment_data, name='get_equipment_data'),
+    path('search/', views.search_equipment, name='search_equipment'),
+    path('types/', views.get_equipment_types, name='get_equipment_types'),
     path('summary/<int:dataset_id>/', views.get_summary, name='get_summary'),
+    path('bundle/<int:dataset_id>/', views.get_dataset_bundle, name='get_dataset_bundle'),
+    path('anomalies/<int:dataset_id>/', views.get_anomalies, name='get_anomalies'),
+    path('distribution/', views.get_distribution, name='get_distribution_merged'),
+    path('distribution/<int:dataset_id>/', views.get_distribution, name='get_distribution'),
+    path('correlation/', views.get_correlation, name='get_correlation_merged'),
+    path('correlation/<int:dataset_id>/', views.get_correlation, name='get_correlation'),
+    path('readings/<int:dataset_id>/', views.get_readings, name='get_readings'),
+    path('readings/<int:dataset_id>/ingest/', views.upload_readings, name='upload_readings'),
+    path('events/', views.job_events, name='job_events'),
+    path('cache/stats/', views.get_cache_stats, name='get_cache_stats'),
+    path('export/<int:dataset_id>/', views.export_dataset, name='export_dataset'),
+    path('compare/', views.compare_datasets, name='compare_datasets'),
+    path('trends/', views.get_trends, name='get_trends'),
+    path('trends/history/', views.get_equipment_history, name='get_equipment_history'),
     path('report/<int:dataset_id>/', views.generate_pdf_report, name='generate_pdf_report'),
+    # Async variants of the read endpoints, for ASGI servers
+    path('async/health/', async_views.health_check, name='async_health_check'),
+    path('async/datasets/', async_views.get_datasets, name='async_get_datasets'),
+    path('async/equipment/<int:dataset_id>/', async_views.get_equipment_data, name='async_get_equipment_data'),
+    path('async/summary/<int:dataset_id>/', async_views.get_summary, name='async_get_summary'),
 ]
\ No newline at end of file
@@ -0,0 +1,115 @@
+"""Column-batch validation of uploaded rows.
+
+Rows are checked a whole column at a time with NumPy: numeric coercion,
+NaN/inf detection and physical range checks per column and per type.
+Every bad row is reported with its line number and the reasons it failed.
+"""
+from collections import namedtuple
+
+import numpy as np
+from django.conf import settings
+
+from .summaries import PARAMETERS, factorize
+
+VALUE_COLUMNS = ('Flowrate', 'Pressure', 'Temperature')
+# Only the first rows are spelled out; the rest are counted per reason
+MAX_REPORTED_ROWS = 200
+ON_ERROR_MODES = ('reject', 'skip')
+
+ValidationResult = namedtuple('ValidationResult', ['valid', 'values', 'report'])
+
+
+def coerce_numeric(column):
+    """Convert a column of strings to floats; returns ``(values, not_a_number)``"""
+    if isinstance(column, np.ndarray) and column.dtype.kind in 'fiub':
+        return column.astype(float), np.zeros(len(column), dtype=bool)
+    try:
+        values = np.fromiter(map(float, column), dtype=float, count=len(column))
+        return values, np.zeros(len(values), dtype=bool)
+    except (TypeError, ValueError):
+        pass
+    # Only columns holding a bad cell pay for the per-cell fallback
+    values = np.empty(len(column))
+    not_a_number = np.zeros(len(column), dtype=bool)
+    for i, cell in enumerate(column):
+        try:
+            values[i] = float(cell)
+        except (TypeError, ValueError):
+            values[i] = np.nan
+            not_a_number[i] = True
+    return values, not_a_number
+
+
+def is_blank(strings):
+    return np.fromiter(map(len, map(str.strip, strings)), dtype=np.intp, count=len(strings)) == 0
+
+
+def range_bounds(types):
+    """Per-row ``(lower, upper)`` arrays of shape (n, 3) from the configured ranges"""
+    column_ranges = settings.UPLOAD_COLUMN_RANGES
+    type_ranges = settings.UPLOAD_TYPE_RANGES
+    uniques, codes = factorize(types)
+
+    lower = np.empty((len(uniques), len(PARAMETERS)))
+    upper = np.empty_like(lower)
+    for i, eq_type in enumerate(uniques):
+        for j, param in enumerate(PARAMETERS):
+            lower[i, j], upper[i, j] = type_ranges.get(eq_type, {}).get(param, column_ranges[param])
+    return lower[codes], upper[codes]
+
+
+def validate_rows(names, types, columns, lines, short_rows=None):
+    """Validate parsed rows.
+
+    ``columns`` holds the three value columns (strings or numbers) and
+    ``lines`` the source line of each row. ``short_rows`` marks rows that
+    had too few cells. Returns a ValidationResult with the valid-row mask,
+    the float values (n, 3) and a report that is None when every row passed.
+    """
+    n = len(names)
+    values = np.empty((n, len(PARAMETERS)))
+    checks = []
+    if short_rows is None:
+        short_rows = np.zeros(n, dtype=bool)
+    checks.append(('row has too few columns', short_rows))
+    checks.append(('Equipment Name is empty', is_blank(names)))
+    checks.append(('Type is empty', is_blank(types)))
+
+    for j, (column, label) in enumerate(zip(columns, VALUE_COLUMNS)):
+        values[:, j], not_a_number = coerce_numeric(column)
+        # Cells missing from a short row are already covered by its own reason
+        checks.append((f'{label} is not a number', not_a_number & ~short_rows))
+        checks.append((f'{label} is NaN or infinite', ~np.isfinite(values[:, j]) & ~not_a_number))
+
+    lower, upper = range_bounds(types)
+    finite = np.isfinite(values)
+    with np.errstate(invalid='ignore'):
+        out_of_range = finite & ((values < lower) | (values > upper))
+    for j, label in enumerate(VALUE_COLUMNS):
+        checks.append((f'{label} out of range', out_of_range[:, j]))
+
+    invalid = np.zeros(n, dtype=bool)
+    for _, mask in checks:
+        invalid |= mask
+    valid = ~invalid
+    if valid.all():
+        return ValidationResult(valid, values, None)
+
+    bad_rows = np.flatnonzero(invalid)
+    rows = []
+    for i in bad_rows[:MAX_REPORTED_ROWS].tolist():
+        reasons = [reason for reason, mask in checks if mask[i]]
+        for j, label in enumerate(VALUE_COLUMNS):
+            if out_of_range[i, j]:
+                index = reasons.index(f'{label} out of range')
+                reasons[index] += f' [{lower[i, j]:g}, {upper[i, j]:g}]: {values[i, j]:g}'
+        rows.append({'line': int(lines[i]), 'reason': '; '.join(reasons)})
+
+    report = {
+        'invalid_rows': len(bad_rows),
+        'total_rows': n,
+        'reasons': {reason: int(mask.sum()) for reason, mask in checks if mask.any()},
+        'rows': rows,
+        'truncated': len(bad_rows) > MAX_REPORTED_ROWS,
+    }
+    return ValidationResult(valid, values, report)
@@ -1,25 +1,32 @@
-import csv
-import io
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
-import numpy as np
-from django.http import HttpResponse
+import hashlib
+import os
+from functools import partial
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, PageBreak
-from reportlab.lib.units import inch
-from io import BytesIO
-from .models import Dataset, Equipment
+from .models import Dataset, EquipmentTrend, TypeSummary
 from .serializers import DatasetSerializer, EquipmentSerializer
+from .summaries import (PARAMETERS, build_summary, get_type_summaries,
+                        from_model, merge_stats, describe_distribution)
+from .comparison import compare_by_type, compare_by_equipment
+from .correlation import describe_correlation
+from .anomalies import dataset_anomalies
+from . import bundles, search, telemetry, trends, uploads
+from .ingest import BULK_LOCKED, read_upload, store_dataset, upload_format, upsert_rows
+from .validation import ON_ERROR_MODES
+from .cache import MISSING, cache_stats, cached, dataset_key, lookup, store
+from .events import EventStreamRenderer, Job, astream_events, stream_events
+from .export import EXPORT_FORMATS, open_dataset_file, open_export, ranged_content_response, ranged_file_response
+from .renderers import ROW_RENDERERS
 
 import logging
 from datetime import datetime
@@ -93,50 +100,189 @@ def upload_csv(request):
         return Response({'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
     
     file = request.FILES['file']
-    if not file.name.endswith('.csv'):
-        return Response({'error': 'File must be CSV'}, status=status.HTTP_400_BAD_REQUEST)
+    if upload_format(file.name) is None:
+        return Response({'error': 'File must be CSV, gzipped CSV, ZIP of CSVs, Parquet or Arrow'},
+                        status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        # Read CSV file
-        file_content = file.read().decode('utf-8')
-        csv_reader = csv.DictReader(io.StringIO(file_content))
-        
-        required_columns = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
+        mode, on_error = upload_options(request.data)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    job = Job(request.user, 'ingest', request.data.get('job_id'), file=file.name)
+    job.progress('started')
+    response = ingest_upload(request.user, partial(read_upload, file), mode, on_error, job,
+                             request.data.get('dataset_id'))
+    return finish_ingest(job, response)
+
+def finish_ingest(job, response):
+    if response.status_code < 400:
+        job.progress('done', dataset_id=response.data.get('dataset_id'))
+    else:
+        job.progress('failed', error=response.data.get('error'))
+    response['X-Job-Id'] = job.id
+    return response
+
+def upload_options(data):
+    """Validated ``(mode, on_error)`` of an upload request; raises ValueError"""
+    # mode=append upserts rows by equipment name into an existing dataset
+    mode = data.get('mode', 'new')
+    if mode not in ('new', 'append'):
+        raise ValueError("mode must be 'new' or 'append'")
+    # on_error=reject imports nothing if any row is invalid; skip imports the valid rows
+    on_error = data.get('on_error', 'reject')
+    if on_error not in ON_ERROR_MODES:
+        raise ValueError("on_error must be 'reject' or 'skip'")
+    return mode, on_error
+
+def ingest_upload(user, parse, mode, on_error, job, dataset_id=None):
+    """Store the uploads returned by ``parse()``, reporting progress to ``job``"""
+    try:
+        if mode == 'append':
+            try:
+                dataset = Dataset.objects.get(id=dataset_id, uploaded_by=user)
+            except (Dataset.DoesNotExist, ValueError):
+                return Response({'error': 'Dataset not found'}, status=status.HTTP_404_NOT_FOUND)
+            if dataset.bulk_lock:
+                return Response({'error': BULK_LOCKED}, status=status.HTTP_409_CONFLICT)
         
-        # Check if all required columns exist
-        if not all(col in csv_reader.fieldnames for col in required_columns):
-            return Response({'error': f'CSV must contain columns: {required_columns}'}, 
-                          status=status.HTTP_400_BAD_REQUEST)
+        parsed_uploads = parse()
+        job.progress('parsed', rows=sum(len(parsed.names) for parsed in parsed_uploads),
+                     invalid_rows=sum(parsed.errors['invalid_rows'] for parsed in parsed_uploads if parsed.errors))
+        validation = [{'file': parsed.name, **parsed.errors} for parsed in parsed_uploads if parsed.errors]
+        if validation and (on_error == 'reject' or any(not parsed.names for parsed in parsed_uploads)):
+            return Response({'error': 'Upload contains invalid rows; nothing was imported',
+                             'validation': validation}, status=status.HTTP_400_BAD_REQUEST)
+        skipped = {'skipped': sum(report['invalid_rows'] for report in validation),
+                   'validation': validation} if validation else {}
         
-        # Keep only last 5 datasets
-        user_datasets = Dataset.objects.filter(uploaded_by=request.user)
-        if user_datasets.count() >= 5:
-            oldest = user_datasets.last()
-            oldest.delete()
+        if mode == 'append':
+            if len(parsed_uploads) != 1:
+                return Response({'error': 'Append takes a single file'}, status=status.HTTP_400_BAD_REQUEST)
+            parsed = parsed_uploads[0]
+            inserted, updated = upsert_rows(dataset, parsed.names, parsed.types, parsed.values, progress=job.progress)
+            return Response({
+                'message': 'File appended successfully',
+                'dataset_id': dataset.id,
+                'inserted': inserted,
+                'updated': updated,
+                **skipped
+            })
         
-        # Create dataset
-        dataset = Dataset.objects.create(
-            name=file.name,
-            uploaded_by=request.user,
-            file_path=file.name
-        )
+        # A ZIP archive yields one dataset per CSV member, stored all or nothing
+        results = []
+        with transaction.atomic():
+            for parsed in parsed_uploads:
+                # A later member must not purge a dataset an earlier one returned
+                dataset, duplicate = store_dataset(user, parsed, progress=job.progress,
+                                                   keep=[result['dataset_id'] for result in results])
+                results.append({
+                    'name': parsed.name,
+                    'dataset_id': dataset.id,
+                    'fingerprint': parsed.fingerprint,
+                    'duplicate': duplicate
+                })
         
-        # Create equipment records
-        for row in csv_reader:
-            Equipment.objects.create(
-                dataset=dataset,
-                name=row['Equipment Name'],
-                type=row['Type'],
-                flowrate=float(row['Flowrate']),
-                pressure=float(row['Pressure']),
-                temperature=float(row['Temperature'])
-            )
+        if len(results) > 1:
+            return Response({
+                'message': f'{len(results)} files uploaded successfully',
+                'dataset_id': results[-1]['dataset_id'],
+                'datasets': results,
+                **skipped
+            })
         
-        return Response({'message': 'File uploaded successfully', 'dataset_id': dataset.id})
+        result = results[0]
+        if result['duplicate']:
+            # An identical upload returns the existing dataset without touching the DB
+            return Response({'message': 'Identical dataset already uploaded', **result, **skipped})
+        return Response({'message': 'File uploaded successfully', 'dataset_id': result['dataset_id'],
+                         'fingerprint': result['fingerprint'], **skipped})
     
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def start_chunked_upload(request):
+    """Start a chunked upload of file ``name`` holding ``size`` bytes.
+
+    Takes the same ``mode``, ``dataset_id``, ``on_error`` and ``job_id`` as
+    ``/api/upload/``, and an optional ``chunk_size``. Returns the upload id,
+    the chunk size in use and the number of chunks.
+    """
+    job = Job(request.user, 'ingest', request.data.get('job_id'), file=request.data.get('name', ''))
+    try:
+        mode, on_error = upload_options(request.data)
+        upload = uploads.start_upload(request.user, request.data.get('name', ''), request.data.get('size'),
+                                      request.data.get('chunk_size'), mode=mode, on_error=on_error,
+                                      dataset_id=request.data.get('dataset_id'), job_id=job.id)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    job.progress('started', chunks=upload.chunk_count)
+    response = Response(upload.status(), status=status.HTTP_201_CREATED)
+    response['X-Job-Id'] = job.id
+    return response
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def chunked_upload(request, upload_id):
+    """The chunks received so far (to resume an upload), or DELETE to abort it"""
+    upload = uploads.get_upload(request.user, upload_id)
+    if upload is None:
+        return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+    if request.method == 'DELETE':
+        uploads.remove_upload(upload.id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response(upload.status())
+
+@api_view(['PUT'])
+@permission_classes([IsAuthenticated])
+def upload_chunk(request, upload_id, index):
+    """Store chunk ``index`` from the raw body; ``X-Chunk-SHA256`` holds its SHA-256 in hex"""
+    upload = uploads.get_upload(request.user, upload_id)
+    if upload is None:
+        return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+    checksum = request.META.get('HTTP_X_CHUNK_SHA256')
+    if not checksum:
+        return Response({'error': 'X-Chunk-SHA256 header is required'}, status=status.HTTP_400_BAD_REQUEST)
+    uploads.sweep_uploads()
+    try:
+        # The body is streamed to disk, so chunks are not bound by DATA_UPLOAD_MAX_MEMORY_SIZE
+        upload.write_chunk(index, request.stream, int(request.META.get('CONTENT_LENGTH') or 0), checksum)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    received = len(upload.received())
+    Job(request.user, 'ingest', upload.meta['job_id'], file=upload.name).progress(
+        'received', chunks=received, total_chunks=upload.chunk_count)
+    return Response({'index': index, 'received': received, 'chunks': upload.chunk_count})
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def commit_chunked_upload(request, upload_id):
+    """Store a complete chunked upload; responds as ``/api/upload/`` does"""
+    upload = uploads.get_upload(request.user, upload_id)
+    if upload is None:
+        return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+    missing = upload.missing()
+    if missing:
+        return Response({'error': f'{len(missing)} of {upload.chunk_count} chunks are missing',
+                         'missing': missing}, status=status.HTTP_409_CONFLICT)
+    if not upload.claim_commit():
+        return Response({'error': 'Upload is already being committed'}, status=status.HTTP_409_CONFLICT)
+    
+    job = Job(request.user, 'ingest', upload.meta['job_id'], file=upload.name)
+    response = None
+    try:
+        response = ingest_upload(request.user, partial(uploads.parse_upload, upload), upload.meta['mode'],
+                                 upload.meta['on_error'], job, upload.meta['dataset_id'])
+    finally:
+        # A failed commit can be retried until the client aborts the upload or it expires
+        if response is not None and response.status_code < 400:
+            uploads.remove_upload(upload.id)
+        else:
+            upload.release_commit()
+    return finish_ingest(job, response)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_datasets(request):
@@ -149,348 +295,514 @@ def get_datasets(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes(ROW_RENDERERS)
 def get_equipment_data(request, dataset_id):
+    """All rows of a dataset, or one page of them with ``?page=`` (and ``?page_size=``).
+
+    ``?type=`` keeps one equipment type. Pages are in id order.
+    """
     try:
         dataset = Dataset.objects.get(id=dataset_id, uploaded_by=request.user)
         equipment = dataset.equipment.all()
-        serializer = EquipmentSerializer(equipment, many=True)
-        return Response(serializer.data)
+        if request.query_params.get('type'):
+            equipment = equipment.filter(type=request.query_params['type'])
+        if 'page' not in request.query_params:
+            serializer = EquipmentSerializer(equipment, many=True)
+            return Response(serializer.data)
+        try:
+            page, page_size = parse_page(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(bundles.equipment_page(equipment, page, page_size))
     except Dataset.DoesNotExist:
         return Response({'error': 'Dataset not found'}, status=status.HTTP_404_NOT_FOUND)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_dataset_bundle(request, dataset_id):
+    """Summary, type stats, an equipment page and chart series of a dataset in one response.
+
+    ``?include=summary,types,equipment,series`` picks sections (default all).
+    The page is chosen with ``?page=`` and ``?page_size=``, and ``?points=``
+    caps the rows in the series. See api/bundles.py.
+    """
+    try:
+        dataset = Dataset.objects.get(id=dataset_id, uploaded_by=request.user)
+    except Dataset.DoesNotExist:
+        return Response({'error': 'Dataset not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    try:
+        include = bundles.parse_include(request.query_params.get('include'))
+        page, page_size = parse_page(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        points = int(request.query_params.get('points', bundles.DEFAULT_SERIES_POINTS))
+    except ValueError:
+        return Response({'error': 'points must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    if not bundles.MIN_SERIES_POINTS <= points <= bundles.MAX_SERIES_POINTS:
+        return Response({'error': f'points must be between {bundles.MIN_SERIES_POINTS} and {bundles.MAX_SERIES_POINTS}'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    
+    bundle = bundles.DatasetBundle(dataset, page=page, page_size=page_size, points=points)
+    return Response(bundle.build(include))
+
+def parse_page(request):
+    """``(page, page_size)`` from the query string; raises ValueError on bad input"""
+    try:
+        page = int(request.query_params.get('page', 1))
+        page_size = int(request.query_params.get('page_size', search.DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('page and page_size must be integers')
+    if page < 1 or not 1 <= page_size <= search.MAX_PAGE_SIZE:
+        raise ValueError(f'page must be at least 1 and page_size between 1 and {search.MAX_PAGE_SIZE}')
+    return page, page_size
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes(ROW_RENDERERS)
+def search_equipment(request):
+    """Search equipment names and types across the user's datasets.
+
+    ``?q=`` matches words by prefix, and near misses unless ``?fuzzy=false``.
+    ``?type=`` keeps one type and ``?ids=3,5`` limits the datasets. Results are
+    ranked by how they matched (see api/search.py) and paged with ``?page=``
+    and ``?page_size=``.
+    """
+    query = request.query_params.get('q', '')
+    if len(''.join(search.tokenize(query))) < search.MIN_QUERY_LENGTH:
+        return Response({'error': f'q must hold at least {search.MIN_QUERY_LENGTH} letters or digits'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        page, page_size = parse_page(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    datasets = Dataset.objects.filter(uploaded_by=request.user)
+    if request.query_params.get('ids'):
+        try:
+            datasets = datasets.filter(id__in=parse_id_list(request.query_params['ids']))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    dataset_names = dict(datasets.values_list('id', 'name'))
+    
+    results, has_more = search.search_equipment(
+        query, list(dataset_names), eq_type=request.query_params.get('type') or None,
+        page=page, page_size=page_size, fuzzy=request.query_params.get('fuzzy', 'true').lower() != 'false',
+    )
+    for result in results:
+        result['dataset_name'] = dataset_names[result['dataset_id']]
+    return Response({'query': query, 'results': results, 'page': page, 'page_size': page_size,
+                     'has_more': has_more})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_equipment_types(request):
+    """Distinct equipment types with row counts, for type filters.
+
+    Read from the stored per-type summaries, whose (dataset, type) index
+    answers this without touching equipment rows. ``?ids=3,5`` limits the
+    datasets.
+    """
+    summaries = TypeSummary.objects.filter(dataset__uploaded_by=request.user)
+    if request.query_params.get('ids'):
+        try:
+            summaries = summaries.filter(dataset_id__in=parse_id_list(request.query_params['ids']))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    types = summaries.values('type').annotate(count=Sum('count')).order_by('type')
+    return Response(list(types))
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_summary(request, dataset_id):
     try:
         dataset = Dataset.objects.get(id=dataset_id, uploaded_by=request.user)
-        equipment = dataset.equipment.all()
-        
-        if not equipment:
+        # Summary statistics come from the per-type summaries stored at ingest
+        summary = cached('summary', dataset.id, (dataset.version,), partial(build_summary, dataset))
+        if summary is None:
             return Response({'error': 'No equipment data found'})
-        
-        # Calculate summary statistics
-        flowrates = [e.flowrate for e in equipment]
-        pressures = [e.pressure for e in equipment]
-        temperatures = [e.temperature for e in equipment]
-        
-        type_counts = {}
-        for e in equipment:
-            type_counts[e.type] = type_counts.get(e.type, 0) + 1
-        
-        summary = {
-            'total_count': len(equipment),
-            'avg_flowrate': sum(flowrates) / len(flowrates),
-            'avg_pressure': sum(pressures) / len(pressures),
-            'avg_temperature': sum(temperatures) / len(temperatures),
-            'type_distribution': type_counts
-        }
-        
         return Response(summary)
     except Dataset.DoesNotExist:
         return Response({'error': 'Dataset not found'}, status=status.HTTP_404_NOT_FOUND)
 
-def create_chart(data, chart_type, title, xlabel, ylabel, filename):
-    """Create various types of charts and return as BytesIO object"""
-    plt.figure(figsize=(12, 8))  # Increased figure size
-    plt.style.use('default')
-    
-    if chart_type == 'bar':
-        bars = plt.bar(data['x'], data['y'], color=['#60a5fa', '#34d399', '#fbbf24', '#f87171', '#a78bfa', '#06b6d4', '#8b5cf6', '#f59e0b', '#ef4444', '#10b981'])
-        # Rotate x-axis labels for better readability
-        plt.xticks(rotation=45, ha='right')
-        # Add value labels on top of bars
-        for bar in bars:
-            height = bar.get_height()
-            plt.text(bar.get_x() + bar.get_width()/2., height + max(data['y'])*0.01,
-                    f'{height:.1f}', ha='center', va='bottom', fontsize=10, fontweight='bold')
-    elif chart_type == 'line':
-        plt.plot(data['x'], data['y'], marker='o', linewidth=3, markersize=8, color='#60a5fa')
-        plt.xticks(rotation=45, ha='right')
-    elif chart_type == 'scatter':
-        plt.scatter(data['x'], data['y'], alpha=0.7, s=80, color='#60a5fa', edgecolors='white', linewidth=1)
-    elif chart_type == 'pie':
-        colors = ['#60a5fa', '#34d399', '#fbbf24', '#f87171', '#a78bfa', '#06b6d4', '#8b5cf6', '#f59e0b']
-        # Create pie chart with better label positioning
-        wedges, texts, autotexts = plt.pie(data['y'], labels=data['x'], autopct='%1.1f%%', 
-                                          startangle=90, colors=colors[:len(data['x'])],
-                                          pctdistance=0.85, labeldistance=1.1,
-                                          textprops={'fontsize': 11, 'fontweight': 'bold'})
-        
-        # Improve label positioning to avoid overlap
-        for autotext in autotexts:
-            autotext.set_color('white')
-            autotext.set_fontweight('bold')
-            autotext.set_fontsize(10)
-        
-        # Add legend instead of labels for better readability
-        plt.legend(wedges, [f'{label} ({count})' for label, count in zip(data['x'], data['y'])],
-                  title="Equipment Types", loc="center left", bbox_to_anchor=(1, 0, 0.5, 1),
-                  fontsize=10)
-        
-        # Remove labels from pie chart to reduce congestion
-        for text in texts:
-            text.set_text('')
+def parse_id_list(value):
+    """Parse a comma-separated list of ids; raises ValueError on bad input or a repeated id"""
+    try:
+        dataset_ids = [int(i) for i in value.split(',') if i.strip()]
+    except ValueError:
+        raise ValueError('ids must be a comma-separated list of dataset ids')
+    # A repeated id would count its dataset twice in merged statistics
+    if len(set(dataset_ids)) != len(dataset_ids):
+        raise ValueError('ids must not repeat a dataset id')
+    return dataset_ids
+
+def get_user_datasets(user, dataset_ids):
+    """Return the user's datasets in ``dataset_ids`` order, each once, or None if any is missing"""
+    dataset_ids = list(dict.fromkeys(dataset_ids))
+    found = Dataset.objects.in_bulk(dataset_ids)
+    datasets = [found.get(i) for i in dataset_ids]
+    if any(d is None or d.uploaded_by_id != user.id for d in datasets):
+        return None
+    return datasets
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def compare_datasets(request):
+    """Compare datasets given as ``?ids=3,5,8``; deltas are against the first id"""
+    try:
+        dataset_ids = parse_id_list(request.query_params.get('ids', ''))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if len(dataset_ids) < 2:
+        return Response({'error': 'At least two distinct dataset ids are required'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    datasets = get_user_datasets(request.user, dataset_ids)
+    if datasets is None:
+        return Response({'error': 'Dataset not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response({
+        'datasets': [{'id': d.id, 'name': d.name, 'uploaded_at': d.uploaded_at} for d in datasets],
+        'parameters': list(PARAMETERS),
+        'by_type': compare_by_type(datasets),
+        'by_equipment': compare_by_equipment(datasets),
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_trends(request):
+    """Stored equipment trends, ranked.
+
+    ``?parameter=`` (default temperature) and ``?order=`` (a trend metric,
+    ``-`` first for descending; default ``-rate``) pick the ranking, ``?type=``
+    limits it to one equipment type and ``?limit=`` (default 50) caps it.
+    """
+    parameter = request.query_params.get('parameter', 'temperature')
+    order = request.query_params.get('order', '-rate')
+    if parameter not in PARAMETERS or order.lstrip('-') not in trends.TREND_METRICS:
+        return Response({'error': f"parameter must be one of {', '.join(PARAMETERS)} and order one of "
+                                  f"{', '.join(trends.TREND_METRICS)}, optionally prefixed with '-'"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = int(request.query_params.get('limit', 50))
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= limit <= 1000:
+        return Response({'error': 'limit must be 1-1000'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    field = F(f"{parameter}_{order.lstrip('-')}")
+    rows = EquipmentTrend.objects.filter(user=request.user)
+    if request.query_params.get('type'):
+        rows = rows.filter(type=request.query_params['type'])
+    rows = rows.order_by(field.desc(nulls_last=True) if order.startswith('-') else field.asc(nulls_last=True), 'name')
+    return Response({
+        'parameter': parameter,
+        'order': order,
+        'results': [trends.trend_payload(trend) for trend in rows[:limit]],
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_equipment_history(request):
+    """One unit's stored trend and its mean readings in each dataset, by ``?name=``"""
+    name = request.query_params.get('name', '')
+    if not name:
+        return Response({'error': 'name is required'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    history = trends.unit_history(request.user, name)
+    if not history:
+        return Response({'error': 'Equipment not found'}, status=status.HTTP_404_NOT_FOUND)
+    trend = EquipmentTrend.objects.filter(user=request.user, name=name).first()
+    return Response({
+        'name': name,
+        'trend': trends.trend_payload(trend) if trend else None,
+        'history': history,
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_anomalies(request, dataset_id):
+    """Flag outlying readings; ``?limit=`` caps the number of rows returned"""
+    try:
+        dataset = Dataset.objects.get(id=dataset_id, uploaded_by=request.user)
+    except Dataset.DoesNotExist:
+        return Response({'error': 'Dataset not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    try:
+        limit = max(0, int(request.query_params.get('limit', 500)))
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    report = dataset_anomalies(dataset)
+    return Response({**report, 'anomalies': report['anomalies'][:limit]})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_distribution(request, dataset_id=None):
+    """Percentiles and histograms from the stored sketches.
+
+    Covers one dataset, or several merged with ``?ids=3,5``; ``?type=`` limits
+    it to one equipment type, ``?bins=`` and ``?percentiles=50,90,99`` shape
+    the output.
+    """
+    try:
+        dataset_ids = [dataset_id] if dataset_id is not None else parse_id_list(request.query_params.get('ids', ''))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        bins = int(request.query_params.get('bins', 20))
+        percentiles = [float(p) for p in request.query_params.get('percentiles', '50,90,99').split(',')]
+    except ValueError:
+        return Response({'error': 'bins and percentiles must be numeric'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if not dataset_ids:
+        return Response({'error': 'At least one dataset id is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= bins <= 500 or not all(0 <= p <= 100 for p in percentiles):
+        return Response({'error': 'bins must be 1-500 and percentiles 0-100'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    datasets = get_user_datasets(request.user, dataset_ids)
+    if datasets is None:
+        return Response({'error': 'Dataset not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    eq_type = request.query_params.get('type')
+    merged = None
+    for dataset in datasets:
+        for summary in get_type_summaries(dataset):
+            if eq_type is None or summary.type == eq_type:
+                merged = merge_stats(merged, from_model(summary))
+    
+    if merged is None:
+        return Response({'error': 'No equipment data found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response({
+        'datasets': dataset_ids,
+        'type': eq_type,
+        'count': merged['count'],
+        'parameters': describe_distribution(merged, percentiles, bins),
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_correlation(request, dataset_id=None):
+    """Correlation matrices and linear fits from the stored co-moments and joint sketches.
+
+    Covers one dataset, or several merged with ``?ids=3,5``; ``overall`` merges
+    every type, ``types`` holds the same per equipment type.
+    """
+    try:
+        dataset_ids = [dataset_id] if dataset_id is not None else parse_id_list(request.query_params.get('ids', ''))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if not dataset_ids:
+        return Response({'error': 'At least one dataset id is required'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    datasets = get_user_datasets(request.user, dataset_ids)
+    if datasets is None:
+        return Response({'error': 'Dataset not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    per_type = {}
+    for dataset in datasets:
+        for summary in get_type_summaries(dataset, joint=True):
+            per_type[summary.type] = merge_stats(per_type.get(summary.type), from_model(summary, joint=True))
+    
+    if not per_type:
+        return Response({'error': 'No equipment data found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    overall = None
+    for stats in per_type.values():
+        overall = merge_stats(overall, stats)
+    return Response({
+        'datasets': dataset_ids,
+        'parameters': PARAMETERS,
+        'overall': describe_correlation(overall),
+        'types': {eq_type: describe_correlation(stats) for eq_type, stats in sorted(per_type.items())},
+    })
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def upload_readings(request, dataset_id):
+    """Batch-ingest timestamped readings as NDJSON or CSV.
+
+    Send the records as the request body (``application/x-ndjson`` or
+    ``text/csv``) or as a multipart ``file`` (.ndjson/.jsonl/.csv). Each record
+    needs ``equipment``, ``timestamp`` (ISO 8601 or epoch seconds),
+    ``flowrate``, ``pressure`` and ``temperature``.
+    """
+    try:
+        dataset = Dataset.objects.get(id=dataset_id, uploaded_by=request.user)
+    except Dataset.DoesNotExist:
+        return Response({'error': 'Dataset not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    content_type = request.content_type or ''
+    if content_type.startswith('multipart/'):
+        if 'file' not in request.FILES:
+            return Response({'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
+        lines = request.FILES['file']
+        is_ndjson = lines.name.endswith(('.ndjson', '.jsonl'))
+    else:
+        # Iterate the raw request stream line by line instead of buffering request.body
+        lines = request.stream or []
+        is_ndjson = 'ndjson' in content_type or 'jsonl' in content_type
+        if not is_ndjson and 'csv' not in content_type:
+            return Response({'error': 'Send application/x-ndjson or text/csv'}, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+    
+    try:
+        names, timestamps, values, errors = telemetry.parse_ndjson(lines) if is_ndjson else telemetry.parse_csv(lines)
+    except (UnicodeDecodeError, ValueError) as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    result = telemetry.ingest_readings(dataset, names, timestamps, values)
+    result['invalid'] = len(errors)
+    result['errors'] = errors[:100]
+    return Response(result)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_readings(request, dataset_id):
+    """Time series for ``?start=&end=`` (ISO 8601 or epoch seconds, default last 7 days).
+
+    ``?resolution=`` is ``auto`` (default), ``1m``, ``1h``, ``1d`` or ``raw``;
+    ``?equipment=`` limits the series to one unit. Timestamps are epoch ms.
+    """
+    try:
+        dataset = Dataset.objects.get(id=dataset_id, uploaded_by=request.user)
+    except Dataset.DoesNotExist:
+        return Response({'error': 'Dataset not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    resolution = request.query_params.get('resolution', 'auto')
+    if resolution not in ('auto', 'raw', *telemetry.ROLLUP_RESOLUTIONS):
+        return Response({'error': 'Invalid resolution'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        end = telemetry.parse_timestamp(request.query_params.get('end', datetime.now().timestamp()))
+        start = telemetry.parse_timestamp(request.query_params.get('start', end / 1000 - 7 * 86400))
+    except ValueError:
+        return Response({'error': 'start and end must be ISO 8601 or epoch seconds'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    equipment_name = request.query_params.get('equipment')
+    series = cached('series', dataset.id, (dataset.version, start, end, resolution, equipment_name),
+                    partial(telemetry.query_series, dataset, start, end, resolution, equipment_name))
+    return Response({'dataset_id': dataset.id, 'equipment': equipment_name, 'start': start, 'end': end, **series})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_dataset(request, dataset_id):
+    """Download a dataset as ``?output=csv.gz`` (default), ``parquet`` or ``arrow``.
+
+    Supports ``Range`` requests so interrupted downloads can resume.
+    """
+    try:
+        dataset = Dataset.objects.get(id=dataset_id, uploaded_by=request.user)
+    except Dataset.DoesNotExist:
+        return Response({'error': 'Dataset not found'}, status=status.HTTP_404_NOT_FOUND)
     
-    plt.title(title, fontsize=16, fontweight='bold', pad=20)
-    if chart_type != 'pie':
-        plt.xlabel(xlabel, fontsize=14, fontweight='600')
-        plt.ylabel(ylabel, fontsize=14, fontweight='600')
+    output = request.query_params.get('output', 'csv.gz')
+    if output not in EXPORT_FORMATS:
+        return Response({'error': f'output must be one of {", ".join(EXPORT_FORMATS)}'}, status=status.HTTP_400_BAD_REQUEST)
     
-    plt.grid(True, alpha=0.3, linestyle='--')
-    plt.tight_layout(pad=2.0)  # Increased padding
+    try:
+        export = open_export(dataset, output)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Save to BytesIO
-    img_buffer = BytesIO()
-    plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight', facecolor='white')
-    img_buffer.seek(0)
-    plt.close()
+    base_name = dataset.name.rsplit('.', 1)[0]
+    etag = f'"{dataset.id}-{dataset.version}-{output}"'
+    return ranged_file_response(request, export, EXPORT_FORMATS[output], f'{base_name}.{output}', etag)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+def job_events(request):
+    """Server-Sent Events stream of the user's ingest, purge and report progress.
+
+    ``?job_id=`` limits the stream to one job. Reconnecting clients send
+    ``Last-Event-ID`` (or ``?last_event_id=``) to receive the events they missed.
+    """
+    last_event_id = request.META.get('HTTP_LAST_EVENT_ID') or request.query_params.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return Response({'error': 'Last-Event-ID must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    job_id = request.query_params.get('job_id')
     
-    return img_buffer
+    # ASGI servers get an async stream; WSGI servers hold a thread per stream
+    if isinstance(request._request, ASGIRequest):
+        stream = astream_events(request.user.id, last_event_id, job_id)
+    else:
+        stream = stream_events(request.user.id, last_event_id, job_id)
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_cache_stats(request):
+    """Cache hit/miss/eviction counters of this server process, for tuning"""
+    return Response(cache_stats())
+
+def report_response(request, pdf, dataset):
+    """Serve a rendered report; clients resume an interrupted download with ``Range``"""
+    # Each render embeds its creation time, so the ETag comes from the bytes
+    etag = f'"{hashlib.md5(pdf).hexdigest()}"'
+    return ranged_content_response(request, pdf, 'application/pdf', f'report_{dataset.name}.pdf', etag)
+
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def generate_pdf_report(request, dataset_id):
     try:
         dataset = Dataset.objects.get(id=dataset_id, uploaded_by=request.user)
-        equipment = dataset.equipment.all()
-        
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="report_{dataset.name}.pdf"'
+        job = Job(request.user, 'report', request.query_params.get('job_id'), dataset_id=dataset.id)
+        job.progress('started')
+        # ?detail=full renders every row instead of the first 15
+        full_detail = request.query_params.get('detail') == 'full'
+        # ?charts=vector draws charts as native PDF vector graphics instead of PNGs
+        vector_charts = request.query_params.get('charts') == 'vector'
         
-        # Create PDF document with better margins
-        doc = SimpleDocTemplate(response, pagesize=A4, rightMargin=50, leftMargin=50, topMargin=50, bottomMargin=50)
-        story = []
-        styles = getSampleStyleSheet()
+        # The report stack (matplotlib, ReportLab) is only imported by workers that render one
+        from .reports import build_report
         
-        # Custom styles
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=20,
-            spaceAfter=20,
-            textColor=colors.HexColor('#1e293b'),
-            alignment=1  # Center alignment
-        )
-        
-        heading_style = ParagraphStyle(
-            'CustomHeading',
-            parent=styles['Heading2'],
-            fontSize=16,
-            spaceAfter=15,
-            spaceBefore=20,
-            textColor=colors.HexColor('#374151'),
-            borderWidth=1,
-            borderColor=colors.HexColor('#e5e7eb'),
-            borderPadding=10,
-            backColor=colors.HexColor('#f8fafc')
-        )
-        
-        # Title
-        story.append(Paragraph(f"Equipment Analysis Report: {dataset.name}", title_style))
-        story.append(Spacer(1, 12))
-        
-        if equipment:
-            # Calculate statistics
-            flowrates = [e.flowrate for e in equipment]
-            pressures = [e.pressure for e in equipment]
-            temperatures = [e.temperature for e in equipment]
-            
-            avg_flow = sum(flowrates) / len(flowrates)
-            avg_pressure = sum(pressures) / len(pressures)
-            avg_temp = sum(temperatures) / len(temperatures)
-            
-            # Equipment type distribution
-            type_counts = {}
-            for e in equipment:
-                type_counts[e.type] = type_counts.get(e.type, 0) + 1
-            
-            # Executive Summary
-            story.append(Paragraph("Executive Summary", heading_style))
-            summary_data = [
-                ['Metric', 'Value'],
-                ['Total Equipment', str(equipment.count())],
-                ['Average Flowrate', f"{avg_flow:.2f} L/min"],
-                ['Average Pressure', f"{avg_pressure:.2f} bar"],
-                ['Average Temperature', f"{avg_temp:.2f} °C"],
-                ['Equipment Types', str(len(type_counts))]
-            ]
-            
-            summary_table = Table(summary_data, colWidths=[2*inch, 2*inch])
-            summary_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f1f5f9')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#1e293b')),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0'))
-            ]))
-            story.append(summary_table)
-            story.append(Spacer(1, 20))
+        if full_detail:
+            # Full-detail reports are files under EXPORT_ROOT, kept per dataset version like exports
+            suffix = f"report-full{'-vector' if vector_charts else ''}.pdf"
+            rendered = []
             
-            # Equipment Type Distribution Chart
-            story.append(Paragraph("Equipment Type Distribution", heading_style))
-            type_chart_data = {
-                'x': list(type_counts.keys()),
-                'y': list(type_counts.values())
-            }
-            type_chart = create_chart(type_chart_data, 'pie', 'Equipment Distribution by Type', '', '', 'type_dist')
-            story.append(Image(type_chart, width=7*inch, height=5*inch))
-            story.append(PageBreak())  # Start new page for parameter analysis
+            def render(out):
+                build_report(out, dataset, job, full_detail, vector_charts)
+                rendered.append(True)
             
-            # Parameter Analysis Charts
-            story.append(Paragraph("Parameter Analysis", heading_style))
-            
-            # Flowrate by Equipment Type
-            # Create shorter, more readable equipment names
-            equipment_list = list(equipment[:8])  # Reduced to 8 items for better readability
-            equipment_names = []
-            for e in equipment_list:
-                name = e.name
-                # If name is too long, use equipment type + index
-                if len(name) > 12:
-                    type_count = sum(1 for eq in equipment_list[:equipment_list.index(e)+1] if eq.type == e.type)
-                    equipment_names.append(f"{e.type}-{type_count}")
-                else:
-                    equipment_names.append(name)
-            
-            flowrate_chart_data = {
-                'x': equipment_names,
-                'y': [e.flowrate for e in equipment_list]
-            }
-            flowrate_chart = create_chart(flowrate_chart_data, 'bar', 'Flowrate by Equipment (Top 8)', 'Equipment', 'Flowrate (L/min)', 'flowrate')
-            story.append(Image(flowrate_chart, width=7*inch, height=5*inch))
-            story.append(Spacer(1, 25))
-            
-            # Pressure vs Temperature Scatter Plot
-            scatter_data = {
-                'x': pressures,
-                'y': temperatures
-            }
-            scatter_chart = create_chart(scatter_data, 'scatter', 'Pressure vs Temperature Correlation', 'Pressure (bar)', 'Temperature (°C)', 'scatter')
-            story.append(Image(scatter_chart, width=7*inch, height=5*inch))
-            story.append(Spacer(1, 25))
-            
-            # Add Parameter Comparison Chart
-            story.append(Paragraph("Parameter Comparison by Equipment Type", heading_style))
-            
-            # Group data by equipment type for comparison
-            type_avg_data = {}
-            for eq_type in type_counts.keys():
-                type_equipment = [e for e in equipment if e.type == eq_type]
-                if type_equipment:
-                    type_avg_data[eq_type] = {
-                        'flowrate': sum(e.flowrate for e in type_equipment) / len(type_equipment),
-                        'pressure': sum(e.pressure for e in type_equipment) / len(type_equipment),
-                        'temperature': sum(e.temperature for e in type_equipment) / len(type_equipment)
-                    }
-            
-            # Create comparison bar chart for average flowrates by type
-            if type_avg_data:
-                comparison_data = {
-                    'x': list(type_avg_data.keys()),
-                    'y': [data['flowrate'] for data in type_avg_data.values()]
-                }
-                comparison_chart = create_chart(comparison_data, 'bar', 'Average Flowrate by Equipment Type', 'Equipment Type', 'Average Flowrate (L/min)', 'comparison')
-                story.append(Image(comparison_chart, width=7*inch, height=4*inch))
-                story.append(PageBreak())  # Start new page for detailed data
-            
-            # Detailed Equipment Data Table
-            story.append(Paragraph("Detailed Equipment Data", heading_style))
-            table_data = [['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']]
-            
-            for e in equipment[:15]:  # Show first 15 items
-                table_data.append([
-                    e.name[:20] + '...' if len(e.name) > 20 else e.name,
-                    e.type,
-                    f"{e.flowrate:.1f}",
-                    f"{e.pressure:.1f}",
-                    f"{e.temperature:.1f}"
-                ])
-            
-            if equipment.count() > 15:
-                table_data.append(['...', '...', '...', '...', '...'])
-                table_data.append([f"Total: {equipment.count()} items", '', '', '', ''])
-            
-            equipment_table = Table(table_data, colWidths=[1.5*inch, 1*inch, 1*inch, 1*inch, 1*inch])
-            equipment_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f1f5f9')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#1e293b')),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
-                ('FONTSIZE', (0, 1), (-1, -1), 9)
-            ]))
-            story.append(equipment_table)
-            story.append(Spacer(1, 20))
-            
-            # Statistical Analysis
-            story.append(Paragraph("Statistical Analysis", heading_style))
-            
-            # Calculate additional statistics
-            flow_std = np.std(flowrates)
-            pressure_std = np.std(pressures)
-            temp_std = np.std(temperatures)
-            
-            stats_data = [
-                ['Parameter', 'Mean', 'Std Dev', 'Min', 'Max'],
-                ['Flowrate (L/min)', f"{avg_flow:.2f}", f"{flow_std:.2f}", f"{min(flowrates):.2f}", f"{max(flowrates):.2f}"],
-                ['Pressure (bar)', f"{avg_pressure:.2f}", f"{pressure_std:.2f}", f"{min(pressures):.2f}", f"{max(pressures):.2f}"],
-                ['Temperature (°C)', f"{avg_temp:.2f}", f"{temp_std:.2f}", f"{min(temperatures):.2f}", f"{max(temperatures):.2f}"]
-            ]
-            
-            stats_table = Table(stats_data, colWidths=[1.5*inch, 1*inch, 1*inch, 1*inch, 1*inch])
-            stats_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f1f5f9')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#1e293b')),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
-                ('FONTSIZE', (0, 1), (-1, -1), 9)
-            ]))
-            story.append(stats_table)
-            story.append(Spacer(1, 20))
-            
-            # Recommendations
-            story.append(Paragraph("Recommendations & Insights", heading_style))
-            recommendations = []
-            
-            # High temperature equipment
-            high_temp_equipment = [e for e in equipment if e.temperature > avg_temp + temp_std]
-            if high_temp_equipment:
-                recommendations.append(f"• {len(high_temp_equipment)} equipment items are operating at high temperatures (>{avg_temp + temp_std:.1f}°C). Consider reviewing cooling systems.")
-            
-            # High pressure equipment
-            high_pressure_equipment = [e for e in equipment if e.pressure > avg_pressure + pressure_std]
-            if high_pressure_equipment:
-                recommendations.append(f"• {len(high_pressure_equipment)} equipment items are operating at high pressures (>{avg_pressure + pressure_std:.1f} bar). Monitor for safety compliance.")
-            
-            # Equipment type recommendations
-            most_common_type = max(type_counts, key=type_counts.get)
-            recommendations.append(f"• {most_common_type} equipment represents {type_counts[most_common_type]/len(equipment)*100:.1f}% of your fleet. Consider standardization benefits.")
-            
-            recommendations.append("• Regular maintenance scheduling recommended based on operating parameters.")
-            recommendations.append("• Consider implementing real-time monitoring for critical equipment.")
-            
-            for rec in recommendations:
-                story.append(Paragraph(rec, styles['Normal']))
-                story.append(Spacer(1, 6))
-            
-        else:
-            story.append(Paragraph("No equipment data available for this dataset.", styles['Normal']))
+            report = open_dataset_file(dataset, suffix, render)
+            if not rendered:
+                job.progress('done', cached=True)
+            # Each render embeds its creation time, so the ETag also names the file's
+            etag = f'"{dataset.id}-{dataset.version}-{suffix}-{os.fstat(report.fileno()).st_mtime_ns}"'
+            response = ranged_file_response(request, report, 'application/pdf', f'report_{dataset.name}.pdf', etag)
+            response['X-Job-Id'] = job.id
+            return response
+        
+        # Rendered reports are cached until the dataset changes
+        report_key = dataset_key('report', dataset.id, dataset.version, vector_charts)
+        pdf = lookup('report', report_key)
+        if pdf is not MISSING:
+            job.progress('done', cached=True)
+            response = report_response(request, pdf, dataset)
+            response['X-Job-Id'] = job.id
+            return response
+        
+        response = HttpResponse(content_type='application/pdf')
+        build_report(response, dataset, job, full_detail, vector_charts)
+        if len(response.content) <= settings.REPORT_CACHE_MAX_BYTES:
+            store('report', report_key, response.content)
         
-        # Build PDF
-        doc.build(story)
+        response = report_response(request, response.content, dataset)
+        response['X-Job-Id'] = job.id
         return response
         
     except Dataset.DoesNotExist:
         return Response({'error': 'Dataset not found'}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
+        job.progress('failed', error=str(e))
         return Response({'error': f'Error generating report: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
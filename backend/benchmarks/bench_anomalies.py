@@ -0,0 +1,31 @@
+"""Anomaly detection benchmark.
+
+Times ``detect_anomalies`` on synthetic in-memory readings, i.e. the NumPy
+part of ``/api/anomalies/<id>/`` without the database fetch.
+"""
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.common import EQUIPMENT_TYPES
+
+from api.anomalies import detect_anomalies
+
+
+def run(row_counts):
+    rng = np.random.default_rng(0)
+    print(f"{'rows':>10} {'seconds':>9} {'flagged':>9}")
+    for rows in row_counts:
+        types = np.array(EQUIPMENT_TYPES, dtype=object)[rng.integers(0, len(EQUIPMENT_TYPES), rows)]
+        values = rng.normal([150, 8, 120], [40, 3, 30], size=(rows, 3))
+        start = time.perf_counter()
+        result = detect_anomalies(types, values)
+        seconds = time.perf_counter() - start
+        flagged = (result['robust_z'].any(axis=1) | result['iqr'].any(axis=1)
+                   | result['type_baseline'].any(axis=1) | result['mahalanobis']).sum()
+        print(f"{rows:>10} {seconds:>9.3f} {flagged:>9}")
+
+
+if __name__ == '__main__':
+    run([int(arg) for arg in sys.argv[1:]] or [100000, 1000000])
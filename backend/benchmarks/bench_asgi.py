@@ -0,0 +1,140 @@
+"""Sync (gunicorn) vs ASGI (uvicorn) throughput under mixed load.
+
+Starts each server against a throwaway SQLite file, then for a fixed
+duration runs read clients cycling through datasets, equipment, summary
+and health while report clients request PDF reports back to back. Reports
+read request throughput and latency percentiles, plus completed reports.
+
+    python -m benchmarks.bench_asgi [seconds] [workers]
+
+Needs ``gunicorn`` and ``uvicorn`` on the PATH.
+"""
+import base64
+import http.client
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+DATABASE = os.path.join(tempfile.mkdtemp(prefix='chemora-bench-'), 'bench.sqlite3')
+os.environ['BENCH_DATABASE'] = DATABASE
+os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.server_settings'
+
+import numpy as np
+from django.core.management import call_command
+
+from benchmarks.common import make_dataset, make_user
+
+from api.summaries import build_type_summaries
+
+READ_CLIENTS = 16
+REPORT_CLIENTS = 2
+READ_ROWS = 200
+REPORT_ROWS = 2000
+AUTH = 'Basic ' + base64.b64encode(b'bench:bench').decode()
+
+SERVERS = [
+    # (label, command, read endpoint prefix)
+    ('gunicorn sync', ['gunicorn', 'equipment_api.wsgi:application', '--worker-class', 'sync'], '/api/'),
+    ('uvicorn, sync views', ['uvicorn', 'equipment_api.asgi:application', '--no-access-log'], '/api/'),
+    ('uvicorn, async views', ['uvicorn', 'equipment_api.asgi:application', '--no-access-log'], '/api/async/'),
+]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def request(port, path):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    try:
+        connection.request('GET', path, headers={'Authorization': AUTH})
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+
+def start_server(command, port, workers):
+    if 'gunicorn' in command[0]:
+        command = command + ['--workers', str(workers), '--bind', f'127.0.0.1:{port}']
+    else:
+        command = command + ['--workers', str(workers), '--port', str(port)]
+    server = subprocess.Popen(command, env=os.environ.copy(),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            request(port, '/')
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f'{command[0]} did not start')
+
+
+def run_load(port, prefix, read_id, report_id, seconds):
+    read_paths = [f'{prefix}datasets/', f'{prefix}equipment/{read_id}/', f'{prefix}summary/{read_id}/',
+                  f'{prefix}health/' if prefix.endswith('async/') else '/']
+    latencies, reports, errors = [], [], []
+    stop = time.time() + seconds
+    
+    def reader(offset):
+        i = offset
+        while time.time() < stop:
+            start = time.perf_counter()
+            status = request(port, read_paths[i % len(read_paths)])
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+            i += 1
+    
+    def reporter():
+        while time.time() < stop:
+            if request(port, f'/api/report/{report_id}/') == 200:
+                reports.append(1)
+    
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(READ_CLIENTS)]
+    threads += [threading.Thread(target=reporter) for _ in range(REPORT_CLIENTS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return np.array(latencies), len(reports), len(errors)
+
+
+def run(seconds, workers):
+    call_command('migrate', verbosity=0)
+    user = make_user()
+    read_dataset = make_dataset(user, READ_ROWS, name='read.csv')
+    report_dataset = make_dataset(user, REPORT_ROWS, name='report.csv', seed=1)
+    for dataset in (read_dataset, report_dataset):
+        build_type_summaries(dataset)
+    
+    print(f'{seconds}s per server, {workers} worker(s), {READ_CLIENTS} read clients, '
+          f'{REPORT_CLIENTS} report clients')
+    print(f"{'server':<22} {'reads/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'reports':>8} {'errors':>7}")
+    for label, command, prefix in SERVERS:
+        port = free_port()
+        server = start_server(command, port, workers)
+        try:
+            latencies, reports, errors = run_load(port, prefix, read_dataset.id, report_dataset.id, seconds)
+        finally:
+            server.terminate()
+            server.wait()
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000 if len(latencies) else (float('nan'),) * 2
+        print(f'{label:<22} {len(latencies) / seconds:>9.1f} {p50:>9.1f} {p99:>9.1f} {reports:>8} {errors:>7}')
+
+
+if __name__ == '__main__':
+    try:
+        run(float(sys.argv[1]) if len(sys.argv) > 1 else 15, int(sys.argv[2]) if len(sys.argv) > 2 else 2)
+    finally:
+        shutil.rmtree(os.path.dirname(DATABASE), ignore_errors=True)
@@ -0,0 +1,92 @@
+"""Desktop client cold start: import profile and time to the login dialog.
+
+Runs ``desktop/main.py`` in fresh interpreters:
+
+* ``python -X importtime -c "import main"`` lists the most expensive imports
+  and checks that none of the heavy modules (requests, numpy, matplotlib)
+  loads before the login dialog;
+* a second run imports the client, creates the QApplication and shows the
+  login dialog, timing launch to first window against FIRST_WINDOW_TARGET.
+  The same run with the heavy modules imported up front shows what the
+  lazy imports save.
+
+    python -m benchmarks.bench_desktop_startup [runs]
+
+Needs the desktop requirements (PyQt5). Qt uses the offscreen platform, so
+no display is needed. Exits with status 1 if a check fails.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+DESKTOP = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'desktop')
+HEAVY_MODULES = ('requests', 'numpy', 'matplotlib')
+EAGER_IMPORTS = 'import requests, numpy, matplotlib.figure, matplotlib.backends.backend_qt5agg\n'
+# Launch to a painted login dialog, offscreen; a cold start from the
+# packaged build adds its unpacking time on top
+FIRST_WINDOW_TARGET = 0.3
+TOP_IMPORTS = 10
+
+FIRST_WINDOW = """
+import main
+app = main.QApplication([])
+dialog = main.LoginDialog()
+dialog.show()
+app.processEvents()
+print('shown', flush=True)
+"""
+
+
+def child_env():
+    return dict(os.environ, QT_QPA_PLATFORM='offscreen', PYTHONDONTWRITEBYTECODE='1')
+
+
+def import_profile():
+    """``(module, self_us, cumulative_us, depth)`` for each import of ``import main``"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], cwd=DESKTOP,
+                            env=child_env(), capture_output=True, text=True, check=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+
+def first_window(preamble=''):
+    """Seconds from process launch to the login dialog having been painted"""
+    start = time.perf_counter()
+    child = subprocess.Popen([sys.executable, '-c', preamble + FIRST_WINDOW], cwd=DESKTOP, env=child_env(),
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        if child.stdout.readline().strip() != 'shown':
+            raise RuntimeError('the login dialog was not shown')
+        return time.perf_counter() - start
+    finally:
+        child.kill()
+        child.wait()
+
+
+def run(runs):
+    imports = import_profile()
+    # Imports made by main itself sit one level below it
+    direct = sorted((i for i in imports if i[3] <= 1), key=lambda i: i[2], reverse=True)
+    print(f"{'import':<36} {'cumulative ms':>14}")
+    for name, _, cumulative_us, _ in direct[:TOP_IMPORTS]:
+        print(f'{name:<36} {cumulative_us / 1000:>14.1f}')
+    heavy = sorted({name.split('.')[0] for name, *_ in imports} & set(HEAVY_MODULES))
+    print(f"heavy modules loaded by 'import main': {', '.join(heavy) or 'none'}")
+
+    lazy = statistics.median(first_window() for _ in range(runs))
+    eager = statistics.median(first_window(EAGER_IMPORTS) for _ in range(runs))
+    print(f'time to first window, median of {runs}: {lazy:.3f} s '
+          f'(target {FIRST_WINDOW_TARGET:.2f} s); with heavy imports up front: {eager:.3f} s')
+    return not heavy and lazy <= FIRST_WINDOW_TARGET
+
+
+if __name__ == '__main__':
+    sys.exit(0 if run(int(sys.argv[1]) if len(sys.argv) > 1 else 5) else 1)
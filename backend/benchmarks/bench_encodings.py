@@ -0,0 +1,86 @@
+"""Response encoding benchmark: JSON against MessagePack and Arrow.
+
+Encodes synthetic in-memory payloads with the API's renderers and decodes
+them as a client would, for two shapes:
+
+* ``rows`` - a list of equipment rows, as ``/api/equipment/<id>/`` returns;
+* ``columns`` - float columns as NumPy arrays, as in a bundle's ``series``.
+  MessagePack sends them as packed float64 blocks.
+
+Arrow only applies to rows. Its decode reads the stream into columns
+without building Python objects.
+
+    python -m benchmarks.bench_encodings [rows ...]
+
+Needs msgpack, and pyarrow for the Arrow rows.
+"""
+import json
+import sys
+import time
+
+import msgpack
+import numpy as np
+
+from benchmarks.common import EQUIPMENT_TYPES
+
+from api.renderers import FLOAT64_ARRAY, ArrowRenderer, MessagePackRenderer
+from api.summaries import PARAMETERS
+from rest_framework.renderers import JSONRenderer
+
+
+def unpack_ext(code, data):
+    if code == FLOAT64_ARRAY:
+        return np.frombuffer(data, dtype='<f8')
+    return msgpack.ExtType(code, data)
+
+
+def read_arrow(body):
+    import pyarrow as pa
+    return pa.ipc.open_stream(body).read_all()
+
+
+ENCODINGS = {
+    'json': (JSONRenderer(), json.loads),
+    'msgpack': (MessagePackRenderer(), lambda body: msgpack.unpackb(body, ext_hook=unpack_ext)),
+    'arrow': (ArrowRenderer(), read_arrow),
+}
+
+
+def payloads(rows):
+    rng = np.random.default_rng(0)
+    values = rng.normal([150, 8, 120], [40, 3, 30], size=(rows, len(PARAMETERS)))
+    types = rng.integers(0, len(EQUIPMENT_TYPES), rows)
+    yield 'rows', [
+        {'id': i, 'name': f'Unit-{i}', 'type': EQUIPMENT_TYPES[t], 'flowrate': f, 'pressure': p,
+         'temperature': c, 'dataset': 1}
+        for i, t, (f, p, c) in zip(range(rows), types.tolist(), values.tolist())
+    ]
+    yield 'columns', {'count': rows, **{param: np.ascontiguousarray(values[:, i])
+                                        for i, param in enumerate(PARAMETERS)}}
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def run(row_counts):
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        del ENCODINGS['arrow']
+    print(f"{'payload':<8} {'rows':>9} {'encoding':<8} {'encode s':>9} {'decode s':>9} {'MiB':>8}")
+    for rows in row_counts:
+        for shape, data in payloads(rows):
+            for name, (renderer, decode) in ENCODINGS.items():
+                if name == 'arrow' and shape != 'rows':
+                    continue
+                body, encode_seconds = timed(renderer.render, data)
+                _, decode_seconds = timed(decode, body)
+                print(f"{shape:<8} {rows:>9} {name:<8} {encode_seconds:>9.3f} {decode_seconds:>9.3f} "
+                      f"{len(body) / 2 ** 20:>8.1f}")
+
+
+if __name__ == '__main__':
+    run([int(arg) for arg in sys.argv[1:]] or [100000, 1000000])
@@ -0,0 +1,46 @@
+"""PDF report build benchmark.
+
+Measures build time and output size of ``/api/report/<id>/`` with PNG and
+vector (``?charts=vector``) charts, and in full-detail mode
+(``?detail=full``), reporting pages per second for the streamed detail table.
+"""
+import sys
+
+from benchmarks.common import benchmark_db, make_user, make_dataset, timed
+
+from rest_framework.test import APIClient
+
+
+def fetch(client, url):
+    response = client.get(url)
+    if hasattr(response, 'streaming_content'):
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+def run(row_counts):
+    with benchmark_db():
+        user = make_user()
+        client = APIClient()
+        client.force_authenticate(user=user)
+        print(f"{'rows':>8} {'mode':>8} {'seconds':>9} {'pages':>6} {'pages/s':>8} {'KiB':>8}")
+        for rows in row_counts:
+            dataset = make_dataset(user, rows, name=f"bench_{rows}.csv")
+            modes = (
+                ('png', ''),
+                ('vector', '?charts=vector'),
+                ('full', '?detail=full'),
+                ('full+vec', '?detail=full&charts=vector'),
+            )
+            for mode, query in modes:
+                results = {}
+                with timed(results, 'build'):
+                    pdf = fetch(client, f"/api/report/{dataset.id}/{query}")
+                pages = pdf.count(b'/Type /Page\n')
+                seconds = results['build']
+                print(f"{rows:>8} {mode:>8} {seconds:>9.2f} {pages:>6} {pages / seconds:>8.1f} {len(pdf) / 1024:>8.0f}")
+            dataset.delete()
+
+
+if __name__ == '__main__':
+    run([int(arg) for arg in sys.argv[1:]] or [1000, 10000])
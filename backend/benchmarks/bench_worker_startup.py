@@ -0,0 +1,99 @@
+"""API worker cold start: boot time, RSS and the modules a worker loads.
+
+Boots the WSGI application in fresh interpreters the way a gunicorn
+worker does, then resolves an API URL so the URLconf and every view
+module are imported, as the first request would:
+
+* prints the packages whose imports take longest and checks that the
+  report stack (matplotlib, ReportLab) is not loaded;
+* reports median boot time and resident memory, then the time and memory
+  the first PDF report adds by importing ``api.reports``.
+
+    python -m benchmarks.bench_worker_startup [runs]
+
+Exits with status 1 if a report module is loaded at boot.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPORT_MODULES = ('matplotlib', 'reportlab')
+TOP_IMPORTS = 10
+
+BOOT = """
+import json, sys, time
+start = time.perf_counter()
+from equipment_api.wsgi import application
+from django.urls import resolve
+resolve('/api/datasets/')
+booted = time.perf_counter()
+
+
+def rss_mib():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+boot_rss = rss_mib()
+loaded = sorted({name.split('.')[0] for name in sys.modules})
+import api.reports
+print(json.dumps({'boot': booted - start, 'boot_rss': boot_rss, 'loaded': loaded,
+                  'report_import': time.perf_counter() - booted, 'report_rss': rss_mib()}))
+"""
+
+
+def child_env():
+    database = os.path.join(tempfile.gettempdir(), 'chemora-bench-startup.sqlite3')
+    return dict(os.environ, BENCH_DATABASE=database, DJANGO_SETTINGS_MODULE='benchmarks.server_settings',
+                PYTHONDONTWRITEBYTECODE='1')
+
+
+def import_profile():
+    """``(package, self_us)`` for each top-level package imported while booting, slowest first"""
+    script = BOOT.split('booted =')[0]
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', script], cwd=BACKEND,
+                            env=child_env(), capture_output=True, text=True, check=True)
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)
+
+
+def boot():
+    result = subprocess.run([sys.executable, '-c', BOOT], cwd=BACKEND, env=child_env(),
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def run(runs):
+    print(f"{'package':<24} {'import ms':>10}")
+    for name, self_us in import_profile()[:TOP_IMPORTS]:
+        print(f'{name:<24} {self_us / 1000:>10.1f}')
+
+    results = [boot() for _ in range(runs)]
+    loaded = sorted(set(results[0]['loaded']) & set(REPORT_MODULES))
+    print(f"report modules loaded at boot: {', '.join(loaded) or 'none'}")
+
+    def median(key):
+        return statistics.median(result[key] for result in results)
+
+    print(f'median of {runs}: boot {median("boot"):.3f} s, RSS {median("boot_rss"):.1f} MiB')
+    print(f'first report imports api.reports: +{median("report_import"):.3f} s, '
+          f'RSS {median("report_rss"):.1f} MiB')
+    return not loaded
+
+
+if __name__ == '__main__':
+    sys.exit(0 if run(int(sys.argv[1]) if len(sys.argv) > 1 else 5) else 1)
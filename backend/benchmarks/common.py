@@ -0,0 +1,70 @@
+"""Shared setup for the benchmark scripts.
+
+Each script is run from the backend directory, e.g.::
+
+    python -m benchmarks.bench_reports
+
+and works against a throwaway test database, never ``db.sqlite3``.
+"""
+import os
+import random
+import time
+from contextlib import contextmanager
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'equipment_api.settings')
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import setup_test_environment
+
+from api.models import Dataset, Equipment
+from api.search import index_equipment
+
+EQUIPMENT_TYPES = ['Pump', 'Compressor', 'Valve', 'HeatExchanger', 'Reactor', 'Condenser']
+
+
+@contextmanager
+def benchmark_db():
+    """Create a throwaway database for the duration of a benchmark run"""
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def make_user(username='bench', password='bench'):
+    return User.objects.create_user(username=username, password=password)
+
+
+def make_dataset(user, rows, name='bench.csv', seed=0):
+    """Create a dataset with ``rows`` synthetic equipment readings"""
+    rng = random.Random(seed)
+    dataset = Dataset.objects.create(name=name, uploaded_by=user, file_path=name)
+    batch = []
+    for i in range(rows):
+        batch.append(Equipment(
+            dataset=dataset,
+            name=f"Unit-{i}",
+            type=EQUIPMENT_TYPES[i % len(EQUIPMENT_TYPES)],
+            flowrate=rng.uniform(50, 300),
+            pressure=rng.uniform(1, 15),
+            temperature=rng.uniform(20, 250),
+        ))
+        if len(batch) >= 5000:
+            Equipment.objects.bulk_create(batch)
+            batch = []
+    Equipment.objects.bulk_create(batch)
+    index_equipment(dataset.id, ['Unit'], EQUIPMENT_TYPES)
+    return dataset
+
+
+@contextmanager
+def timed(results, key):
+    start = time.perf_counter()
+    yield
+    results[key] = time.perf_counter() - start
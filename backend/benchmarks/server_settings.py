@@ -0,0 +1,19 @@
+"""Settings for servers started by ``bench_asgi``.
+
+Same as the project settings, with a throwaway SQLite file and a fast
+password hasher: every API request authenticates with HTTP Basic, and
+PBKDF2 would otherwise dominate the timings of both servers alike.
+"""
+import os
+
+from equipment_api.settings import *  # noqa: F401,F403
+
+DEBUG = False
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['BENCH_DATABASE'],
+    }
+}
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+LOGGING = {'version': 1, 'disable_existing_loggers': True}
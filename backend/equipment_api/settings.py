@@ -62,7 +62,62 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # JSON unless the client asks for MessagePack (see api/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'api.renderers.MessagePackRenderer',
+    ],
+}
+
+# Full-detail PDF reports (/api/report/<id>/?detail=full)
+REPORT_DETAIL_CHUNK_ROWS = int(os.environ.get('REPORT_DETAIL_CHUNK_ROWS', '500'))
+REPORT_DETAIL_MAX_ROWS = int(os.environ.get('REPORT_DETAIL_MAX_ROWS', '50000'))
+# Rows plotted in every report's pressure/temperature scatter chart
+REPORT_SCATTER_MAX_POINTS = int(os.environ.get('REPORT_SCATTER_MAX_POINTS', '2000'))
+
+# Cache for summaries, chart series, anomaly results and report bytes (see api/cache.py).
+# CACHE_BACKEND is locmem (default), file or redis; redis needs the redis package
+# and any Redis-compatible server at CACHE_LOCATION.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+CACHE_TIMEOUT = int(os.environ.get('CACHE_TIMEOUT', '3600'))
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '1000'))
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', 'redis://127.0.0.1:6379/0'),
+            'TIMEOUT': CACHE_TIMEOUT,
+        }
+    }
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'api.cache_backends.CountingFileBasedCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')),
+            'TIMEOUT': CACHE_TIMEOUT,
+            'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'api.cache_backends.CountingLocMemCache',
+            'TIMEOUT': CACHE_TIMEOUT,
+            'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+        }
+    }
+# Rendered reports larger than this are not cached
+REPORT_CACHE_MAX_BYTES = int(os.environ.get('REPORT_CACHE_MAX_BYTES', str(4 * 1024 * 1024)))
+
+# Physical (min, max) accepted for each value column on upload; rows outside are invalid
+UPLOAD_COLUMN_RANGES = {
+    'flowrate': (0.0, 100000.0),
+    'pressure': (0.0, 1000.0),
+    'temperature': (-273.15, 2000.0),
 }
+# Per-type overrides, e.g. {'Pump': {'pressure': (0.0, 100.0)}}
+UPLOAD_TYPE_RANGES = {}
 
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOWED_ORIGINS = [
@@ -70,6 +125,8 @@ CORS_ALLOWED_ORIGINS = [
     "https://your-frontend-url.onrender.com",
 ]
 CORS_ALLOW_CREDENTIALS = True
+# Let browser clients read the job id of uploads and reports, and resume exports
+CORS_EXPOSE_HEADERS = ['X-Job-Id', 'Content-Range', 'Accept-Ranges', 'ETag']
 
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
@@ -80,6 +137,20 @@ STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Dataset exports (/api/export/<id>/), one file per dataset version and format
+EXPORT_ROOT = os.environ.get('EXPORT_ROOT', os.path.join(MEDIA_ROOT, 'exports'))
+# Chunked uploads (/api/uploads/) are assembled here until they are committed
+CHUNKED_UPLOAD_ROOT = os.environ.get('CHUNKED_UPLOAD_ROOT', os.path.join(MEDIA_ROOT, 'uploads'))
+CHUNKED_UPLOAD_CHUNK_SIZE = int(os.environ.get('CHUNKED_UPLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))
+CHUNKED_UPLOAD_MAX_BYTES = int(os.environ.get('CHUNKED_UPLOAD_MAX_BYTES', str(2 * 1024 ** 3)))
+# Uploads that receive no chunk for this long are removed
+CHUNKED_UPLOAD_EXPIRY_SECONDS = int(os.environ.get('CHUNKED_UPLOAD_EXPIRY_SECONDS', str(24 * 3600)))
+# A parse running while chunks arrive gives up after waiting this long for the next one
+# (the commit then parses the assembled file), and a finished parse is dropped if no
+# commit claims it within this time
+CHUNKED_UPLOAD_PARSE_IDLE_SECONDS = int(os.environ.get('CHUNKED_UPLOAD_PARSE_IDLE_SECONDS', '120'))
+# A commit that has held its upload this long is presumed dead and can be retried
+CHUNKED_UPLOAD_COMMIT_TIMEOUT = int(os.environ.get('CHUNKED_UPLOAD_COMMIT_TIMEOUT', '3600'))
 
 LOGGING = {
     'version': 1,
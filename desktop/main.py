@@ -1,14 +1,85 @@
+import os
 import sys
-import requests
+import json
+import uuid
+import logging
 import base64
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-import numpy as np
+import hashlib
+import importlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 
+# requests, numpy and matplotlib take longer to import than Qt itself, so
+# they load behind the login dialog instead of before it: the network stack
+# while the dialog is open, the charting stack once login succeeds
+NETWORK_MODULES = ['requests', 'msgpack']
+CHART_MODULES = ['numpy', 'matplotlib.figure', 'matplotlib.backends.backend_qt5agg']
+
+logger = logging.getLogger(__name__)
+
+_import_lock = threading.Lock()
+_imported = {}
+
+def lazy_import(name):
+    """Import a module on first use; safe to call from the UI and worker threads"""
+    module = _imported.get(name)
+    if module is None:
+        with _import_lock:
+            module = _imported[name] = importlib.import_module(name)
+    return module
+
+def preload(modules):
+    """Import modules on a background thread so their first use does not stall the UI"""
+    def run():
+        for name in modules:
+            try:
+                lazy_import(name)
+            except Exception:
+                pass  # the import is retried, and reported, where the module is used
+    # A daemon thread, so quitting at the login dialog never waits on it
+    threading.Thread(target=run, daemon=True).start()
+
+def abort_response(response):
+    """Unblock the thread reading a streamed response.
+    
+    Closing the response from another thread would wait for that thread's
+    read to return; shutting the socket down ends the read at once.
+    """
+    # HTTPResponse.shutdown() is new in urllib3 2.3
+    shutdown = getattr(response.raw, 'shutdown', None)
+    if shutdown is None:
+        logger.warning("urllib3 cannot shut down the socket of %s; closing the response instead", response.url)
+        response.close()
+        return
+    try:
+        shutdown()
+    except (ValueError, RuntimeError, OSError):
+        pass  # not connected yet, already released to the pool, or closed
+
+# Opening a dataset fetches one bundle: its summary, the first table page and
+# chart series downsampled on the server. Later pages load on demand.
+BUNDLE_QUERY = {'include': 'summary,equipment,series,correlation', 'page_size': 100}
+
+# Data requests ask for MessagePack, which carries float columns as packed
+# arrays; a server that cannot send it answers with JSON
+MSGPACK_ACCEPT = {"Accept": "application/msgpack, */*;q=0.1"}
+FLOAT64_ARRAY = 1  # MessagePack ext type of a packed little-endian float64 array
+
+def unpack_ext(code, data):
+    if code == FLOAT64_ARRAY:
+        return lazy_import('numpy').frombuffer(data, dtype='<f8')
+    return lazy_import('msgpack').ExtType(code, data)
+
+def decode_body(content_type, body):
+    """The payload of a MessagePack or JSON response body"""
+    if content_type.startswith("application/msgpack"):
+        return lazy_import('msgpack').unpackb(body, ext_hook=unpack_ext)
+    return json.loads(body)
+
 class SignupDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -203,8 +274,11 @@ class ChartsWidget(QWidget):
         
         self.setLayout(layout)
     
-    def create_matplotlib_chart(self, chart_type, title, data, labels=None, colors=None):
-        """Create matplotlib chart widget"""
+    def create_matplotlib_chart(self, chart_type, title, data, labels=None, colors=None, fit=None):
+        """Create matplotlib chart widget; ``fit`` is a server-side linear fit to draw on a scatter"""
+        Figure = lazy_import('matplotlib.figure').Figure
+        FigureCanvas = lazy_import('matplotlib.backends.backend_qt5agg').FigureCanvasQTAgg
+        np = lazy_import('numpy')
         fig = Figure(figsize=(12, 7), dpi=100)
         fig.patch.set_facecolor('white')
         
@@ -241,20 +315,23 @@ class ChartsWidget(QWidget):
             ax.set_ylabel(labels[1] if labels else 'Y', fontsize=14)
             ax.grid(True, alpha=0.3)
             
-            # Add trend line
-            if len(x_data) > 1:
-                z = np.polyfit(x_data, y_data, 1)
-                p = np.poly1d(z)
-                ax.plot(x_data, p(x_data), "--", color='#ff6b6b', alpha=0.8, linewidth=3)
+            # Trend line fitted over all rows by the server
+            if fit and len(x_data):
+                ends = np.array([np.min(x_data), np.max(x_data)])
+                ax.plot(ends, fit['intercept'] + fit['slope'] * ends, "--", color='#ff6b6b', alpha=0.8, linewidth=3,
+                        label=f"R² = {fit['r_squared']:.3f}" if fit['r_squared'] is not None else None)
+                if fit['r_squared'] is not None:
+                    ax.legend(fontsize=12)
         
         elif chart_type == 'line':
-            ax.plot(range(len(data)), data, marker='o', linewidth=4, markersize=10, 
+            x_data, y_data = data
+            ax.plot(x_data, y_data, marker='o', linewidth=4, markersize=10, 
                    color='#4facfe', markerfacecolor='#00f2fe', markeredgecolor='white', markeredgewidth=2)
             ax.set_title(title, fontsize=18, fontweight='bold', pad=30)
             ax.set_xlabel('Equipment Index', fontsize=14)
             ax.set_ylabel('Temperature (°C)', fontsize=14)
             ax.grid(True, alpha=0.3)
-            ax.fill_between(range(len(data)), data, alpha=0.3, color='#4facfe')
+            ax.fill_between(x_data, y_data, alpha=0.3, color='#4facfe')
         
         # Style the plot
         ax.spines['top'].set_visible(False)
@@ -331,13 +408,17 @@ class ChartsWidget(QWidget):
         
         return card
     
-    def plot_data(self, data, summary):
-        """Plot all charts with the provided data"""
+    def plot_data(self, series, summary, correlation=None):
+        """Plot all charts from a bundle's series, summary and correlation.
+        
+        The series is downsampled on the server but keeps every bucket's
+        extremes, so the minimums and maximums below are those of all rows.
+        """
         # Clear existing charts
         for i in reversed(range(self.charts_layout.count())): 
             self.charts_layout.itemAt(i).widget().setParent(None)
         
-        if not data or not summary:
+        if not series or not series['index'] or not summary:
             no_data_label = QLabel("📈 No data available for visualization")
             no_data_label.setAlignment(Qt.AlignCenter)
             no_data_label.setStyleSheet("""
@@ -370,39 +451,41 @@ class ChartsWidget(QWidget):
             self.charts_layout.addWidget(pie_chart)
         
         # 3. Flowrate vs Pressure Scatter Plot
-        flowrates = [item['flowrate'] for item in data]
-        pressures = [item['pressure'] for item in data]
+        flowrates = series['flowrate']
+        pressures = series['pressure']
         
+        fits = {(fit['x'], fit['y']): fit for fit in (correlation or {}).get('fits', []) if fit}
         scatter_chart = self.create_matplotlib_chart('scatter', 'Flowrate vs Pressure Correlation', 
-                                                    (flowrates, pressures), ['Flowrate', 'Pressure'])
+                                                    (flowrates, pressures), ['Flowrate', 'Pressure'],
+                                                    fit=fits.get(('flowrate', 'pressure')))
         self.charts_layout.addWidget(scatter_chart)
         
         # 4. Temperature Trend Line Chart
-        temperatures = [item['temperature'] for item in data]
+        temperatures = series['temperature']
         temp_chart = self.create_matplotlib_chart('line', 'Temperature Distribution Across Equipment', 
-                                                 temperatures)
+                                                 (series['index'], temperatures))
         self.charts_layout.addWidget(temp_chart)
         
         # 5. Statistics Cards
         temp_stats = {
-            f"📈 Total Equipment": f"{len(data)} items",
+            f"📈 Total Equipment": f"{summary['total_count']} items",
             f"🌡️ Min Temperature": f"{min(temperatures):.2f}°C",
             f"🌡️ Max Temperature": f"{max(temperatures):.2f}°C",
-            f"🌡️ Avg Temperature": f"{sum(temperatures)/len(temperatures):.2f}°C",
+            f"🌡️ Avg Temperature": f"{summary['avg_temperature']:.2f}°C",
             f"📉 Temperature Range": f"{max(temperatures) - min(temperatures):.2f}°C"
         }
         
         flow_stats = {
             f"💧 Min Flowrate": f"{min(flowrates):.2f}",
             f"💧 Max Flowrate": f"{max(flowrates):.2f}",
-            f"💧 Avg Flowrate": f"{sum(flowrates)/len(flowrates):.2f}",
+            f"💧 Avg Flowrate": f"{summary['avg_flowrate']:.2f}",
             f"📉 Flowrate Range": f"{max(flowrates) - min(flowrates):.2f}"
         }
         
         pressure_stats = {
             f"⚙️ Min Pressure": f"{min(pressures):.2f}",
             f"⚙️ Max Pressure": f"{max(pressures):.2f}",
-            f"⚙️ Avg Pressure": f"{sum(pressures)/len(pressures):.2f}",
+            f"⚙️ Avg Pressure": f"{summary['avg_pressure']:.2f}",
             f"📉 Pressure Range": f"{max(pressures) - min(pressures):.2f}"
         }
         
@@ -426,6 +509,310 @@ class ChartsWidget(QWidget):
         """)
         self.charts_layout.addWidget(stats_widget)
 
+class RequestThread(QThread):
+    """Runs a blocking request off the UI thread"""
+    succeeded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    
+    def __init__(self, func, parent=None):
+        super().__init__(parent)
+        self.func = func
+    
+    def run(self):
+        try:
+            self.succeeded.emit(self.func())
+        except Exception as e:
+            self.failed.emit(str(e))
+
+class EventStreamThread(QThread):
+    """Listens to /api/events/ (Server-Sent Events) and emits each job progress event"""
+    event_received = pyqtSignal(dict)
+    
+    def __init__(self, api_base, auth_header, parent=None):
+        super().__init__(parent)
+        self.api_base = api_base
+        self.auth_header = auth_header
+        self.last_event_id = None
+        self.response = None
+        self.running = True
+    
+    def run(self):
+        requests = lazy_import('requests')
+        while self.running:
+            headers = dict(self.auth_header, Accept="text/event-stream")
+            if self.last_event_id:
+                headers["Last-Event-ID"] = self.last_event_id
+            try:
+                # The server sends a keep-alive comment every 15 s, so a 60 s read timeout means a dead connection
+                self.response = requests.get(f"{self.api_base}/events/", headers=headers, stream=True, timeout=(5, 60))
+                if self.response.status_code != 200:
+                    self.response.close()
+                    self.msleep(30000)
+                    continue
+                for line in self.response.iter_lines(decode_unicode=True):
+                    if not self.running:
+                        break
+                    if line.startswith("id:"):
+                        self.last_event_id = line[3:].strip()
+                    elif line.startswith("data:"):
+                        self.event_received.emit(json.loads(line[5:]))
+            except Exception:
+                pass
+            if self.running:
+                self.msleep(2000)
+    
+    def stop(self):
+        self.running = False
+        if self.response is not None:
+            abort_response(self.response)
+        self.wait(2000)
+
+class DownloadThread(QThread):
+    """Streams a download to ``<path>.part`` and renames it to ``path`` once complete.
+    
+    A dropped connection is resumed with a Range request; if the server
+    answers with the whole body instead, the download starts over.
+    """
+    progress = pyqtSignal(int, int)  # bytes received, total bytes (0 while unknown)
+    succeeded = pyqtSignal(str)
+    failed = pyqtSignal(str)
+    
+    CHUNK_SIZE = 64 * 1024
+    # Retries in a row without receiving a byte
+    MAX_RETRIES = 5
+    
+    def __init__(self, url, params, headers, path, parent=None):
+        super().__init__(parent)
+        self.url = url
+        self.params = params
+        self.headers = headers
+        self.path = path
+        self.response = None
+        self.cancelled = False
+    
+    def cancel(self):
+        self.cancelled = True
+        if self.response is not None:
+            abort_response(self.response)
+    
+    def run(self):
+        part_path = self.path + ".part"
+        try:
+            with open(part_path, 'wb') as f:
+                complete = self.download(f)
+            if complete:
+                os.replace(part_path, self.path)
+                self.succeeded.emit(self.path)
+                return
+        except Exception as e:
+            if not self.cancelled:
+                self.failed.emit(str(e))
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    
+    def download(self, f):
+        requests = lazy_import('requests')
+        received, total, etag, retries = 0, 0, None, 0
+        while not self.cancelled:
+            headers = dict(self.headers)
+            if received:
+                headers["Range"] = f"bytes={received}-"
+                if etag:
+                    headers["If-Range"] = etag
+            try:
+                # The read timeout applies per socket read (the wait for the report to render,
+                # then each chunk), never to the download as a whole
+                self.response = requests.get(self.url, params=self.params, headers=headers, stream=True,
+                                             timeout=(10, 300))
+                with self.response:
+                    if self.response.status_code == 206:
+                        total = int(self.response.headers['Content-Range'].rsplit('/', 1)[1])
+                    elif self.response.status_code == 200:
+                        # A full body: the range was ignored or the report changed
+                        f.seek(0)
+                        f.truncate()
+                        received = 0
+                        total = int(self.response.headers.get('Content-Length', 0))
+                    elif self.response.status_code == 416:
+                        f.seek(0)
+                        f.truncate()
+                        received, etag = 0, None
+                        continue
+                    else:
+                        error = self.response.json().get('error') if self.response.content else None
+                        raise RuntimeError(error or f"Server returned {self.response.status_code}")
+                    etag = self.response.headers.get('ETag')
+                    for chunk in self.response.iter_content(self.CHUNK_SIZE):
+                        f.write(chunk)
+                        received += len(chunk)
+                        retries = 0
+                        self.progress.emit(received, total)
+                if not total or received >= total:
+                    return not self.cancelled
+            except requests.RequestException:
+                if self.cancelled:
+                    return False
+                retries += 1
+                if retries > self.MAX_RETRIES:
+                    raise
+                self.msleep(1000 * retries)
+        return False
+
+class ChunkedUploadThread(QThread):
+    """Uploads a file through /api/uploads/ in checksummed chunks, a few at a time, then commits it.
+    
+    Given the id of an earlier, failed upload of the same file, only the
+    chunks the server is missing are sent.
+    """
+    progress = pyqtSignal(int, int)  # bytes uploaded, file size
+    succeeded = pyqtSignal(object)  # the commit response
+    failed = pyqtSignal(str)
+    
+    # Bounds both the connections in use and the chunks held in memory
+    PARALLEL_CHUNKS = 3
+    MAX_RETRIES = 5
+    
+    def __init__(self, api_base, auth_header, path, job_id, upload_id=None, parent=None):
+        super().__init__(parent)
+        self.api_base = api_base
+        self.auth_header = auth_header
+        self.path = path
+        self.job_id = job_id
+        self.upload_id = upload_id
+    
+    def run(self):
+        try:
+            self.succeeded.emit(self.upload())
+        except Exception as e:
+            self.failed.emit(str(e))
+    
+    def upload(self):
+        requests = lazy_import('requests')
+        size = os.path.getsize(self.path)
+        status = None
+        if self.upload_id:
+            response = requests.get(f"{self.api_base}/uploads/{self.upload_id}/", headers=self.auth_header, timeout=10)
+            if response.status_code == 200 and response.json()['size'] == size:
+                status = response.json()
+        if status is None:
+            response = requests.post(f"{self.api_base}/uploads/", headers=self.auth_header, timeout=10,
+                                     json={'name': os.path.basename(self.path), 'size': size, 'job_id': self.job_id})
+            if response.status_code != 201:
+                raise RuntimeError(response.json().get('error', f"Server returned {response.status_code}"))
+            status = response.json()
+            self.upload_id = status['upload_id']
+        
+        chunk_size = status['chunk_size']
+        missing = sorted(set(range(status['chunks'])) - set(status['received']))
+        uploaded = size - sum(min(chunk_size, size - index * chunk_size) for index in missing)
+        self.progress.emit(uploaded, size)
+        
+        with ThreadPoolExecutor(max_workers=self.PARALLEL_CHUNKS) as pool:
+            futures = [pool.submit(self.send_chunk, requests, index, chunk_size) for index in missing]
+            try:
+                for future in as_completed(futures):
+                    uploaded += future.result()
+                    self.progress.emit(uploaded, size)
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+        
+        # Storing a large file takes a while; its progress arrives over the event stream
+        response = requests.post(f"{self.api_base}/uploads/{self.upload_id}/commit/", headers=self.auth_header,
+                                 timeout=(10, None))
+        # A rejected file would only be rejected again, so the server's copy is removed.
+        # 409 means chunks are missing or another commit is running: keep it for that.
+        if 400 <= response.status_code < 500 and response.status_code != 409:
+            try:
+                requests.delete(f"{self.api_base}/uploads/{self.upload_id}/", headers=self.auth_header, timeout=10)
+            except requests.RequestException:
+                pass  # The server removes it once it expires
+        return response
+    
+    def send_chunk(self, requests, index, chunk_size):
+        with open(self.path, 'rb') as f:
+            f.seek(index * chunk_size)
+            data = f.read(chunk_size)
+        headers = dict(self.auth_header, **{"Content-Type": "application/octet-stream",
+                                            "X-Chunk-SHA256": hashlib.sha256(data).hexdigest()})
+        url = f"{self.api_base}/uploads/{self.upload_id}/chunks/{index}/"
+        for attempt in range(self.MAX_RETRIES + 1):
+            try:
+                response = requests.put(url, data=data, headers=headers, timeout=(10, 120))
+                if response.status_code == 200:
+                    return len(data)
+                error = f"Server returned {response.status_code}"
+                # Errors other than server failures would only repeat
+                if response.status_code < 500:
+                    error = response.json().get('error', error)
+                    break
+            except requests.RequestException as e:
+                error = str(e)
+            self.msleep(1000 * 2 ** attempt)
+        raise RuntimeError(f"Chunk {index + 1} could not be uploaded: {error}")
+
+class PrefetchThread(QThread):
+    """Fetches the bundles of datasets ahead of a click.
+    
+    Runs at the lowest priority, reads at most BYTES_PER_SECOND and keeps at
+    most ``budget`` bytes of responses. cancel() stops it mid-download.
+    """
+    fetched = pyqtSignal(object, object, int)  # dataset key, decoded bundle, response size
+    
+    MAX_DATASETS = 5
+    MAX_BYTES = 32 * 1024 * 1024
+    BYTES_PER_SECOND = 2 * 1024 * 1024
+    CHUNK_SIZE = 64 * 1024
+    
+    def __init__(self, api_base, auth_header, datasets, budget, parent=None):
+        super().__init__(parent)
+        self.api_base = api_base
+        self.auth_header = auth_header
+        self.datasets = datasets  # (key, dataset) pairs, most wanted first
+        self.budget = budget
+        self.response = None
+        self.cancelled = False
+    
+    def cancel(self):
+        self.cancelled = True
+        if self.response is not None:
+            abort_response(self.response)
+    
+    def run(self):
+        try:
+            requests = lazy_import('requests')
+            self.started = time.monotonic()
+            self.received = 0
+            for key, dataset in self.datasets:
+                if self.cancelled:
+                    return
+                body = self.fetch(requests, f"{self.api_base}/bundle/{dataset['id']}/", self.budget)
+                if body is not None:
+                    self.budget -= len(body)
+                    # Decoded here rather than on the click
+                    self.fetched.emit(key, decode_body(self.response.headers.get('Content-Type', ''), body), len(body))
+        except Exception:
+            pass  # prefetching is best effort; a click fetches what is missing
+    
+    def fetch(self, requests, url, limit):
+        """The response body, or None if it failed, ran over ``limit`` bytes or was cancelled"""
+        self.response = requests.get(url, params=BUNDLE_QUERY, headers=dict(self.auth_header, **MSGPACK_ACCEPT),
+                                     stream=True, timeout=10)
+        with self.response:
+            if self.response.status_code != 200:
+                return None
+            body = bytearray()
+            for chunk in self.response.iter_content(self.CHUNK_SIZE):
+                body += chunk
+                self.received += len(chunk)
+                if self.cancelled or len(body) > limit:
+                    return None
+                # Stay under the bandwidth budget, checking for cancellation while waiting
+                while not self.cancelled and self.received / self.BYTES_PER_SECOND > time.monotonic() - self.started:
+                    self.msleep(20)
+            return bytes(body)
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -521,8 +908,25 @@ class MainWindow(QMainWindow):
         if not self.login():
             sys.exit()
         
+        preload(CHART_MODULES)
+        
+        # (response size, bundle) fetched ahead of a click, by (dataset id, fingerprint)
+        self.prefetched = {}
+        self.dataset_keys = {}
+        self.datasets = []
+        self.prefetcher = None
+        self.request_threads = set()
+        
         self.init_ui()
         self.load_datasets()
+        
+        # Job progress is pushed by the server instead of polled
+        self.own_jobs = set()
+        # Ids of failed chunked uploads, by (path, size, mtime), for resuming them
+        self.failed_uploads = {}
+        self.event_stream = EventStreamThread(self.api_base, self.auth_header, self)
+        self.event_stream.event_received.connect(self.on_job_event)
+        self.event_stream.start()
     
     def login(self):
         dialog = LoginDialog()
@@ -539,6 +943,7 @@ class MainWindow(QMainWindow):
                 self.auth_header = {"Authorization": f"Basic {auth_string}"}
                 
                 try:
+                    requests = lazy_import('requests')
                     response = requests.get(f"{self.api_base}/datasets/", headers=self.auth_header, timeout=5)
                     if response.status_code == 200:
                         return True
@@ -617,7 +1022,16 @@ class MainWindow(QMainWindow):
         self.tab_widget = QTabWidget()
         
         self.data_table = QTableWidget()
-        self.tab_widget.addTab(self.data_table, "📋 Data Table")
+        self.more_btn = QPushButton("Load more")
+        self.more_btn.clicked.connect(self.load_more_equipment)
+        self.more_btn.setVisible(False)
+        table_tab = QWidget()
+        table_layout = QVBoxLayout()
+        table_layout.setContentsMargins(0, 0, 0, 0)
+        table_layout.addWidget(self.data_table)
+        table_layout.addWidget(self.more_btn)
+        table_tab.setLayout(table_layout)
+        self.tab_widget.addTab(table_tab, "📋 Data Table")
         
         self.chart_widget = ChartsWidget()
         self.tab_widget.addTab(self.chart_widget, "📊 Charts & Analysis")
@@ -668,39 +1082,96 @@ class MainWindow(QMainWindow):
             self.file_path_label.setText(f"Selected: {filename}")
             self.statusBar().showMessage(f"File selected: {filename}")
     
+    def run_request(self, func, on_success, on_failure):
+        thread = RequestThread(func, self)
+        thread.succeeded.connect(on_success)
+        thread.failed.connect(on_failure)
+        thread.finished.connect(lambda: self.request_threads.discard(thread))
+        self.request_threads.add(thread)
+        thread.start()
+    
+    def on_job_event(self, event):
+        job, stage = event.get('job'), event.get('stage')
+        if job == 'ingest':
+            if stage == 'parsed':
+                self.statusBar().showMessage(f"Uploading {event['file']}: parsed {event['rows']} rows")
+            elif stage == 'inserting':
+                self.statusBar().showMessage(f"Uploading {event['file']}: inserted {event['inserted']} of {event['total']} rows")
+            elif stage == 'summarized':
+                self.statusBar().showMessage(f"Uploading {event['file']}: building summaries")
+        elif job == 'report':
+            if stage == 'chart':
+                self.statusBar().showMessage(f"Generating PDF report: {event['charts']} charts rendered")
+            elif stage == 'page':
+                self.statusBar().showMessage(f"Generating PDF report: {event['pages']} pages built")
+        elif job == 'purge' and stage == 'done':
+            self.statusBar().showMessage(f"Removed oldest dataset {event.get('name', '')}")
+        
+        # Uploads from another client (or the web dashboard) refresh the dataset list too
+        if job in ('ingest', 'purge') and stage == 'done' and event.get('job_id') not in self.own_jobs:
+            self.load_datasets()
+    
     def upload_file(self):
+        self.stop_prefetch()
         if not self.selected_file:
             QMessageBox.warning(self, "Error", "Please select a CSV file first!")
             return
         
-        self.statusBar().showMessage("Uploading file...")
-        
         try:
-            with open(self.selected_file, 'rb') as f:
-                files = {'file': f}
-                response = requests.post(f"{self.api_base}/upload/", 
-                                       files=files, headers=self.auth_header, timeout=10)
-            
-            if response.status_code == 200:
-                QMessageBox.information(self, "Success", "File uploaded successfully!")
-                self.load_datasets()
-                self.selected_file = None
-                self.file_path_label.setText("No file selected")
-                self.statusBar().showMessage("File uploaded successfully")
-            else:
-                error_msg = response.json().get('error', 'Unknown error') if response.content else 'Server error'
-                QMessageBox.warning(self, "Error", f"Upload failed: {error_msg}")
-                self.statusBar().showMessage("Upload failed")
+            stat = os.stat(self.selected_file)
+        except OSError as e:
+            QMessageBox.warning(self, "Error", f"Cannot read file: {e}")
+            return
         
-        except Exception as e:
-            QMessageBox.warning(self, "Error", f"Upload failed: {str(e)}")
+        self.statusBar().showMessage("Uploading file...")
+        job_id = uuid.uuid4().hex
+        self.own_jobs.add(job_id)
+        file_name = os.path.basename(self.selected_file)
+        # Uploading the same unchanged file again resumes a failed upload
+        key = (self.selected_file, stat.st_size, stat.st_mtime_ns)
+        thread = ChunkedUploadThread(self.api_base, self.auth_header, self.selected_file, job_id,
+                                     self.failed_uploads.pop(key, None), self)
+        thread.progress.connect(lambda uploaded, size: self.statusBar().showMessage(
+            f"Uploading {file_name}: {uploaded * 100 // size}% of {size / 1048576:.1f} MB"))
+        thread.succeeded.connect(self.upload_finished)
+        thread.failed.connect(lambda error: self.chunked_upload_failed(key, thread.upload_id, error))
+        thread.finished.connect(lambda: self.request_threads.discard(thread))
+        self.request_threads.add(thread)
+        thread.start()
+    
+    def chunked_upload_failed(self, key, upload_id, error):
+        if upload_id:
+            self.failed_uploads[key] = upload_id
+            error += "\n\nUpload the file again to resume where it stopped."
+        self.upload_failed(error)
+    
+    def upload_finished(self, response):
+        if response.status_code == 200:
+            QMessageBox.information(self, "Success", "File uploaded successfully!")
+            self.load_datasets()
+            self.selected_file = None
+            self.file_path_label.setText("No file selected")
+            self.statusBar().showMessage("File uploaded successfully")
+        else:
+            error_msg = response.json().get('error', 'Unknown error') if response.content else 'Server error'
+            QMessageBox.warning(self, "Error", f"Upload failed: {error_msg}")
             self.statusBar().showMessage("Upload failed")
     
+    def upload_failed(self, error):
+        QMessageBox.warning(self, "Error", f"Upload failed: {error}")
+        self.statusBar().showMessage("Upload failed")
+    
     def load_datasets(self):
         try:
+            requests = lazy_import('requests')
             response = requests.get(f"{self.api_base}/datasets/", headers=self.auth_header, timeout=5)
             if response.status_code == 200:
                 datasets = response.json()
+                self.datasets = datasets
+                self.dataset_keys = {dataset['id']: (dataset['id'], dataset['fingerprint']) for dataset in datasets}
+                # An appended dataset changes fingerprint, so its old responses drop out here
+                keys = set(self.dataset_keys.values())
+                self.prefetched = {key: value for key, value in self.prefetched.items() if key in keys}
                 self.datasets_list.clear()
                 
                 for dataset in datasets:
@@ -710,30 +1181,69 @@ class MainWindow(QMainWindow):
                     self.datasets_list.addItem(item)
                 
                 self.statusBar().showMessage(f"Loaded {len(datasets)} datasets")
+                self.start_prefetch()
             else:
                 QMessageBox.warning(self, "Error", "Failed to load datasets")
         
         except Exception as e:
             QMessageBox.warning(self, "Error", f"Failed to load datasets: {str(e)}")
     
+    def start_prefetch(self):
+        """Warm the newest datasets not fetched yet, within the memory budget"""
+        self.stop_prefetch()
+        wanted = [(self.dataset_keys[dataset['id']], dataset) for dataset in self.datasets[:PrefetchThread.MAX_DATASETS]]
+        wanted = [(key, dataset) for key, dataset in wanted if key not in self.prefetched]
+        budget = PrefetchThread.MAX_BYTES - sum(size for size, _ in self.prefetched.values())
+        if not wanted or budget <= 0:
+            return
+        thread = PrefetchThread(self.api_base, self.auth_header, wanted, budget, self)
+        thread.fetched.connect(self.prefetch_done)
+        thread.finished.connect(lambda: self.request_threads.discard(thread))
+        self.request_threads.add(thread)
+        self.prefetcher = thread
+        thread.start(QThread.LowestPriority)
+    
+    def stop_prefetch(self):
+        """Called first by every user action, so prefetching never competes with it"""
+        if self.prefetcher is not None:
+            # Not waited for: a cancelled prefetch drops its connection and ends on its own
+            self.prefetcher.cancel()
+            self.prefetcher = None
+    
+    def prefetch_done(self, key, bundle, size):
+        # A dataset list reloaded meanwhile may have dropped or changed the dataset
+        if key in self.dataset_keys.values():
+            self.prefetched[key] = (size, bundle)
+    
     def load_equipment_data(self, item):
+        self.stop_prefetch()
         dataset_id = item.data(Qt.UserRole)
         self.selected_dataset_id = dataset_id
         
         self.statusBar().showMessage("Loading equipment data...")
         
         try:
-            equipment_response = requests.get(f"{self.api_base}/equipment/{dataset_id}/", 
-                                            headers=self.auth_header, timeout=10)
-            summary_response = requests.get(f"{self.api_base}/summary/{dataset_id}/", 
-                                          headers=self.auth_header, timeout=10)
+            prefetched = self.prefetched.get(self.dataset_keys.get(dataset_id))
+            if prefetched:
+                bundle = prefetched[1]
+            else:
+                requests = lazy_import('requests')
+                response = requests.get(f"{self.api_base}/bundle/{dataset_id}/", params=BUNDLE_QUERY,
+                                        headers=dict(self.auth_header, **MSGPACK_ACCEPT), timeout=10)
+                if response.status_code != 200:
+                    QMessageBox.warning(self, "Error", "Failed to load equipment data")
+                    self.statusBar().showMessage("Failed to load data")
+                    return
+                bundle = decode_body(response.headers.get('Content-Type', ''), response.content)
+            summary_data = bundle['summary']
+            if summary_data is None:
+                self.summary_label.setText("📈 This dataset has no equipment data")
+                self.data_table.setRowCount(0)
+                self.more_btn.setVisible(False)
+                return
             
-            if equipment_response.status_code == 200 and summary_response.status_code == 200:
-                equipment_data = equipment_response.json()
-                summary_data = summary_response.json()
-                
-                type_dist = ", ".join([f"{k}: {v}" for k, v in summary_data['type_distribution'].items()])
-                summary_text = f"""📊 DATASET ANALYSIS SUMMARY
+            type_dist = ", ".join([f"{k}: {v}" for k, v in summary_data['type_distribution'].items()])
+            summary_text = f"""📊 DATASET ANALYSIS SUMMARY
 
 🔢 Total Equipment: {summary_data['total_count']} items
 📈 Average Flowrate: {summary_data['avg_flowrate']:.2f}
@@ -743,31 +1253,54 @@ class MainWindow(QMainWindow):
 🏭 Equipment Types: {type_dist}
 
 Click on the 'Charts & Analysis' tab to see detailed visualizations!"""
-                self.summary_label.setText(summary_text)
-                
-                self.update_table(equipment_data)
-                self.chart_widget.plot_data(equipment_data, summary_data)
-                
-                self.pdf_btn.setEnabled(True)
-                
-                self.statusBar().showMessage(f"Loaded {len(equipment_data)} equipment records")
-            else:
-                QMessageBox.warning(self, "Error", "Failed to load equipment data")
-                self.statusBar().showMessage("Failed to load data")
+            self.summary_label.setText(summary_text)
+            
+            self.equipment_total = summary_data['total_count']
+            self.data_table.setRowCount(0)
+            self.show_equipment_page(bundle['equipment'])
+            self.chart_widget.plot_data(bundle['series'], summary_data, bundle.get('correlation'))
+            
+            self.pdf_btn.setEnabled(True)
         
         except Exception as e:
             QMessageBox.warning(self, "Error", f"Failed to load equipment data: {str(e)}")
             self.statusBar().showMessage("Error loading data")
+        finally:
+            self.start_prefetch()
+    
+    def load_more_equipment(self):
+        self.stop_prefetch()
+        try:
+            requests = lazy_import('requests')
+            response = requests.get(f"{self.api_base}/equipment/{self.selected_dataset_id}/",
+                                    params={'page': self.equipment_page + 1, 'page_size': BUNDLE_QUERY['page_size']},
+                                    headers=dict(self.auth_header, **MSGPACK_ACCEPT), timeout=10)
+            if response.status_code != 200:
+                QMessageBox.warning(self, "Error", "Failed to load equipment data")
+                return
+            self.show_equipment_page(decode_body(response.headers.get('Content-Type', ''), response.content))
+        except Exception as e:
+            QMessageBox.warning(self, "Error", f"Failed to load equipment data: {str(e)}")
+        finally:
+            self.start_prefetch()
+    
+    def show_equipment_page(self, page):
+        """Append a page of ``/api/equipment/<id>/?page=`` rows to the table"""
+        self.equipment_page = page['page']
+        self.update_table(page['results'])
+        self.more_btn.setVisible(page['has_more'])
+        self.statusBar().showMessage(f"Showing {self.data_table.rowCount()} of {self.equipment_total} equipment records")
     
     def update_table(self, data):
         if not data:
             return
         
-        self.data_table.setRowCount(len(data))
+        first = self.data_table.rowCount()
+        self.data_table.setRowCount(first + len(data))
         self.data_table.setColumnCount(5)
         self.data_table.setHorizontalHeaderLabels(['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature'])
         
-        for row, item in enumerate(data):
+        for row, item in enumerate(data, first):
             self.data_table.setItem(row, 0, QTableWidgetItem(str(item['name'])))
             self.data_table.setItem(row, 1, QTableWidgetItem(str(item['type'])))
             self.data_table.setItem(row, 2, QTableWidgetItem(f"{item['flowrate']:.2f}"))
@@ -778,31 +1311,66 @@ Click on the 'Charts & Analysis' tab to see detailed visualizations!"""
         self.data_table.setAlternatingRowColors(True)
     
     def download_pdf(self):
+        self.stop_prefetch()
         if not self.selected_dataset_id:
             return
         
-        self.statusBar().showMessage("Generating PDF report...")
-        
-        try:
-            response = requests.get(f"{self.api_base}/report/{self.selected_dataset_id}/", 
-                                  headers=self.auth_header, timeout=10)
-            
-            if response.status_code == 200:
-                file_path, _ = QFileDialog.getSaveFileName(self, "Save PDF Report", 
-                                                         f"equipment_report_{self.selected_dataset_id}.pdf", 
-                                                         "PDF Files (*.pdf)")
-                if file_path:
-                    with open(file_path, 'wb') as f:
-                        f.write(response.content)
-                    QMessageBox.information(self, "Success", f"PDF report saved successfully!\\n\\nSaved to: {file_path}")
-                    self.statusBar().showMessage("PDF report saved")
-            else:
-                QMessageBox.warning(self, "Error", "Failed to generate PDF report")
-                self.statusBar().showMessage("PDF generation failed")
+        dataset_id = self.selected_dataset_id
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save PDF Report", 
+                                                 f"equipment_report_{dataset_id}.pdf", 
+                                                 "PDF Files (*.pdf)")
+        if not file_path:
+            return
         
-        except Exception as e:
-            QMessageBox.warning(self, "Error", f"Failed to download PDF: {str(e)}")
-            self.statusBar().showMessage("PDF download failed")
+        self.statusBar().showMessage("Generating PDF report...")
+        self.pdf_btn.setEnabled(False)
+        job_id = uuid.uuid4().hex
+        self.own_jobs.add(job_id)
+        
+        # The report streams straight to disk, so its size does not matter
+        thread = DownloadThread(f"{self.api_base}/report/{dataset_id}/", {'job_id': job_id},
+                                self.auth_header, file_path, self)
+        progress = QProgressDialog("Generating PDF report...", "Cancel", 0, 0, self)
+        progress.setWindowTitle("PDF Report")
+        progress.setMinimumDuration(500)
+        progress.canceled.connect(thread.cancel)
+        thread.progress.connect(lambda received, total: self.pdf_progress(progress, received, total))
+        thread.succeeded.connect(self.pdf_finished)
+        thread.failed.connect(self.pdf_failed)
+        thread.finished.connect(lambda: self.pdf_done(thread, progress))
+        self.request_threads.add(thread)
+        thread.start()
+    
+    def pdf_progress(self, progress, received, total):
+        if total:
+            progress.setMaximum(total // 1024)
+            progress.setValue(received // 1024)
+        progress.setLabelText(f"Downloading PDF report: {received / 1048576:.1f} MB"
+                              + (f" of {total / 1048576:.1f} MB" if total else ""))
+    
+    def pdf_done(self, thread, progress):
+        self.request_threads.discard(thread)
+        progress.reset()
+        self.pdf_btn.setEnabled(True)
+        if thread.cancelled:
+            self.statusBar().showMessage("PDF download cancelled")
+        self.start_prefetch()
+    
+    def pdf_finished(self, file_path):
+        QMessageBox.information(self, "Success", f"PDF report saved successfully!\\n\\nSaved to: {file_path}")
+        self.statusBar().showMessage("PDF report saved")
+    
+    def pdf_failed(self, error):
+        QMessageBox.warning(self, "Error", f"Failed to download PDF: {error}")
+        self.statusBar().showMessage("PDF download failed")
+    
+    def closeEvent(self, event):
+        self.event_stream.stop()
+        for thread in list(self.request_threads):
+            if isinstance(thread, (DownloadThread, PrefetchThread)):
+                thread.cancel()
+            thread.wait(1000)
+        super().closeEvent(event)
 
 def main():
     app = QApplication(sys.argv)
@@ -811,6 +1379,9 @@ def main():
     app.setApplicationName("Chemical Equipment Visualizer")
     app.setApplicationVersion("1.0")
     
+    # Starts once the event loop runs, i.e. after the login dialog is painted
+    QTimer.singleShot(0, lambda: preload(NETWORK_MODULES))
+    
     window = MainWindow()
     window.show()
     
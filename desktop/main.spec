@@ -6,7 +6,8 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    # Imported lazily by main.py, so the analysis cannot see them
+    hiddenimports=['requests', 'msgpack', 'numpy', 'matplotlib.figure', 'matplotlib.backends.backend_qt5agg'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -26,9 +26,15 @@ ChartJS.register(
   ArcElement
 );
 
+// Table rows per request; the server allows up to 100
+const PAGE_SIZE = 100;
+
 function Analytics({ datasets, selectedDataset, onDatasetSelect, apiBase, onDatasetChange, user }) {
   const [equipmentData, setEquipmentData] = useState([]);
+  const [equipmentPage, setEquipmentPage] = useState(null);
   const [summary, setSummary] = useState(null);
+  const [types, setTypes] = useState([]);
+  const [series, setSeries] = useState(null);
   const [loading, setLoading] = useState(false);
   const [searchTerm, setSearchTerm] = useState('');
   const [typeFilter, setTypeFilter] = useState('');
@@ -120,27 +126,52 @@ function Analytics({ datasets, selectedDataset, onDatasetSelect, apiBase, onData
     }
   };
 
+  // One bundle holds the summary, per-type stats, the first table page and
+  // chart series downsampled on the server; later pages load on demand
   const loadAnalyticsData = async (datasetId) => {
     try {
       setLoading(true);
-      const [equipmentResponse, summaryResponse] = await Promise.all([
-        axios.get(`${apiBase}/equipment/${datasetId}/`),
-        axios.get(`${apiBase}/summary/${datasetId}/`)
-      ]);
+      setTypeFilter('');
+      const response = await axios.get(`${apiBase}/bundle/${datasetId}/`, {
+        params: { page_size: PAGE_SIZE }
+      });
       
-      setEquipmentData(equipmentResponse.data);
-      setSummary(summaryResponse.data);
+      setSummary(response.data.summary);
+      setTypes(response.data.types);
+      setSeries(response.data.series);
+      setEquipmentData(response.data.equipment.results);
+      setEquipmentPage(response.data.equipment);
     } catch (error) {
       console.error('Error loading analytics data:', error);
       setEquipmentData([]);
+      setEquipmentPage(null);
       setSummary(null);
+      setTypes([]);
+      setSeries(null);
     } finally {
       setLoading(false);
     }
   };
 
+  const loadEquipmentPage = async (page, type) => {
+    try {
+      const response = await axios.get(`${apiBase}/equipment/${selectedDataset}/`, {
+        params: { page, page_size: PAGE_SIZE, ...(type ? { type } : {}) }
+      });
+      setEquipmentData(rows => page === 1 ? response.data.results : [...rows, ...response.data.results]);
+      setEquipmentPage(response.data);
+    } catch (error) {
+      console.error('Error loading equipment:', error);
+    }
+  };
+
+  const handleTypeFilter = (type) => {
+    setTypeFilter(type);
+    loadEquipmentPage(1, type);
+  };
+
   const getChartData = () => {
-    if (!summary || !equipmentData.length) return null;
+    if (!summary || !series || !series.index.length) return null;
 
     // Equipment Type vs Count (Bar Chart)
     const typeData = {
@@ -170,10 +201,10 @@ function Analytics({ datasets, selectedDataset, onDatasetSelect, apiBase, onData
 
     // Flowrate vs Pressure (Line Chart)
     const scatterData = {
-      labels: equipmentData.map((item, index) => `Equipment ${index + 1}`),
+      labels: series.index.map(index => `Equipment ${index + 1}`),
       datasets: [{
         label: 'Flowrate',
-        data: equipmentData.map(item => item.flowrate),
+        data: series.flowrate,
         backgroundColor: 'rgba(59, 130, 246, 0.1)',
         borderColor: '#3b82f6',
         borderWidth: 3,
@@ -186,7 +217,7 @@ function Analytics({ datasets, selectedDataset, onDatasetSelect, apiBase, onData
         pointHoverRadius: 8,
       }, {
         label: 'Pressure',
-        data: equipmentData.map(item => item.pressure),
+        data: series.pressure,
         backgroundColor: 'rgba(16, 185, 129, 0.1)',
         borderColor: '#10b981',
         borderWidth: 3,
@@ -396,14 +427,15 @@ function Analytics({ datasets, selectedDataset, onDatasetSelect, apiBase, onData
     }
   };
 
-  // Filter equipment data
-  const filteredData = equipmentData.filter(item => {
-    const matchesSearch = item.name.toLowerCase().includes(searchTerm.toLowerCase());
-    const matchesType = !typeFilter || item.type === typeFilter;
-    return matchesSearch && matchesType;
-  });
+  // The type filter is applied by the server; the search filters loaded rows
+  const filteredData = equipmentData.filter(item =>
+    item.name.toLowerCase().includes(searchTerm.toLowerCase())
+  );
 
-  const uniqueTypes = [...new Set(equipmentData.map(item => item.type))];
+  const uniqueTypes = types.map(item => item.type);
+  const matchingCount = typeFilter
+    ? types.find(item => item.type === typeFilter)?.count ?? 0
+    : summary?.total_count ?? 0;
   const chartData = getChartData();
 
   return (
@@ -656,7 +688,7 @@ function Analytics({ datasets, selectedDataset, onDatasetSelect, apiBase, onData
                 />
                 <select
                   value={typeFilter}
-                  onChange={(e) => setTypeFilter(e.target.value)}
+                  onChange={(e) => handleTypeFilter(e.target.value)}
                   style={{
                     padding: '0.75rem',
                     border: '1px solid #d1d5db',
@@ -714,9 +746,20 @@ function Analytics({ datasets, selectedDataset, onDatasetSelect, apiBase, onData
                 </div>
               )}
               
-              {filteredData.length > 0 && filteredData.length !== equipmentData.length && (
+              {filteredData.length > 0 && filteredData.length !== matchingCount && (
                 <div className="text-center mt-2" style={{ color: '#64748b', fontSize: '0.875rem' }}>
-                  Showing {filteredData.length} of {equipmentData.length} equipment items
+                  Showing {filteredData.length} of {matchingCount} equipment items
+                </div>
+              )}
+
+              {equipmentPage?.has_more && (
+                <div className="text-center mt-2">
+                  <button
+                    className="btn btn-secondary"
+                    onClick={() => loadEquipmentPage(equipmentPage.page + 1, typeFilter)}
+                  >
+                    Load more
+                  </button>
                 </div>
               )}
             </div>
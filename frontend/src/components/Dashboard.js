@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 import Analytics from './Analytics';
 import History from './History';
+import { subscribeJobEvents, describeJobEvent } from '../jobEvents';
 import '../Dashboard.css';
 
 function Dashboard({ user, onLogout, apiBase }) {
@@ -9,11 +10,23 @@ function Dashboard({ user, onLogout, apiBase }) {
   const [datasets, setDatasets] = useState([]);
   const [selectedDataset, setSelectedDataset] = useState(null);
   const [loading, setLoading] = useState(false);
+  const [jobStatus, setJobStatus] = useState('');
 
   useEffect(() => {
     loadDatasets();
   }, [user.username]); // Reload when user changes
 
+  // Upload, purge and report progress is pushed by the server
+  useEffect(() => {
+    return subscribeJobEvents(apiBase, (event) => {
+      const message = describeJobEvent(event);
+      if (message) setJobStatus(message);
+      if ((event.job === 'ingest' || event.job === 'purge') && event.stage === 'done') {
+        loadDatasets();
+      }
+    });
+  }, [user.username, apiBase]);
+
   const loadDatasets = async () => {
     try {
       setLoading(true);
@@ -111,6 +124,7 @@ function Dashboard({ user, onLogout, apiBase }) {
           </h1>
           
           <div className="top-bar-actions">
+            {jobStatus && <span className="job-status">{jobStatus}</span>}
             <button className="logout-btn" onClick={onLogout}>
               Logout
             </button>
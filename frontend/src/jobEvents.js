@@ -0,0 +1,86 @@
+import axios from 'axios';
+
+// Streams the user's job progress events from /api/events/ (Server-Sent Events).
+// EventSource cannot send the Authorization header, so the stream is read with fetch.
+// Returns a function that closes the stream.
+export function subscribeJobEvents(apiBase, onEvent) {
+  const controller = new AbortController();
+  let lastEventId = null;
+
+  const readStream = async () => {
+    const query = lastEventId ? `?last_event_id=${lastEventId}` : '';
+    const response = await fetch(`${apiBase}/events/${query}`, {
+      headers: {
+        Authorization: axios.defaults.headers.common['Authorization'],
+        Accept: 'text/event-stream'
+      },
+      signal: controller.signal
+    });
+    if (!response.ok) {
+      throw new Error(`Event stream failed: ${response.status}`);
+    }
+
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = '';
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) return;
+      buffer += value;
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+        const frame = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        let data = null;
+        for (const line of frame.split('\n')) {
+          if (line.startsWith('id:')) lastEventId = line.slice(3).trim();
+          else if (line.startsWith('data:')) data = line.slice(5);
+        }
+        if (data) onEvent(JSON.parse(data));
+      }
+    }
+  };
+
+  const run = async () => {
+    // The server ends each stream after a few minutes; reconnect and resume from the last event
+    while (!controller.signal.aborted) {
+      try {
+        await readStream();
+      } catch (error) {
+        if (controller.signal.aborted) return;
+      }
+      await new Promise(resolve => setTimeout(resolve, 2000));
+    }
+  };
+
+  run();
+  return () => controller.abort();
+}
+
+export function describeJobEvent(event) {
+  switch (`${event.job}:${event.stage}`) {
+    case 'ingest:started':
+      return `Uploading ${event.file}...`;
+    case 'ingest:parsed':
+      return `Uploading ${event.file}: parsed ${event.rows} rows`;
+    case 'ingest:inserting':
+      return `Uploading ${event.file}: inserted ${event.inserted} of ${event.total} rows`;
+    case 'ingest:done':
+      return `Uploaded ${event.file}`;
+    case 'ingest:failed':
+      return `Upload of ${event.file} failed`;
+    case 'report:started':
+      return 'Generating PDF report...';
+    case 'report:chart':
+      return `Generating PDF report: ${event.charts} charts rendered`;
+    case 'report:page':
+      return `Generating PDF report: ${event.pages} pages built`;
+    case 'report:done':
+      return `PDF report ready (${event.pages} pages)`;
+    case 'report:failed':
+      return 'PDF report failed';
+    case 'purge:done':
+      return `Removed oldest dataset ${event.name}`;
+    default:
+      return null;
+  }
+}